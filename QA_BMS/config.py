@@ -1,7 +1,11 @@
 # config.py
+from query_templates import CHILD_QUERY_TEMPLATE
 
 # Connection strings
 ORACLE_CONN_STR = "AGILE_RO/agilerospt@sulvdbz22:1522/agilespt"
+ORACLE_DRIVER = "cx_Oracle"  # "cx_Oracle", "oracledb" (thin mode, no Instant Client) or "oracledb-thick"
+ORACLE_ASYNC_QUERIES = False  # file_vault_check: run the attachment queries concurrently with the oracledb asyncio API (thin mode)
+ORACLE_ASYNC_SESSIONS = 4
 SOLR_URL = "http://ol-bvsolr.formfactor.com:8983/solr/BMS_test"
 
 # SQL Queries
@@ -35,63 +39,120 @@ SELECT
 FROM 
     AGILE.ITEM_P2P3 P2P3
 INNER JOIN 
-    AGILE.REV R ON R.ITEM = P2P3.ID AND R.RELEASE_TYPE = 974 --productioN
+    AGILE.REV R ON R.ITEM = P2P3.ID AND R.RELEASE_TYPE = :release_type --productioN
 INNER JOIN 
     AGILE.NODETABLE N ON N.ID = P2P3.SUBCLASS
 INNER JOIN 
     AGILEUSER U ON U.ID = P2P3.CREATE_USER
 WHERE 
-    N.DESCRIPTION = 'BMS (Business Management System) Document'
-    AND P2P3.SUBCLASS = 2484931
+    N.DESCRIPTION = :subclass
+    AND P2P3.SUBCLASS = :subclass_id
     AND R.LATEST_FLAG = 1
     AND P2P3.DELETE_FLAG IS NULL
 """
 
-CHILD_QUERY = """
-SELECT 
-    AGILE.ITEM.ITEM_NUMBER, 
-    AGILE.FILES.FILENAME, 
-    AGILE.FILES.FILE_TYPE, 
-    AGILE.FILE_INFO.IFS_FILEPATH,
-    AGILE.FILE_INFO.HFS_FILEPATH
-FROM 
-    AGILE.ITEM
-JOIN 
-    AGILE.ATTACHMENT_MAP ON AGILE.ATTACHMENT_MAP.PARENT_ID = AGILE.ITEM.ID AND AGILE.ITEM.CLASS = 9000
-JOIN 
-    AGILE.FILES ON AGILE.FILES.ID = AGILE.ATTACHMENT_MAP.FILE_ID
-JOIN 
-    AGILE.FILE_INFO ON AGILE.FILE_INFO.FILE_ID = AGILE.ATTACHMENT_MAP.FILE_ID
-JOIN 
-    AGILE.NODETABLE ON AGILE.NODETABLE.ID = AGILE.ITEM.SUBCLASS
-WHERE 
-    AGILE.NODETABLE.DESCRIPTION = 'BMS (Business Management System) Document'
-    AND AGILE.ITEM.ID NOT IN (
-        45377136,
-        49523767,
-        45377145,
-        24262189,
-        24262167,
-        24262240,
-        24262312
-    )
-    AND AGILE.ITEM.DELETE_FLAG IS NULL
-    AND AGILE.ATTACHMENT_MAP.PARENT_ID2 = (
-        SELECT change 
-        FROM REV 
-        WHERE RELEASE_DATE = (
-            SELECT MAX(r.release_date) 
-            FROM REV R, CHANGE C
-            WHERE ITEM = (
-                SELECT ID 
-                FROM ITEM 
-                WHERE ITEM_NUMBER = AGILE.ITEM.ITEM_NUMBER
-            )
-            AND C.ID = R.CHANGE
-            AND C.CLASS = 6000
-            AND C.DELETE_FLAG IS NULL
-            AND C.RELEASE_DATE IS NOT NULL
-        )
-        AND ITEM = AGILE.ITEM.ID
-    )
-"""
+CHILD_QUERY = CHILD_QUERY_TEMPLATE
+
+# Bind variables of PARENT_QUERY and the shared query templates
+QUERY_PARAMS = {
+    "subclass": "BMS (Business Management System) Document",
+    "release_type": 974,  # Production
+    "subclass_id": 2484931,
+    "excluded_ids": "45377136,49523767,45377145,24262189,24262167,24262240,24262312",
+}
+
+# Attachment queries whose rows are merged into the children of PARENT_QUERY
+CHILD_QUERIES = [CHILD_QUERY]
+
+# File vault stat validation
+FILEVAULT_PATH = "/mnt/agile/filevault"
+STAT_WORKERS = 32  # Concurrent os.stat calls against the NFS-mounted vault
+STAT_CACHE_FILE = "stat_cache.json"
+STAT_CACHE_TTL = 24 * 60 * 60  # Seconds a readable file's cached stat is trusted while its directory is unchanged
+
+# Discrepancy sink
+DOCTYPE = "BMS"
+DISCREPANCY_FILE = "discrepancies.jsonl.gz"
+DISCREPANCY_BUFFER_SIZE = 1000  # Records buffered in memory before being written out
+DISCREPANCY_KEEP_RUNS = 5  # Files of earlier runs kept beside the current one (discrepancies.jsonl.gz.1 is the latest)
+
+# Performance history
+PERF_HISTORY_DB = "perf_history.db"
+PERF_BASELINE_RUNS = 10  # Earlier runs that make up the rolling baseline
+PERF_THRESHOLD_SIGMA = 3.0  # Standard deviations above the baseline mean before a phase is flagged
+PERF_MIN_SLOWDOWN = 0.2  # ...and at least this fraction slower than the mean
+PERF_MIN_SECONDS = 0.5  # ...and at least this many seconds slower than the mean
+
+# Grouped count reconciliation (PARENT_QUERY columns, lower-cased for the Solr fields)
+RECONCILE_GROUP_FIELDS = ["SUBCLASS", "LIFECYCLE", "BMS_DOC_TYPE"]
+RECONCILE_MONTH_FIELD = "RELEASE_DATE"  # Also group by release month; None to disable
+RECONCILE_MONTH_START = "1990-01-01T00:00:00Z"
+ORACLE_DATE_TIMEZONE = "UTC"  # Time zone of the Oracle DATE values, an IANA name (e.g. "America/Los_Angeles"); months and field values are compared in UTC, as Solr stores dates
+
+# Snapshot-consistent Oracle reads
+ORACLE_SNAPSHOT = False  # Read every query as of one SCN captured at the start of the run
+ORACLE_SNAPSHOT_SCN = None  # Pin a specific SCN (the QA_ORACLE_SCN environment variable also does)
+QUERY_CACHE_DIR = "query_cache"  # Query results cached per query hash and SCN
+
+# Watch mode (continuous validation of changed items)
+WATCH_USE_CQN = True  # Continuous query notification on REV/ITEM; falls back to polling RELEASE_DATE
+WATCH_POLL_INTERVAL = 60  # Seconds between polls in the fallback
+WATCH_BATCH_WINDOW = 10  # Seconds changes are coalesced before a batch is validated
+WATCH_MAX_BATCH = 500  # Items per batch (at most 1000, the Oracle IN-list limit)
+
+# Profiling (enabled per checker or phase with --profile or QA_PROFILE)
+PROFILE_DIR = "profiles"  # Written next to report.html
+PROFILE_SAMPLE_INTERVAL = 0.005  # Seconds between stack samples for the collapsed-stack output
+PROFILE_TOP_ALLOCATIONS = 25
+
+# Duplicate detection: Solr fields that together identify one indexed document
+DUPLICATE_KEY_FIELDS = ["item_number", "filename"]
+
+# Sampling mode (python sample_check.py): deterministic ORA_HASH sample of item_numbers
+SAMPLE_FRACTION = 0.01
+SAMPLE_SEED = 0  # Change to draw a different, equally deterministic sample
+SAMPLE_CONFIDENCE = 0.95
+
+# Partitioned fetch: ORA_HASH partitions of PARENT_QUERY and the child queries, each on its own session (1 = serial)
+ORACLE_PARTITIONS = 1
+
+# Checkpoint and resume for full runs (main.py --resume continues an interrupted run from here)
+CHECKPOINT_DIR = "checkpoints"
+CHECKPOINT_EVERY = 10  # Solr pages between saved cursorMarks
+CHECKPOINT_MAX_AGE = 21600  # Older checkpoints are ignored even with --resume, in seconds
+
+# Adaptive Solr fetching: page size follows observed latency, load is capped by a token bucket
+SOLR_TIMEOUT = 30  # Seconds per request
+SOLR_PAGE_ROWS = 2000  # Starting page size
+SOLR_MIN_ROWS = 200
+SOLR_MAX_ROWS = 20000
+SOLR_TARGET_LATENCY = 2.0  # Seconds per page; faster pages grow, slower ones shrink
+SOLR_MAX_CONCURRENCY = 8
+SOLR_LOAD_SHARE = 0.25  # Share of one Solr node's query time (QTime) validation may use
+
+# Concurrent Solr fetch (aiohttp): disjoint slices of the core fetched at once
+SOLR_ASYNC_FETCH = False
+SOLR_FETCH_SLICES = 4  # {!hash} partitions of id when no shard URLs are given
+SOLR_SHARD_URLS = []  # Shard cores queried directly with distrib=false, e.g. "http://host:8983/solr/DOC_shard1_replica_n1"
+
+# Column comparison kernel (numpy, optional): rows from which columns are split across processes
+COMPARE_WORKERS = 4
+COMPARE_PARALLEL_ROWS = 250000
+
+# Approximate distinct-item reconciliation: APPROX_COUNT_DISTINCT in Oracle, a Solr facet function per month
+DISTINCT_SOLR_FUNCTION = "hll"  # or "unique" (exact up to 100 values per shard, estimated above)
+DISTINCT_RELATIVE_ERROR = 0.023  # Standard error of one HyperLogLog estimate (Solr's hll keeps 2^11 registers)
+DISTINCT_CONFIDENCE = 0.99  # Drift beyond this confidence bound is reported
+
+# SQL diagnostics (main.py --sql-diagnostics or QA_SQL_DIAGNOSTICS=1): sql_id, V$SQL statistics and DBMS_XPLAN plan per query
+SQL_DIAGNOSTICS = False
+SQL_DIAGNOSTICS_DIR = "sql_diagnostics"  # Plans and per-run statistics
+
+# Repair mode (python repair.py): reindex the items a validation run reported missing or divergent
+REPAIR_BATCH_SIZE = 1000  # Documents per update request
+REPAIR_CONCURRENCY = 4  # Update requests in flight
+REPAIR_COMMIT_WITHIN = 10000  # Milliseconds; None for a single commit after the last batch
+REPAIR_ID_FIELDS = ["item_number", "filename"]  # Joined with "_" into the id of a document missing from Solr
+
+# Where parent and attachment rows are joined: "client" (process_documents) or "server" (one LEFT OUTER JOIN in Oracle)
+ORACLE_JOIN_MODE = "client"
@@ -0,0 +1,117 @@
+# discrepancy_sink.py
+import atexit
+import gzip
+import json
+import logging
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+from config import DOCTYPE, DISCREPANCY_FILE, DISCREPANCY_BUFFER_SIZE, DISCREPANCY_KEEP_RUNS  # Import from config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class DiscrepancySink:
+    """Structured destination for discrepancies found by the checkers.
+
+    Records are written to a gzip compressed JSONL file in bounded batches, and
+    running counts are kept per (checker, field, doctype) so callers can assert
+    on the aggregates without keeping the individual records in memory. Every
+    record carries the run id of its sink. Each run starts a new file; the files
+    of the keep_runs runs before it are kept as path.1 (the latest), path.2, ...
+    Once closed, a sink rejects further records.
+    """
+
+    def __init__(self, path: str = DISCREPANCY_FILE, doctype: str = DOCTYPE, buffer_size: int = DISCREPANCY_BUFFER_SIZE,
+                 run_id: str = None, keep_runs: int = DISCREPANCY_KEEP_RUNS):
+        self.path = path
+        self.doctype = doctype
+        self.buffer_size = buffer_size
+        self.run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.keep_runs = keep_runs
+        self.buffer: List[Dict[str, Any]] = []
+        self.aggregates = Counter()
+        self.file = None
+        self.started = False  # Whether this run's file has been created
+        self.closed = False
+
+    def record(self, checker: str, field: str, key=None, oracle=None, solr=None, **details):
+        """Add one discrepancy; the buffer is written out once it reaches buffer_size."""
+        if self.closed:
+            raise ValueError(f"Discrepancy sink {self.path} is closed")  # Its run's file is complete
+        self.aggregates[(checker, field, self.doctype)] += 1
+        rec = {"ts": time.time(), "run": self.run_id, "doctype": self.doctype, "checker": checker, "field": field,
+               "key": key, "oracle": oracle, "solr": solr}
+        rec.update(details)
+        self.buffer.append(rec)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def open(self):
+        """Open this run's file, rotating the previous runs' files out of the way on first use."""
+        if not self.started:
+            rotate(self.path, self.keep_runs)
+            self.started = True
+            self.file = gzip.open(self.path, "wt", encoding="utf-8")
+        else:
+            self.file = gzip.open(self.path, "at", encoding="utf-8")
+
+    def flush(self):
+        """Write the buffered records to the compressed JSONL file."""
+        if not self.buffer:
+            return
+        if self.file is None:
+            self.open()
+        self.file.write("".join(json.dumps(rec, default=str) + "\n" for rec in self.buffer))
+        self.buffer = []
+
+    def count(self, checker: str = None, field: str = None, doctype: str = None) -> int:
+        """Number of discrepancies recorded, optionally filtered by checker, field and doctype."""
+        return sum(
+            n for (c, f, d), n in self.aggregates.items()
+            if (checker is None or c == checker) and (field is None or f == field) and (doctype is None or d == doctype)
+        )
+
+    def summary(self) -> Dict[str, int]:
+        return {f"{c}.{f}.{d}": n for (c, f, d), n in sorted(self.aggregates.items())}
+
+    def close(self):
+        """Flush outstanding records and log the aggregates."""
+        if self.closed:
+            return
+        self.closed = True
+        self.flush()
+        if not self.started:
+            self.open()  # An empty file, so the previous run's records are not taken for this run's
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        for name, n in self.summary().items():
+            logging.info(f"Discrepancies {name}: {n}")
+
+
+def rotate(path: str, keep: int):
+    """Shift path to path.1, path.1 to path.2, ... dropping the file beyond path.<keep>."""
+    if not os.path.exists(path):
+        return
+    if keep <= 0:
+        os.remove(path)
+        return
+    for n in range(keep - 1, 0, -1):
+        if os.path.exists(f"{path}.{n}"):
+            os.replace(f"{path}.{n}", f"{path}.{n + 1}")
+    os.replace(path, f"{path}.1")
+
+
+_default_sink = None
+
+
+def get_sink() -> DiscrepancySink:
+    """Return the process wide sink that checkers write to unless given their own."""
+    global _default_sink
+    if _default_sink is None:
+        _default_sink = DiscrepancySink()
+        atexit.register(_default_sink.close)
+    return _default_sink
@@ -0,0 +1,82 @@
+# oracle_snapshot.py
+import hashlib
+import logging
+import os
+import pickle
+from typing import Any, Dict, List, Optional
+
+from config import ORACLE_SNAPSHOT, ORACLE_SNAPSHOT_SCN, QUERY_CACHE_DIR  # Import from config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+CURRENT_SCN_QUERY = "SELECT DBMS_FLASHBACK.GET_SYSTEM_CHANGE_NUMBER FROM DUAL"
+ENABLE_FLASHBACK_PROC = "DBMS_FLASHBACK.ENABLE_AT_SYSTEM_CHANGE_NUMBER"
+
+
+class OracleSnapshot:
+    """One SCN shared by every Oracle query of a run, and an on-disk cache of results keyed by query and SCN.
+
+    Sessions are put in flashback mode at the SCN (DBMS_FLASHBACK), which makes every
+    statement they run behave as if each table were read AS OF SCN, so parent and
+    child queries always see the same committed state.
+    """
+
+    def __init__(self, cache_dir: str = QUERY_CACHE_DIR, scn: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self.scn = int(scn) if scn else None
+
+    def capture(self, cursor) -> int:
+        """Read the current SCN once; later connections of the run reuse it."""
+        if self.scn is None:
+            cursor.execute(CURRENT_SCN_QUERY)
+            self.scn = int(cursor.fetchone()[0])
+            logging.info(f"Captured Oracle SCN {self.scn}; rerun with QA_ORACLE_SCN={self.scn} to reuse cached results")
+        return self.scn
+
+    def pin(self, connection):
+        """Capture the run's SCN if needed and make the session read as of it."""
+        cursor = connection.cursor()
+        try:
+            self.capture(cursor)
+            cursor.callproc(ENABLE_FLASHBACK_PROC, [self.scn])
+        finally:
+            cursor.close()
+
+    def cache_path(self, query: str, params: Dict[str, Any] = None) -> str:
+        key = query if not params else f"{query}\n{sorted(params.items())!r}"
+        query_hash = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{query_hash}-{self.scn}.pkl")
+
+    def load(self, query: str, params: Dict[str, Any] = None) -> Optional[List[Dict[str, Any]]]:
+        """Cached result of the query at this SCN, or None."""
+        if self.scn is None:
+            return None
+        path = self.cache_path(query, params)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as fh:
+                return pickle.load(fh)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logging.warning(f"Ignoring unreadable query cache {path}: {e}")
+            return None
+
+    def store(self, query: str, results: List[Dict[str, Any]], params: Dict[str, Any] = None):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.cache_path(query, params)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as fh:
+            pickle.dump(results, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+
+_default_snapshot = None
+
+
+def get_snapshot() -> Optional[OracleSnapshot]:
+    """Return the run's snapshot, or None when ORACLE_SNAPSHOT is off and QA_ORACLE_SCN is not set."""
+    global _default_snapshot
+    scn = os.environ.get("QA_ORACLE_SCN") or ORACLE_SNAPSHOT_SCN
+    if _default_snapshot is None and (ORACLE_SNAPSHOT or scn):
+        _default_snapshot = OracleSnapshot(scn=scn)
+    return _default_snapshot
@@ -0,0 +1,170 @@
+# perf_history.py
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from config import DOCTYPE, PERF_HISTORY_DB, PERF_BASELINE_RUNS, PERF_THRESHOLD_SIGMA, PERF_MIN_SLOWDOWN, PERF_MIN_SECONDS  # Import from config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    doctype TEXT NOT NULL,
+    code_version TEXT NOT NULL,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS phases (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    phase TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    rows INTEGER,
+    peak_mem_kb INTEGER
+);
+CREATE INDEX IF NOT EXISTS phases_by_name ON phases(phase, run_id);
+"""
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def peak_memory_kb():
+    """Peak resident set size of this process so far, in KB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def code_version() -> str:
+    """Git revision of the checkout plus a hash of config.py, so query changes show up as a new version."""
+    try:
+        rev = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=HERE, capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        rev = ""
+    with open(os.path.join(HERE, "config.py"), "rb") as fh:
+        config_hash = hashlib.sha1(fh.read()).hexdigest()[:8]
+    return f"{rev or 'unknown'}+cfg.{config_hash}"
+
+
+class PerfRecorder:
+    """Collects per-phase timings, row counts and peak memory for one run."""
+
+    def __init__(self, doctype: str = DOCTYPE, db_path: str = PERF_HISTORY_DB):
+        self.doctype = doctype
+        self.db_path = db_path
+        self.started_at = time.time()
+        self.phases: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block; the caller may set stats['rows'] to the number of rows it handled."""
+        stats = {"rows": None}
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            self.phases.append({"phase": name, "seconds": time.perf_counter() - start,
+                                "rows": stats["rows"], "peak_mem_kb": peak_memory_kb()})
+
+    def save(self):
+        """Store the recorded phases in the history database and return the run id."""
+        if not self.phases:
+            return None
+        with sqlite3.connect(self.db_path) as db:
+            db.executescript(SCHEMA)
+            cur = db.execute("INSERT INTO runs (doctype, code_version, started_at) VALUES (?, ?, ?)",
+                             (self.doctype, code_version(), self.started_at))
+            run_id = cur.lastrowid
+            db.executemany("INSERT INTO phases (run_id, phase, seconds, rows, peak_mem_kb) VALUES (?, ?, ?, ?, ?)",
+                           [(run_id, p["phase"], p["seconds"], p["rows"], p["peak_mem_kb"]) for p in self.phases])
+        self.phases = []
+        return run_id
+
+
+class PerfHistory:
+    """Compares a run against the rolling baseline of earlier runs of the same doctype."""
+
+    def __init__(self, db_path: str = PERF_HISTORY_DB):
+        self.db_path = db_path
+
+    def latest_run_id(self, doctype: str):
+        with sqlite3.connect(self.db_path) as db:
+            db.executescript(SCHEMA)
+            row = db.execute("SELECT MAX(run_id) FROM runs WHERE doctype = ?", (doctype,)).fetchone()
+        return row[0]
+
+    def compare(self, doctype: str = DOCTYPE, run_id: int = None, window: int = PERF_BASELINE_RUNS,
+                sigma: float = PERF_THRESHOLD_SIGMA, min_slowdown: float = PERF_MIN_SLOWDOWN,
+                min_seconds: float = PERF_MIN_SECONDS) -> List[Dict[str, Any]]:
+        """Return the phases of run_id (default: latest run) that are slower than their baseline.
+
+        A phase is flagged when it is more than `sigma` standard deviations above the
+        mean of the previous `window` runs, at least `min_slowdown` (a fraction) slower
+        than that mean and at least `min_seconds` slower in absolute terms, so jitter of
+        millisecond phases with a near-zero stdev is not reported. Phases with fewer than
+        three baseline samples are skipped.
+        """
+        run_id = run_id or self.latest_run_id(doctype)
+        if run_id is None:
+            return []
+        regressions = []
+        with sqlite3.connect(self.db_path) as db:
+            # A phase can repeat within a run (e.g. one entry per query), so compare per-run totals
+            current = db.execute("SELECT phase, SUM(seconds), SUM(rows) FROM phases WHERE run_id = ? GROUP BY phase", (run_id,)).fetchall()
+            for phase, seconds, rows in current:
+                baseline = [r[0] for r in db.execute(
+                    """SELECT SUM(p.seconds) FROM phases p JOIN runs r ON r.run_id = p.run_id
+                       WHERE r.doctype = ? AND p.phase = ? AND p.run_id < ?
+                       GROUP BY p.run_id ORDER BY p.run_id DESC LIMIT ?""", (doctype, phase, run_id, window))]
+                if len(baseline) < 3:
+                    continue
+                mean = statistics.mean(baseline)
+                stdev = statistics.stdev(baseline)
+                if (seconds > mean + sigma * stdev and seconds > mean * (1 + min_slowdown)
+                        and seconds - mean >= min_seconds):
+                    regressions.append({"phase": phase, "seconds": seconds, "rows": rows,
+                                        "baseline_mean": mean, "baseline_stdev": stdev, "samples": len(baseline)})
+        return regressions
+
+
+def format_regression(reg: Dict[str, Any]) -> str:
+    return (f"Phase {reg['phase']} took {reg['seconds']:.2f}s vs baseline {reg['baseline_mean']:.2f}s "
+            f"(stdev {reg['baseline_stdev']:.2f}s over {reg['samples']} runs, rows: {reg['rows']})")
+
+
+_default_recorder = None
+
+
+def get_recorder() -> PerfRecorder:
+    """Return the process wide recorder that checkers time their phases with."""
+    global _default_recorder
+    if _default_recorder is None:
+        _default_recorder = PerfRecorder()
+    return _default_recorder
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flag validation phases that are slower than their rolling baseline.")
+    parser.add_argument("--doctype", default=DOCTYPE)
+    parser.add_argument("--run-id", type=int, help="Run to check (default: latest run of the doctype)")
+    parser.add_argument("--window", type=int, default=PERF_BASELINE_RUNS, help="Number of earlier runs in the baseline")
+    args = parser.parse_args()
+
+    regressions = PerfHistory().compare(args.doctype, args.run_id, args.window)
+    for reg in regressions:
+        logging.warning(format_regression(reg))
+    logging.info(f"Performance regressions: {len(regressions)}")
+    sys.exit(1 if regressions else 0)
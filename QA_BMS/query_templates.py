@@ -0,0 +1,78 @@
+# query_templates.py
+# SQL shared by every doctype. Doctype specific values are bind variables, filled from
+# QUERY_PARAMS in config.py, so Oracle parses each statement once for all doctypes:
+#   :subclass      NODETABLE.DESCRIPTION of the doctype's subclass
+#   :excluded_ids  comma separated ITEM.IDs left out of the validation
+
+# Expands :excluded_ids into rows; an empty list excludes nothing
+EXCLUDED_IDS = """
+        SELECT TO_NUMBER(ID) FROM (
+            SELECT REGEXP_SUBSTR(:excluded_ids, '[^,]+', 1, LEVEL) ID FROM DUAL
+            CONNECT BY REGEXP_SUBSTR(:excluded_ids, '[^,]+', 1, LEVEL) IS NOT NULL
+        ) WHERE ID IS NOT NULL"""
+
+CHILD_QUERY_TEMPLATE = f"""
+SELECT 
+    AGILE.ITEM.ITEM_NUMBER, 
+    AGILE.FILES.FILENAME, 
+    AGILE.FILES.FILE_TYPE, 
+    AGILE.FILE_INFO.IFS_FILEPATH,
+    AGILE.FILE_INFO.HFS_FILEPATH
+FROM 
+    AGILE.ITEM
+JOIN 
+    AGILE.ATTACHMENT_MAP ON AGILE.ATTACHMENT_MAP.PARENT_ID = AGILE.ITEM.ID AND AGILE.ITEM.CLASS = 9000
+JOIN 
+    AGILE.FILES ON AGILE.FILES.ID = AGILE.ATTACHMENT_MAP.FILE_ID
+JOIN 
+    AGILE.FILE_INFO ON AGILE.FILE_INFO.FILE_ID = AGILE.ATTACHMENT_MAP.FILE_ID
+JOIN 
+    AGILE.NODETABLE ON AGILE.NODETABLE.ID = AGILE.ITEM.SUBCLASS
+WHERE 
+    AGILE.NODETABLE.DESCRIPTION = :subclass
+    AND AGILE.ITEM.ID NOT IN ({EXCLUDED_IDS}
+    )
+    AND AGILE.ITEM.DELETE_FLAG IS NULL
+    AND AGILE.ATTACHMENT_MAP.PARENT_ID2 = (
+        SELECT CHANGE FROM REV WHERE RELEASE_DATE = (
+            SELECT MAX(R.RELEASE_DATE) 
+            FROM REV R, CHANGE C
+            WHERE ITEM = (
+                SELECT ID FROM ITEM WHERE ITEM_NUMBER = AGILE.ITEM.ITEM_NUMBER
+            )
+            AND C.ID = R.CHANGE
+            AND C.CLASS = 6000
+            AND C.DELETE_FLAG IS NULL
+            AND C.RELEASE_DATE IS NOT NULL
+        )
+        AND ITEM = AGILE.ITEM.ID
+    )
+"""
+
+# Attachments referenced through file versions (ATTACHMENT_MAP.FILE_ID = 0)
+VERSION_CHILD_QUERY_TEMPLATE = f"""
+SELECT 
+    I.ITEM_NUMBER, 
+    F.FILENAME, 
+    F.FILE_TYPE, 
+    FI.IFS_FILEPATH, 
+    FI.HFS_FILEPATH
+FROM 
+    ATTACHMENT_MAP AM, 
+    ITEM I, 
+    VERSION_FILE_MAP VFM, 
+    FILES F, 
+    FILE_INFO FI, 
+    NODETABLE N
+WHERE 
+    I.ID = AM.PARENT_ID
+    AND AM.VERSION_ID = VFM.VERSION_ID
+    AND F.ID = VFM.FILE_ID
+    AND F.ID = FI.FILE_ID
+    AND AM.FILE_ID = 0
+    AND N.ID = I.SUBCLASS
+    AND N.DESCRIPTION = :subclass
+    AND I.DELETE_FLAG IS NULL
+    AND I.ID NOT IN ({EXCLUDED_IDS}
+    )
+"""
@@ -0,0 +1,96 @@
+# solr_normalizer.py
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+from zoneinfo import ZoneInfo
+
+from config import ORACLE_DATE_TIMEZONE  # Import from config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+NULL_MARKER = "#null#"
+NULL_STRINGS = {"", "null", "n/a"}
+DATE_TYPES = {"date", "pdate", "pdates", "tdate", "tdates", "daterange"}
+
+
+def is_null(value) -> bool:
+    """The null forms replace_null_values maps to '#null#' on the Oracle side."""
+    return value is None or value == [] or (isinstance(value, str) and value.lower() in NULL_STRINGS)
+
+
+def oracle_timezone(name: str = ORACLE_DATE_TIMEZONE):
+    """tzinfo of the Oracle DATE values (ORACLE_DATE_TIMEZONE)."""
+    return timezone.utc if name.upper() == "UTC" else ZoneInfo(name)
+
+
+def to_epoch(value, tz=None):
+    """Seconds since the epoch for a Solr date ('2021-03-04T10:00:00Z'), an Oracle datetime or
+    a format_cursor_data string ('2021-03-04 10:00:00'); naive values are Oracle DATEs, local
+    times of tz (default ORACLE_DATE_TIMEZONE). Values that are not dates are returned unchanged.
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=tz or _oracle_tz)
+        return int(value.timestamp())
+    return value
+
+
+_oracle_tz = oracle_timezone()
+
+
+def scalar(value):
+    return NULL_MARKER if is_null(value) else value
+
+
+def date_scalar(value):
+    return NULL_MARKER if is_null(value) else to_epoch(value)
+
+
+def unwrap(convert: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """Converter for a field declared single-valued that Solr still returns as a list."""
+    def converter(value):
+        if isinstance(value, list):
+            value = value[0] if value else None
+        return convert(value)
+    return converter
+
+
+def unwrap_single(convert: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """Converter for a multi-valued field: one value becomes a scalar, several stay a list."""
+    def converter(value):
+        if isinstance(value, list):
+            if len(value) != 1:
+                return [convert(v) for v in value] if value else NULL_MARKER
+            value = value[0]
+        return convert(value)
+    return converter
+
+
+class SolrNormalizer:
+    """Turns Solr documents into canonical records: single values unwrapped, dates as epoch
+    seconds and every null form as '#null#', so they compare directly with Oracle rows.
+
+    Converters are compiled once per field from the schema; fields the schema does not
+    list (dynamic or copy fields) get the generic multi-valued converter.
+    """
+
+    def __init__(self, fields: List[Dict[str, Any]] = ()):
+        self.converters: Dict[str, Callable[[Any], Any]] = {}
+        for field in fields:
+            convert = date_scalar if field.get('type') in DATE_TYPES else scalar
+            wrap = unwrap_single if field.get('multiValued') else unwrap
+            self.converters[field['name']] = wrap(convert)
+        self.default = unwrap_single(scalar)
+        logging.info(f"Compiled Solr normalization for {len(self.converters)} schema fields")
+
+    def normalize(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        converters, default = self.converters, self.default
+        return {key: converters.get(key, default)(value) for key, value in doc.items()}
+
+    def normalize_all(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [self.normalize(doc) for doc in docs]
@@ -0,0 +1,154 @@
+# sql_diagnostics.py
+import hashlib
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config import SQL_DIAGNOSTICS, SQL_DIAGNOSTICS_DIR  # Import from config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Row source statistics (actual rows, buffers and time per plan step) for every statement of the session
+ENABLE_STATISTICS = "ALTER SESSION SET STATISTICS_LEVEL = ALL"
+# While this runs, PREV_SQL_ID is the statement the session ran just before it
+LAST_SQL_QUERY = "SELECT PREV_SQL_ID, PREV_CHILD_NUMBER FROM V$SESSION WHERE SID = SYS_CONTEXT('USERENV', 'SID')"
+SQL_STATS_QUERY = """
+SELECT CHILD_NUMBER, PLAN_HASH_VALUE, EXECUTIONS, ELAPSED_TIME, CPU_TIME, USER_IO_WAIT_TIME, CONCURRENCY_WAIT_TIME,
+       BUFFER_GETS, DISK_READS, FETCHES, ROWS_PROCESSED
+FROM V$SQL WHERE SQL_ID = :sql_id
+"""
+PLAN_QUERY = "SELECT PLAN_TABLE_OUTPUT FROM TABLE(DBMS_XPLAN.DISPLAY_CURSOR(:sql_id, :child_number, 'ALLSTATS LAST'))"
+TIME_COLUMNS = ("ELAPSED_TIME", "CPU_TIME", "USER_IO_WAIT_TIME", "CONCURRENCY_WAIT_TIME")  # Microseconds in V$SQL
+COUNT_COLUMNS = ("BUFFER_GETS", "DISK_READS", "FETCHES", "ROWS_PROCESSED")
+# Views the session must be able to read
+DIAGNOSTICS_VIEWS = "V$SESSION, V$SQL and V$SQL_PLAN_STATISTICS_ALL"
+SQL_ID_ALPHABET = "0123456789abcdfghjkmnpqrstuvwxyz"
+
+
+def sql_id(statement: str) -> str:
+    """The SQL_ID Oracle gives a statement text: the last 64 bits of its MD5 (with a trailing NUL) in base 32."""
+    _, _, high, low = struct.unpack("<4I", hashlib.md5(statement.encode("utf-8") + b"\0").digest())
+    value = (high << 32) | low
+    return "".join(SQL_ID_ALPHABET[(value >> (5 * n)) & 31] for n in reversed(range(13)))
+
+
+class SqlDiagnostics:
+    """Server-side statistics and the executed plan of every query a run sends to Oracle.
+
+    Sessions run with STATISTICS_LEVEL = ALL. After each query the same session looks up
+    its sql_id and reads the V$SQL statistics and the DBMS_XPLAN 'ALLSTATS LAST' plan,
+    which shows actual rows, buffer gets and time per plan step of that execution. V$SQL
+    totals are cumulative over every execution of the cursor, so they are also read just
+    before the query (by the sql_id of its text) and the difference is reported. When
+    other sessions run the same text meanwhile, as the partitions of a query do, the
+    difference covers their executions too and is averaged over them. Comparing the database elapsed time with the client-side time of the execute and
+    fetch separates database time from network transfer and Python time. Queries of
+    AsyncOracleConnection are not covered. The session needs SELECT on DIAGNOSTICS_VIEWS
+    (e.g. SELECT_CATALOG_ROLE).
+    """
+
+    def __init__(self, output_dir: str = SQL_DIAGNOSTICS_DIR):
+        self.output_dir = output_dir
+        self.records: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()  # Partitioned queries report from several threads
+
+    def prepare(self, connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(ENABLE_STATISTICS)
+        finally:
+            cursor.close()
+
+    def read_stats(self, cursor, statement_id: str) -> Dict[int, Dict[str, Any]]:
+        """{child number: V$SQL totals} of a sql_id."""
+        cursor.execute(SQL_STATS_QUERY, {"sql_id": statement_id})
+        columns = [col[0] for col in cursor.description]
+        return {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+    def snapshot(self, connection, query: str) -> tuple:
+        """(sql_id, V$SQL totals per child) of a query about to run, the baseline of collect."""
+        cursor = connection.cursor()
+        try:
+            statement_id = sql_id(query)
+            return statement_id, self.read_stats(cursor, statement_id)
+        finally:
+            cursor.close()
+
+    def collect(self, connection, query: str, client_seconds: float, rows: int, before: tuple = None) -> Dict[str, Any]:
+        """Record the statistics of the statement the session just ran, less the snapshot taken before it."""
+        cursor = connection.cursor()
+        try:
+            cursor.execute(LAST_SQL_QUERY)
+            statement_id, child_number = cursor.fetchone()
+            stats = self.read_stats(cursor, statement_id).get(child_number, {})
+            cursor.execute(PLAN_QUERY, {"sql_id": statement_id, "child_number": child_number})
+            plan = "\n".join(line[0] or "" for line in cursor.fetchall())
+        finally:
+            cursor.close()
+
+        # A child cursor missing from the snapshot was created by this execution
+        baseline = before[1].get(child_number, {}) if before and before[0] == statement_id else {}
+        executions = stats["EXECUTIONS"] - baseline.get("EXECUTIONS", 0) if stats else None
+        record = {"sql_id": statement_id, "child_number": child_number, "query": " ".join(query.split())[:200],
+                  "rows": rows, "client_seconds": client_seconds, "executions": executions,
+                  "plan_hash_value": stats.get("PLAN_HASH_VALUE")}
+        for column in TIME_COLUMNS:
+            record[f"db_{column[:-5].lower()}_seconds"] = (
+                (stats[column] - baseline.get(column, 0)) / (executions or 1) / 1e6 if stats else None)
+        for column in COUNT_COLUMNS:
+            record[column.lower()] = (stats[column] - baseline.get(column, 0)) / (executions or 1) if stats else None
+        if record["db_elapsed_seconds"] is not None:
+            record["transfer_and_client_seconds"] = max(0.0, client_seconds - record["db_elapsed_seconds"])
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        plan_path = os.path.join(self.output_dir, f"{statement_id}-{child_number}.plan.txt")
+        with open(plan_path, "w") as fh:
+            fh.write(f"-- {record['query']}\n{plan}\n")
+        record["plan_file"] = plan_path
+        with self.lock:
+            self.records.append(record)
+        logging.info(format_sql_record(record))
+        return record
+
+    def write(self) -> Optional[str]:
+        """Save the records of the run as JSON next to the plan files and return the path."""
+        if not self.records:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"sql_stats-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, "w") as fh:
+            json.dump(self.records, fh, indent=2, default=str)
+        logging.info(f"Wrote diagnostics of {len(self.records)} queries to {path}")
+        return path
+
+
+def format_sql_record(record: Dict[str, Any]) -> str:
+    if record["db_elapsed_seconds"] is None:
+        return f"SQL {record['sql_id']}: {record['client_seconds']:.2f}s client-side, no V$SQL statistics (cursor aged out)"
+    return (f"SQL {record['sql_id']} (plan {record['plan_hash_value']}): {record['client_seconds']:.2f}s client-side, "
+            f"{record['db_elapsed_seconds']:.2f}s in the database (CPU {record['db_cpu_seconds']:.2f}s, "
+            f"I/O wait {record['db_user_io_wait_seconds']:.2f}s), {record['transfer_and_client_seconds']:.2f}s transfer and client; "
+            f"{record['buffer_gets']:.0f} buffer gets, {record['disk_reads']:.0f} disk reads, "
+            f"{record['fetches']:.0f} fetches for {record['rows']} rows")
+
+
+_default_diagnostics = None
+
+
+def enable(output_dir: str = SQL_DIAGNOSTICS_DIR) -> SqlDiagnostics:
+    """Collect diagnostics for every Oracle query of this process (main.py --sql-diagnostics)."""
+    global _default_diagnostics
+    _default_diagnostics = SqlDiagnostics(output_dir)
+    return _default_diagnostics
+
+
+def get_sql_diagnostics() -> Optional[SqlDiagnostics]:
+    """Return the run's diagnostics, or None when SQL_DIAGNOSTICS is off and QA_SQL_DIAGNOSTICS is not set."""
+    global _default_diagnostics
+    if _default_diagnostics is None and (SQL_DIAGNOSTICS or os.environ.get("QA_SQL_DIAGNOSTICS")):
+        _default_diagnostics = SqlDiagnostics()
+    return _default_diagnostics
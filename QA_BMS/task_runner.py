@@ -0,0 +1,87 @@
+# task_runner.py
+import argparse
+import json
+import logging
+
+from discrepancy_sink import DiscrepancySink
+from perf_history import get_recorder
+from sample_check import SampleChecker
+from record_counts import DataConsistencyChecker
+from status_check import LifeCycleChecker
+from column_comparator import ColumnComparator
+from file_vault_check import FileVaultChecker
+from facet_reconciliation import FacetReconciliationChecker
+from duplicate_check import DuplicateChecker
+from distinct_count_check import DistinctCountChecker
+from config import DOCTYPE, PARENT_QUERY, CHILD_QUERIES, ORACLE_PARTITIONS, ORACLE_JOIN_MODE  # Import from config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def run_slice(low: int, high: int, sink: DiscrepancySink) -> dict:
+    """Field-level comparison of every item whose hash bucket is in [low, high)."""
+    estimates = SampleChecker(sink=sink, buckets=(low, high)).run_sample_check()
+    return {"documents": estimates["document"]["total"], "estimates": estimates}
+
+
+def run_document_checks(sink: DiscrepancySink) -> dict:
+    """Record counts and column names, both compared on one fetch of the doctype's Oracle documents."""
+    counts = DataConsistencyChecker(sink=sink)
+    with get_recorder().phase("task_runner.oracle") as phase:
+        try:
+            counts.oracle_conn.connect()
+            oracle_data = counts.oracle_conn.fetch_documents(PARENT_QUERY, CHILD_QUERIES, partitions=ORACLE_PARTITIONS,
+                                                             join_mode=ORACLE_JOIN_MODE)
+        finally:
+            counts.oracle_conn.close()
+        phase['rows'] = len(oracle_data)
+    counts.check_counts(oracle_data)
+    ColumnComparator(sink=sink).check_columns(oracle_data)
+    return {"oracle_documents": len(oracle_data)}
+
+
+def run_lifecycle_check(sink: DiscrepancySink) -> dict:
+    LifeCycleChecker(sink=sink).run_solr_data_lifecycle_and_production_check()
+    return {}
+
+
+def run_file_vault_check(sink: DiscrepancySink) -> dict:
+    return {"file_vault": FileVaultChecker(sink=sink).run_file_vault_check()}
+
+
+def run_aggregate_checks(sink: DiscrepancySink) -> dict:
+    """Checks that compare Oracle aggregates with Solr facets, without fetching documents."""
+    mismatched_groups = FacetReconciliationChecker(sink=sink).run_facet_reconciliation()
+    duplicates = DuplicateChecker(sink=sink).run_duplicate_check()
+    drifted_months = DistinctCountChecker(sink=sink).run_distinct_count_check()
+    return {"mismatched_groups": len(mismatched_groups), "duplicates": len(duplicates), "drifted_months": len(drifted_months)}
+
+
+# Checks that look at the whole doctype at once and cannot be split by hash range. Each is
+# its own task, so they run side by side; only "documents" fetches the Oracle documents.
+DOCTYPE_TASKS = {
+    "documents": run_document_checks,
+    "lifecycle": run_lifecycle_check,
+    "file_vault": run_file_vault_check,
+    "aggregates": run_aggregate_checks,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one task of a distributed validation run (see ../distributed.py).")
+    parser.add_argument("kind", choices=["slice", *DOCTYPE_TASKS])
+    parser.add_argument("--low", type=int, help="First hash bucket of a slice")
+    parser.add_argument("--high", type=int, help="Hash bucket after the last one of a slice")
+    parser.add_argument("--sink", required=True, help="Discrepancy file of this task")
+    parser.add_argument("--output", required=True, help="JSON file the partial result is written to")
+    args = parser.parse_args()
+
+    sink = DiscrepancySink(path=args.sink)
+    result = run_slice(args.low, args.high, sink) if args.kind == "slice" else DOCTYPE_TASKS[args.kind](sink)
+    sink.close()
+    get_recorder().save()
+
+    result.update({"doctype": DOCTYPE, "kind": args.kind,
+                   "discrepancies": {f"{checker}.{field}": n for (checker, field, _), n in sink.aggregates.items()}})
+    with open(args.output, "w") as fh:
+        json.dump(result, fh, default=str)
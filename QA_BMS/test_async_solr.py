@@ -0,0 +1,162 @@
+import asyncio
+import types
+import pytest
+import db_connections
+import fetch_controller
+from db_connections import AsyncSolrConnection, SolrFetchError, SOLR_RETRIES
+from fetch_controller import AdaptiveFetchController
+
+DOCS = [{"id": f"DOC-{n:02d}"} for n in range(11)]
+
+class FakeResponse:
+    def __init__(self, status, data):
+        self.status = status
+        self.data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise OSError(f"{self.status} Server Error")
+
+    async def json(self):
+        return self.data
+
+class FakeSolrServer:
+    """aiohttp stand-in serving DOCS by cursorMark; the {!hash} worker n gets every slices-th document."""
+
+    def __init__(self, slices, failures=0):
+        self.slices = slices
+        self.failures = failures  # Pages that fail before the server answers again
+        self.requests = []
+
+    def get(self, url, params):
+        self.requests.append((url, params))
+        if self.failures:
+            self.failures -= 1
+            return FakeResponse(500, None)
+        fq = params.get("fq", "")
+        worker = int(fq.split("worker=")[1].split()[0]) if fq else int(url[:-len("/select")].rsplit("shard", 1)[1])
+        docs = DOCS[worker::self.slices]
+        start = 0 if params["cursorMark"] == "*" else int(params["cursorMark"])
+        end = start + int(params["rows"])
+        return FakeResponse(200, {"responseHeader": {"QTime": 1}, "response": {"docs": docs[start:end]},
+                                  "nextCursorMark": str(min(end, len(docs)))})
+
+    def module(self):
+        server = self
+
+        class ClientSession:
+            def __init__(self, **kwargs):
+                pass
+
+            async def __aenter__(self):
+                return server
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return types.SimpleNamespace(ClientSession=ClientSession, TCPConnector=lambda **kwargs: None,
+                                     ClientTimeout=lambda **kwargs: None)
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Seconds asked of asyncio.sleep, which only yields to the other slices."""
+    real_sleep = asyncio.sleep
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        await real_sleep(0)
+
+    monkeypatch.setattr(db_connections.asyncio, "sleep", fake_sleep)
+    return sleeps
+
+def install(monkeypatch, server):
+    monkeypatch.setitem(db_connections._loaded_drivers, "async_http", server.module())
+    controller = AdaptiveFetchController(rows=2, min_rows=2, max_rows=2, target_latency=10, max_concurrency=2, load_share=1000)
+    monkeypatch.setitem(fetch_controller._controllers, "solr:8983", controller)
+
+def test_hash_slices_are_paged_and_merged(monkeypatch, sleeps):
+    server = FakeSolrServer(slices=3)
+    install(monkeypatch, server)
+
+    docs = AsyncSolrConnection("http://solr:8983/solr/DOC", slices=3).fetch_data("doc_type:DOC", normalize=False, fl="id")
+
+    assert sorted(doc["id"] for doc in docs) == [doc["id"] for doc in DOCS], "Test failed: The slices do not merge to every document."
+    assert {params["fq"] for _, params in server.requests} == {f"{{!hash workers=3 worker={n} partitionKeys=id}}" for n in range(3)}, \
+        "Test failed: A slice was not restricted to its hash partition."
+    assert all(params["q"] == "doc_type:DOC" and params["fl"] == "id" for _, params in server.requests), \
+        "Test failed: The query parameters were not passed to every slice."
+    marks = [params["cursorMark"] for _, params in server.requests if params["fq"].endswith("worker=0 partitionKeys=id}")]
+    assert marks == ["*", "2", "4"], "Test failed: A slice was not paged with its own cursorMark."
+
+def test_shard_slices_are_queried_directly(monkeypatch, sleeps):
+    server = FakeSolrServer(slices=2)
+    install(monkeypatch, server)
+    shards = ["http://solr:8983/solr/DOC_shard0", "http://solr:8983/solr/DOC_shard1"]
+
+    docs = AsyncSolrConnection("http://solr:8983/solr/DOC", shard_urls=shards).fetch_data(normalize=False)
+
+    assert len(docs) == len(DOCS), "Test failed: The shard slices do not merge to every document."
+    assert {url for url, _ in server.requests} == {f"{shard}/select" for shard in shards}, "Test failed: The shards were not queried."
+    assert all(params["distrib"] == "false" and "fq" not in params for _, params in server.requests), \
+        "Test failed: A shard request was distributed or hash filtered."
+
+def test_failed_page_is_retried(monkeypatch, sleeps):
+    server = FakeSolrServer(slices=1, failures=SOLR_RETRIES)
+    install(monkeypatch, server)
+
+    docs = AsyncSolrConnection("http://solr:8983/solr/DOC", slices=1).fetch_data(normalize=False)
+
+    assert len(docs) == len(DOCS), "Test failed: Documents were lost after a retried page."
+    assert [s for s in sleeps if s >= 1] == [2 ** attempt for attempt in range(1, SOLR_RETRIES + 1)], \
+        "Test failed: The retries did not back off exponentially."
+
+def test_slice_raises_after_the_last_retry(monkeypatch, sleeps):
+    server = FakeSolrServer(slices=1, failures=SOLR_RETRIES + 1)
+    install(monkeypatch, server)
+
+    with pytest.raises(SolrFetchError, match="stopped after 0 documents"):
+        AsyncSolrConnection("http://solr:8983/solr/DOC", slices=1).fetch_data(normalize=False)
+    assert len(server.requests) == SOLR_RETRIES + 1, "Test failed: The page was not retried SOLR_RETRIES times."
+
+class TrackedResponse(FakeResponse):
+    """Response that counts the requests in flight on its server."""
+
+    def __init__(self, server, response):
+        super().__init__(response.status, response.data)
+        self.server = server
+
+    async def __aenter__(self):
+        self.server.in_flight += 1
+        self.server.peak = max(self.server.peak, self.server.in_flight)
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.in_flight -= 1
+        return False
+
+def test_requests_in_flight_stay_within_the_concurrency(monkeypatch, sleeps):
+    server = FakeSolrServer(slices=4)
+    server.in_flight = server.peak = 0
+    get = server.get
+    server.get = lambda url, params: TrackedResponse(server, get(url, params))
+    install(monkeypatch, server)
+    controller = fetch_controller._controllers["solr:8983"]
+
+    async def throttled():
+        await asyncio.sleep(0)  # The token bucket yields to the other slices
+
+    monkeypatch.setattr(controller, "before_request_async", throttled)
+
+    docs = AsyncSolrConnection("http://solr:8983/solr/DOC", slices=4).fetch_data(normalize=False)
+
+    assert len(docs) == len(DOCS), "Test failed: Documents were lost."
+    assert server.peak <= controller.max_concurrency, \
+        f"Test failed: {server.peak} requests were in flight with a concurrency of {controller.max_concurrency}."
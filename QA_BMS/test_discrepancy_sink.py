@@ -0,0 +1,55 @@
+import gzip
+import json
+import pytest
+from discrepancy_sink import DiscrepancySink
+
+def read(path):
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh]
+
+def test_each_run_starts_a_new_file(tmp_path):
+    path = str(tmp_path / "discrepancies.jsonl.gz")
+    for run_id in ("run-1", "run-2", "run-3"):
+        sink = DiscrepancySink(path=path, run_id=run_id, keep_runs=1)
+        if run_id != "run-3":
+            sink.record("sample_check", "title", key=run_id)
+        sink.close()
+
+    assert read(path) == [], "Test failed: A run without discrepancies kept the previous run's records."
+    assert [rec["run"] for rec in read(f"{path}.1")] == ["run-2"], "Test failed: The previous run's file was not kept."
+    assert not (tmp_path / "discrepancies.jsonl.gz.2").exists(), "Test failed: More than keep_runs files were kept."
+
+def test_counts_and_summary(tmp_path):
+    sink = DiscrepancySink(path=str(tmp_path / "discrepancies.jsonl.gz"), doctype="DOC")
+    sink.record("sample_check", "title", key="DOC-1")
+    sink.record("sample_check", "title", key="DOC-2")
+    sink.record("sample_check", "missing_in_solr", key="DOC-3")
+    sink.record("record_counts", "count", oracle=3, solr=2)
+
+    assert sink.count() == 4, "Test failed: Wrong total count."
+    assert sink.count(checker="sample_check") == 3, "Test failed: The checker filter was not applied."
+    assert sink.count(checker="sample_check", field="title") == 2, "Test failed: The field filter was not applied."
+    assert sink.count(doctype="BV") == 0, "Test failed: The doctype filter was not applied."
+    assert sink.summary() == {"record_counts.count.DOC": 1, "sample_check.missing_in_solr.DOC": 1, "sample_check.title.DOC": 2}, \
+        "Test failed: Wrong summary totals."
+    sink.close()
+
+def test_buffer_is_flushed_at_buffer_size(tmp_path):
+    path = str(tmp_path / "discrepancies.jsonl.gz")
+    sink = DiscrepancySink(path=path, buffer_size=2)
+    sink.record("sample_check", "title", key="DOC-1")
+    assert sink.file is None, "Test failed: The file was written before the buffer was full."
+    sink.record("sample_check", "title", key="DOC-2")
+    assert sink.buffer == [] and sink.file is not None, "Test failed: The full buffer was not written out."
+    sink.record("sample_check", "title", key="DOC-3")
+    sink.close()
+
+    assert [rec["key"] for rec in read(path)] == ["DOC-1", "DOC-2", "DOC-3"], "Test failed: Records were lost or reordered."
+
+def test_closed_sink_rejects_records(tmp_path):
+    sink = DiscrepancySink(path=str(tmp_path / "discrepancies.jsonl.gz"))
+    sink.close()
+    sink.close()  # Idempotent, e.g. main.py and then atexit
+
+    with pytest.raises(ValueError, match="is closed"):
+        sink.record("sample_check", "title", key="DOC-1")
@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+import pytest
+from facet_reconciliation import (FacetReconciliationChecker, utc_month, grouped_count_query, grouped_count_facet,
+                                  flatten_facets, fold_early_months)
+from distinct_count_check import distinct_count_query
+from discrepancy_sink import DiscrepancySink
+from db_connections import OracleConnection
+from repair import solr_value
+from solr_normalizer import oracle_timezone, to_epoch
+
+def test_run_facet_reconciliation(tmp_path):
+    sink = DiscrepancySink(path=str(tmp_path / "discrepancies.jsonl.gz"))
+    checker = FacetReconciliationChecker(sink=sink)
+
+    mismatched = checker.run_facet_reconciliation()
+    sink.close()
+
+    assert sink.count(checker="facet_reconciliation") == 0, f"Test failed: Group counts differ for {mismatched}"
+
+def test_months_are_taken_in_utc():
+    assert utc_month("P.RELEASE_DATE", "America/Los_Angeles") == \
+        "TO_CHAR(SYS_EXTRACT_UTC(FROM_TZ(CAST(P.RELEASE_DATE AS TIMESTAMP), 'America/Los_Angeles')), 'YYYY-MM')", \
+        "Test failed: The release month is not converted to UTC."
+    assert "TO_CHAR(RELEASE_DATE, 'YYYY-MM')" in distinct_count_query("SELECT * FROM T", "release_date"), \
+        "Test failed: UTC DATE values were converted."
+
+def test_dates_follow_one_time_zone_convention():
+    # Oracle DATEs are local times of ORACLE_DATE_TIMEZONE (UTC by default) in the month buckets and the field comparisons
+    late_evening = "2021-03-31 20:30:00"
+    assert to_epoch(late_evening) == to_epoch("2021-03-31T20:30:00Z"), "Test failed: A naive Oracle DATE was not read as UTC."
+    assert solr_value(late_evening, "pdate") == "2021-03-31T20:30:00Z", "Test failed: The repair did not index the DATE as UTC."
+    pacific = oracle_timezone("America/Los_Angeles")
+    assert datetime.fromtimestamp(to_epoch(late_evening, pacific), timezone.utc).strftime("%Y-%m") == "2021-04", \
+        "Test failed: A Pacific DATE was not converted to UTC."
+    assert "'America/Los_Angeles'" in utc_month("RELEASE_DATE", "America/Los_Angeles"), \
+        "Test failed: The month buckets do not use the same time zone."
+
+PARENTS = [("DOC-1", "Spec", "Production", "DOC", "2021-03-04 10:00:00"),
+           ("DOC-2", "Spec", "Production", "DOC", "2021-03-20 00:00:00"),
+           ("DOC-3", "Spec", "n/a", "DOC", None),
+           ("DOC-4", "Memo", "Production", "DOC", "1985-06-01 00:00:00"),
+           ("DOC-5", "Memo", "Production", "DOC", "1989-12-31 00:00:00")]
+CHILDREN = [("DOC-1", "a.pdf"), ("doc-1", "b.pdf"), ("DOC-3", "c.pdf")]
+
+def test_grouped_count_query_counts_documents(fake_oracle):
+    fake_oracle.db.executescript("CREATE TABLE parents (ITEM_NUMBER, SUBCLASS, LIFECYCLE, DOC_TYPE, RELEASE_DATE);"
+                                 "CREATE TABLE children (ITEM_NUMBER, FILENAME);")
+    fake_oracle.db.executemany("INSERT INTO parents VALUES (?, ?, ?, ?, ?)", PARENTS)
+    fake_oracle.db.executemany("INSERT INTO children VALUES (?, ?)", CHILDREN)
+    query = grouped_count_query("SELECT * FROM parents", ["SELECT * FROM children"], ["subclass", "lifecycle"], "release_date")
+    conn = OracleConnection("user/password@db")
+    conn.connect()
+    rows = conn.execute_query(query)
+    conn.close()
+
+    counts = fold_early_months({(row["G0"], row["G1"], row["G2"]): row["DOC_COUNT"] for row in rows}, "1990-01-01T00:00:00Z")
+    assert counts == {("Spec", "Production", "2021-03"): 3, ("Spec", "#null#", "#null#"): 1, ("Memo", "Production", "<1990-01"): 2}, \
+        "Test failed: Wrong document counts per group."
+
+def test_flatten_facets_counts_early_and_undated_documents():
+    facet = grouped_count_facet(["subclass"], "release_date", "1990-01-01T00:00:00Z")
+    assert facet["subclass"]["facet"]["month"]["other"] == "before" and "undated" in facet["subclass"]["facet"], \
+        "Test failed: The facet has no bucket for early or undated documents."
+    response = {"subclass": {
+        "buckets": [{"val": "Spec", "count": 4, "month": {"buckets": [{"val": "2021-03-01T00:00:00Z", "count": 3}],
+                                                         "before": {"count": 0}},
+                     "undated": {"count": 1}},
+                    {"val": "Memo", "count": 2, "month": {"buckets": [], "before": {"count": 2}}, "undated": {"count": 0}}],
+        "missing": {"count": 1, "month": {"buckets": [{"val": "2022-01-01T00:00:00Z", "count": 1}]}}}}
+
+    assert flatten_facets(response, ["subclass"], "release_date", month_start="1990-01-01T00:00:00Z") == \
+        {("Spec", "2021-03"): 3, ("Spec", "#null#"): 1, ("Memo", "<1990-01"): 2, ("#null#", "2022-01"): 1}, \
+        "Test failed: Facet buckets were not flattened."
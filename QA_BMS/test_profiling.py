@@ -0,0 +1,41 @@
+import os
+import pytest
+import profiling
+from profiling import profiled
+
+@pytest.fixture
+def profile_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "_targets", set())
+    monkeypatch.setattr(profiling, "_profiles", {})
+    return tmp_path
+
+@profiled("inner_phase")
+def inner_phase(n):
+    return sum(range(n))
+
+@profiled("outer_checker")
+def outer_checker(n):
+    return inner_phase(n) + 1
+
+@profiled("row_generator")
+def row_generator(n):
+    yield from range(n)
+
+def test_profiling_is_off_unless_enabled(profile_dir):
+    assert outer_checker(10) == 46, "Test failed: The profiled function returned a different result."
+    assert os.listdir(profile_dir) == [], "Test failed: A profile was written without a target."
+
+def test_profiled_checker_writes_profiles_and_covers_its_phases(profile_dir):
+    profiling.enable(["outer_checker", "inner_phase"])
+
+    assert outer_checker(10) == 46, "Test failed: The profiled function returned a different result."
+
+    assert sorted(os.listdir(profile_dir)) == ["outer_checker.collapsed", "outer_checker.pstats", "outer_checker.tracemalloc.txt"], \
+        "Test failed: The profile files are missing, or a nested phase was profiled separately."
+
+def test_profiled_generator_covers_the_whole_iteration(profile_dir):
+    profiling.enable(["all"])
+
+    assert list(row_generator(3)) == [0, 1, 2], "Test failed: The profiled generator yielded different items."
+    assert os.path.exists(profile_dir / "row_generator.pstats"), "Test failed: The generator was not profiled."
@@ -1,14 +1,18 @@
 import pytest
 from record_counts import DataConsistencyChecker
+from discrepancy_sink import DiscrepancySink
 
 @pytest.mark.usefixtures("caplog")
-def test_compare_data_count(caplog):
-    # Initialize the DataConsistencyChecker
-    checker = DataConsistencyChecker()
+def test_compare_data_count(caplog, tmp_path):
+    # Initialize the DataConsistencyChecker with its own sink
+    sink = DiscrepancySink(path=str(tmp_path / "discrepancies.jsonl.gz"))
+    checker = DataConsistencyChecker(sink=sink)
 
     # Call the compare_documents method to test document comparison
     with caplog.at_level("INFO"):
         checker.run_consistency_check()
+    sink.close()
 
+    # Assert data was fetched and the record counts match
     assert "Fetched" in caplog.text, "Test failed: Data fetching logs not found."
-    assert "Record counts match between Oracle and Solr." in caplog.text, "Test failed: Record counts do not match."
+    assert sink.count(checker="record_counts") == 0, "Test failed: Record counts do not match."
@@ -0,0 +1,33 @@
+import pytest
+from sample_check import SampleChecker, wilson_interval
+from discrepancy_sink import DiscrepancySink
+
+def test_wilson_interval_bounds_rate():
+    low, high = wilson_interval(5, 1000, confidence=0.95)
+
+    assert 0 < low < 0.005 < high < 0.02, "Test failed: The interval does not bracket the observed rate."
+    assert wilson_interval(0, 1000)[0] == 0.0, "Test failed: The interval went below zero."
+
+def test_compare_sample_counts_documents_missing_on_either_side(tmp_path):
+    sink = DiscrepancySink(path=str(tmp_path / "discrepancies.jsonl.gz"))
+    checker = SampleChecker(fraction=0.01, sink=sink)
+    oracle_rows = [{"item_number": "DOC-1", "filename": "a.pdf", "title": "A"},
+                   {"item_number": "DOC-2", "filename": "b.pdf", "title": "B"}]
+    solr_docs = [{"item_number": "DOC-1", "filename": "a.pdf", "title": "A"},
+                 {"item_number": "DOC-1", "filename": "stale.pdf", "title": "A"}]
+
+    estimates = checker.compare_sample(oracle_rows, solr_docs)
+    sink.close()
+
+    assert sink.count(checker="sample_check", field="missing_in_oracle") == 1, "Test failed: A Solr-only document was dropped."
+    assert (estimates["document"]["errors"], estimates["document"]["total"]) == (2, 3), \
+        "Test failed: The document rate does not cover both directions."
+
+def test_run_sample_check(tmp_path):
+    sink = DiscrepancySink(path=str(tmp_path / "discrepancies.jsonl.gz"))
+    checker = SampleChecker(fraction=0.01, sink=sink)
+
+    estimates = checker.run_sample_check()
+    sink.close()
+
+    assert sink.count(checker="sample_check") == 0, f"Test failed: Sampled documents differ: {estimates}"
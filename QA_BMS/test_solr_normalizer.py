@@ -0,0 +1,30 @@
+import pytest
+from solr_normalizer import SolrNormalizer, to_epoch
+
+SCHEMA_FIELDS = [
+    {"name": "item_number", "type": "string", "multiValued": False},
+    {"name": "release_date", "type": "pdate", "multiValued": False},
+    {"name": "filename", "type": "text_general", "multiValued": True},
+]
+
+def test_normalize_unwraps_single_values_and_parses_dates():
+    normalizer = SolrNormalizer(SCHEMA_FIELDS)
+
+    doc = normalizer.normalize({"item_number": ["DOC-1"], "release_date": ["2021-03-04T10:00:00Z"], "filename": ["a.pdf"]})
+
+    assert doc == {"item_number": "DOC-1", "release_date": to_epoch("2021-03-04 10:00:00"), "filename": "a.pdf"}, \
+        "Test failed: Solr values were not normalized to match Oracle values."
+
+def test_normalize_maps_null_forms():
+    normalizer = SolrNormalizer(SCHEMA_FIELDS)
+
+    doc = normalizer.normalize({"item_number": ["N/A"], "release_date": [], "filename": ["null"], "rev_number": [""]})
+
+    assert set(doc.values()) == {"#null#"}, "Test failed: A null form was not mapped to #null#."
+
+def test_normalize_keeps_multiple_values():
+    normalizer = SolrNormalizer(SCHEMA_FIELDS)
+
+    doc = normalizer.normalize({"filename": ["a.pdf", "b.pdf"]})
+
+    assert doc == {"filename": ["a.pdf", "b.pdf"]}, "Test failed: A multi-valued field lost values."
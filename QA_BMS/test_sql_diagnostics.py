@@ -0,0 +1,83 @@
+import pytest
+from sql_diagnostics import SqlDiagnostics, format_sql_record, sql_id, LAST_SQL_QUERY, SQL_STATS_QUERY, PLAN_QUERY
+
+STAT_COLUMNS = ["CHILD_NUMBER", "PLAN_HASH_VALUE", "EXECUTIONS", "ELAPSED_TIME", "CPU_TIME", "USER_IO_WAIT_TIME",
+                "CONCURRENCY_WAIT_TIME", "BUFFER_GETS", "DISK_READS", "FETCHES", "ROWS_PROCESSED"]
+
+class FakeDiagnosticsCursor:
+    def __init__(self, views):
+        self.views = views
+        self.description = None
+        self.rows = []
+
+    def execute(self, query, params=None):
+        if query == LAST_SQL_QUERY:
+            self.rows = [self.views["session"]]
+        elif query == SQL_STATS_QUERY:
+            self.description = [(column,) for column in STAT_COLUMNS]
+            self.rows = [row for row in self.views["sql"] if params["sql_id"] == self.views["sql_id"]]
+        elif query == PLAN_QUERY:
+            self.rows = [("Plan hash value: 42",), (None,), ("| Id | Operation |",)]
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+class FakeDiagnosticsConnection:
+    """V$SESSION, V$SQL and DBMS_XPLAN of a session that just ran QUERY."""
+
+    def __init__(self, sql_rows):
+        self.views = {"session": (sql_id(QUERY), 0), "sql_id": sql_id(QUERY), "sql": sql_rows}
+
+    def cursor(self):
+        return FakeDiagnosticsCursor(self.views)
+
+QUERY = "SELECT ITEM_NUMBER FROM parents"
+
+def test_sql_id_matches_oracle():
+    assert sql_id("select * from dual") == "a5ks9fhw2v9s1", "Test failed: The SQL_ID differs from Oracle's."
+
+def test_collect_reports_the_difference_to_the_snapshot(tmp_path):
+    diagnostics = SqlDiagnostics(str(tmp_path))
+    connection = FakeDiagnosticsConnection([(0, 42, 9, 90_000_000, 40_000_000, 30_000_000, 0, 9000, 900, 90, 900)])
+    before = diagnostics.snapshot(connection, QUERY)
+    connection.views["sql"] = [(0, 42, 10, 92_000_000, 41_000_000, 30_500_000, 0, 9100, 910, 92, 1000)]
+
+    record = diagnostics.collect(connection, QUERY, client_seconds=3.0, rows=100, before=before)
+
+    assert record["executions"] == 1 and record["db_elapsed_seconds"] == pytest.approx(2.0), \
+        "Test failed: The lifetime V$SQL totals were reported instead of this execution's."
+    assert (record["buffer_gets"], record["disk_reads"], record["rows_processed"]) == (100, 10, 100), \
+        "Test failed: The counters were not taken as the difference to the snapshot."
+    assert record["transfer_and_client_seconds"] == pytest.approx(1.0), "Test failed: The client-side share is wrong."
+    with open(record["plan_file"]) as fh:
+        assert "Plan hash value: 42" in fh.read(), "Test failed: The plan was not written."
+    assert format_sql_record(record).startswith(f"SQL {sql_id(QUERY)} (plan 42): 3.00s client-side, 2.00s in the database"), \
+        "Test failed: The record was not formatted."
+
+def test_collect_without_a_snapshot_counts_a_new_cursor_whole(tmp_path):
+    diagnostics = SqlDiagnostics(str(tmp_path))
+    connection = FakeDiagnosticsConnection([])
+    before = diagnostics.snapshot(connection, QUERY)
+    connection.views["sql"] = [(0, 42, 1, 2_000_000, 1_000_000, 500_000, 0, 100, 10, 2, 100)]
+
+    record = diagnostics.collect(connection, QUERY, client_seconds=3.0, rows=100, before=before)
+
+    assert (record["executions"], record["buffer_gets"]) == (1, 100), "Test failed: A new child cursor was not counted whole."
+
+def test_aged_out_cursor_has_no_statistics(tmp_path):
+    diagnostics = SqlDiagnostics(str(tmp_path))
+    connection = FakeDiagnosticsConnection([])
+
+    record = diagnostics.collect(connection, QUERY, client_seconds=1.5, rows=10)
+
+    assert record["db_elapsed_seconds"] is None and record["buffer_gets"] is None, \
+        "Test failed: Statistics were reported for a cursor missing from V$SQL."
+    assert format_sql_record(record) == f"SQL {sql_id(QUERY)}: 1.50s client-side, no V$SQL statistics (cursor aged out)", \
+        "Test failed: The aged-out record was not formatted."
+    assert diagnostics.records == [record], "Test failed: The record was not kept for the run."
@@ -1,14 +1,42 @@
 import pytest
 from status_check import LifeCycleChecker
+from discrepancy_sink import DiscrepancySink
+from solr_normalizer import SolrNormalizer
 
-@pytest.mark.usefixtures("caplog")
-def test_run_solr_data_lifecycle_and_production_check(caplog):
-    # Initialize the LifeCycleChecker
-    checker = LifeCycleChecker()
+def test_run_solr_data_lifecycle_and_production_check(tmp_path):
+    # Initialize the LifeCycleChecker with its own sink
+    sink = DiscrepancySink(path=str(tmp_path / "discrepancies.jsonl.gz"))
+    checker = LifeCycleChecker(sink=sink)
 
     # Run the method under test
-    with caplog.at_level("INFO"):
-        checker.run_solr_data_lifecycle_and_production_check()
+    checker.run_solr_data_lifecycle_and_production_check()
+    sink.close()
 
     # Assert that the discrepancy count is 0
-    assert "Discrepancy Count: 0" in caplog.text, "Test failed: Discrepancy count is not 0."
+    assert sink.count(checker="status_check") == 0, "Test failed: Discrepancy count is not 0."
+
+class NormalizedSolr:
+    """Returns documents the way SolrConnection.fetch_data does: normalized with the schema."""
+
+    def __init__(self, docs):
+        self.normalizer = SolrNormalizer([{"name": "lifecycle", "type": "string"}, {"name": "item_number", "type": "string"},
+                                          {"name": "release_date", "type": "pdate"}])
+        self.docs = docs
+
+    def fetch_data(self, query='*:*', **kwargs):
+        return self.normalizer.normalize_all(self.docs)
+
+def test_status_check_on_normalized_documents(tmp_path):
+    sink = DiscrepancySink(path=str(tmp_path / "discrepancies.jsonl.gz"))
+    checker = LifeCycleChecker(sink=sink)
+    checker.solr_conn = NormalizedSolr([
+        {"item_number": ["Doc DOC-1"], "lifecycle": ["Rev Production"], "release_date": ["2021-03-04T10:00:00Z"]},
+        {"item_number": ["Doc DOC-2"], "lifecycle": ["Rev Obsolete"], "release_date": ["2021-03-04T10:00:00Z"]},
+        {"item_number": ["Doc DOC-3"], "lifecycle": ["Rev Production"], "release_date": []},
+    ])
+
+    checker.run_solr_data_lifecycle_and_production_check()
+    sink.close()
+
+    assert sink.count(checker="status_check", field="lifecycle") == 1, "Test failed: The non-production item was not reported."
+    assert sink.count(checker="status_check", field="release_date") == 1, "Test failed: Only the undated item should be reported."
@@ -0,0 +1,132 @@
+# checkpoint.py
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import time
+from typing import Any, Dict, List, Optional
+
+from config import DOCTYPE, CHECKPOINT_DIR, CHECKPOINT_EVERY, CHECKPOINT_MAX_AGE  # Import from config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def checkpoint_key(*parts) -> str:
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+class RunCheckpoint:
+    """Progress of an interrupted run, kept in a local run directory so a resumed run continues from it.
+
+    Completed Oracle results are stored whole; Solr fetches append each page to a
+    pickle stream and save their cursorMark every CHECKPOINT_EVERY pages. The
+    directory is removed once a run completes, and checkpoints older than
+    CHECKPOINT_MAX_AGE seconds are ignored.
+    """
+
+    def __init__(self, run_dir: str, every: int = CHECKPOINT_EVERY, max_age: int = CHECKPOINT_MAX_AGE):
+        self.run_dir = run_dir
+        self.every = every
+        self.max_age = max_age
+        os.makedirs(run_dir, exist_ok=True)
+
+    def path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.run_dir, f"{key}.{suffix}")
+
+    def fresh(self, path: str) -> bool:
+        return os.path.exists(path) and time.time() - os.path.getmtime(path) < self.max_age
+
+    def load_result(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Rows of a completed query, or None."""
+        path = self.path(key, "pkl")
+        if not self.fresh(path):
+            return None
+        try:
+            with open(path, "rb") as fh:
+                return pickle.load(fh)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logging.warning(f"Ignoring unreadable checkpoint {path}: {e}")
+            return None
+
+    def save_result(self, key: str, rows: List[Dict[str, Any]]):
+        path = self.path(key, "pkl")
+        with open(f"{path}.tmp", "wb") as fh:
+            pickle.dump(rows, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{path}.tmp", path)
+
+    def load_pages(self, key: str):
+        """(cursor_mark, pages, rows) saved for a paged fetch, or (None, 0, []) to start over."""
+        state_path = self.path(key, "json")
+        if not self.fresh(state_path):
+            self.clear_pages(key)
+            return None, 0, []
+        rows = []
+        try:
+            with open(state_path) as fh:
+                state = json.load(fh)
+            with open(self.path(key, "pages"), "r+b") as fh:
+                for _ in range(state["pages"]):
+                    rows.extend(pickle.load(fh))
+                # Pages appended after the last saved cursorMark are fetched again
+                fh.truncate(state["offset"])
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError, EOFError) as e:
+            logging.warning(f"Ignoring unreadable checkpoint {state_path}: {e}")
+            self.clear_pages(key)
+            return None, 0, []
+        return state["cursor_mark"], state["pages"], rows
+
+    def append_page(self, key: str, pages: int, rows: List[Dict[str, Any]], next_cursor_mark: str):
+        """Append a fetched page; every `every` pages, record the cursorMark that follows it."""
+        with open(self.path(key, "pages"), "ab") as fh:
+            pickle.dump(rows, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            offset = fh.tell()
+        if pages % self.every == 0:
+            self.save_cursor(key, pages, offset, next_cursor_mark)
+
+    def save_cursor(self, key: str, pages: int, offset: int, cursor_mark: str):
+        state_path = self.path(key, "json")
+        with open(f"{state_path}.tmp", "w") as fh:
+            json.dump({"cursor_mark": cursor_mark, "pages": pages, "offset": offset, "saved_at": time.time()}, fh)
+        os.replace(f"{state_path}.tmp", state_path)
+
+    def save_pages(self, key: str, pages: int, cursor_mark: str):
+        """Checkpoint every page appended so far, e.g. before giving up on a failing fetch."""
+        if pages:
+            self.save_cursor(key, pages, os.path.getsize(self.path(key, "pages")), cursor_mark)
+
+    def clear_pages(self, key: str):
+        for suffix in ("json", "pages"):
+            if os.path.exists(self.path(key, suffix)):
+                os.remove(self.path(key, suffix))
+
+    def complete(self):
+        """The run finished; its checkpoints are no longer needed."""
+        shutil.rmtree(self.run_dir, ignore_errors=True)
+
+
+_default_checkpoint = None
+
+
+def enable(run_dir: str = None, resume: bool = False) -> RunCheckpoint:
+    """Checkpoint this process's Oracle results and Solr fetches (main.py enables it for full runs).
+
+    Without resume, the checkpoints of an earlier, unfinished run are discarded so a
+    scheduled run never reuses its data; main.py --resume continues from them.
+    """
+    global _default_checkpoint
+    run_dir = run_dir or os.path.join(CHECKPOINT_DIR, DOCTYPE)
+    if os.path.isdir(run_dir):
+        if resume:
+            logging.info(f"Resuming from the checkpoints in {run_dir}")
+        else:
+            logging.info(f"Discarding the checkpoints of an unfinished run in {run_dir} (use --resume to continue it)")
+            shutil.rmtree(run_dir, ignore_errors=True)
+    _default_checkpoint = RunCheckpoint(run_dir)
+    return _default_checkpoint
+
+
+def get_checkpoint() -> Optional[RunCheckpoint]:
+    """Return the run's checkpoint, or None when checkpointing is not enabled."""
+    return _default_checkpoint
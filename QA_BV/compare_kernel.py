@@ -0,0 +1,124 @@
+# compare_kernel.py
+import logging
+import mmap
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Optional: without numpy records are compared in a Python loop
+    np = None
+
+from config import COMPARE_WORKERS, COMPARE_PARALLEL_ROWS  # Import from config
+from solr_normalizer import NULL_MARKER, to_epoch
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ABSENT = "\x1fabsent"  # Value of a field a record does not have
+
+# Records and column arrays of the comparison in progress; forked pool workers inherit them
+_job = None
+
+
+def canonical(value) -> str:
+    """Comparable form of an Oracle or normalized Solr value."""
+    if value is None or value == "":
+        return NULL_MARKER
+    # Only strings shaped like dates are worth a parse attempt
+    if isinstance(value, str) and (len(value) < 10 or value[4:5] != "-"):
+        return value
+    return str(to_epoch(value))
+
+
+def align(oracle_rows: List[Dict[str, Any]], solr_docs: List[Dict[str, Any]], key: Callable) -> Tuple[List, List, List, List, List]:
+    """Pair records by key: (keys, oracle records, solr records) of the matches, the unmatched Oracle rows
+    and the Solr documents whose key no Oracle row has."""
+    solr_by_key = {key(doc): doc for doc in solr_docs}
+    keys, oracle_matched, solr_matched, unmatched = [], [], [], []
+    oracle_keys = set()
+    for row in oracle_rows:
+        row_key = key(row)
+        oracle_keys.add(row_key)
+        doc = solr_by_key.get(row_key)
+        if doc is None:
+            unmatched.append(row)
+        else:
+            keys.append(row_key)
+            oracle_matched.append(row)
+            solr_matched.append(doc)
+    solr_only = [doc for doc in solr_docs if key(doc) not in oracle_keys]
+    return keys, oracle_matched, solr_matched, unmatched, solr_only
+
+
+def fill_rows(start: int, stop: int) -> int:
+    """Write the hashed canonical values of rows [start, stop) into the column arrays of _job."""
+    oracle_records, solr_records, fields, oracle_cols, solr_cols = _job
+    absent = hash(ABSENT)
+    for records, cols in ((oracle_records, oracle_cols), (solr_records, solr_cols)):
+        for j, field in enumerate(fields):
+            cols[start:stop, j] = np.fromiter(
+                (hash(canonical(record[field])) if field in record else absent for record in records[start:stop]),
+                dtype=np.int64, count=stop - start)
+    return stop - start
+
+
+def shared_array(rows: int, columns: int):
+    """int64 array in anonymous shared memory, so forked workers write into the parent's copy."""
+    return np.ndarray((rows, columns), dtype=np.int64, buffer=mmap.mmap(-1, max(1, rows * columns * 8)))
+
+
+class CompareKernel:
+    """Compares aligned Oracle and Solr records as columns of hashed canonical values.
+
+    Each side becomes a rows x fields int64 array (8 bytes a value whatever its length)
+    and all fields are compared at once with vectorized operations. numpy only speeds up
+    that compare step: filling the arrays takes a Python canonical() and hash() call per
+    value and dominates the time. From parallel_rows rows on, the arrays live in shared
+    memory and forked worker processes hash disjoint row ranges of the records they
+    inherited, so nothing is pickled to them; below it the parent hashes every value.
+    Forked workers share the parent's string hash seed, so their hashes are comparable.
+    """
+
+    def __init__(self, workers: int = COMPARE_WORKERS, parallel_rows: int = COMPARE_PARALLEL_ROWS):
+        self.workers = workers
+        self.parallel_rows = parallel_rows
+        if np is None:
+            logging.info("numpy is not installed; comparing records in Python")
+
+    def compare(self, oracle_records: List[Dict[str, Any]], solr_records: List[Dict[str, Any]],
+                fields: List[str]) -> Dict[str, Tuple[int, List[int]]]:
+        """{field: (rows where both records have it, indices of the mismatched rows)} for aligned record lists."""
+        if np is None:
+            return {field: self.compare_field(oracle_records, solr_records, field) for field in fields}
+        global _job
+        rows = len(oracle_records)
+        parallel = rows >= self.parallel_rows and self.workers > 1 and "fork" in multiprocessing.get_all_start_methods()
+        new_array = shared_array if parallel else (lambda r, c: np.empty((r, c), dtype=np.int64))
+        oracle_cols, solr_cols = new_array(rows, len(fields)), new_array(rows, len(fields))
+        _job = (oracle_records, solr_records, fields, oracle_cols, solr_cols)
+        try:
+            if parallel:
+                step = -(-rows // self.workers)
+                starts = list(range(0, rows, step))
+                with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("fork")) as pool:
+                    list(pool.map(fill_rows, starts, [min(rows, start + step) for start in starts]))
+            else:
+                fill_rows(0, rows)
+        finally:
+            _job = None
+
+        absent = hash(ABSENT)
+        compared = (oracle_cols != absent) & (solr_cols != absent)
+        mismatched = compared & (oracle_cols != solr_cols)
+        totals = compared.sum(axis=0)
+        return {field: (int(totals[j]), np.flatnonzero(mismatched[:, j]).tolist()) for j, field in enumerate(fields)}
+
+    def compare_field(self, oracle_records, solr_records, field: str) -> Tuple[int, List[int]]:
+        total, indices = 0, []
+        for n, (row, doc) in enumerate(zip(oracle_records, solr_records)):
+            if field in row and field in doc:
+                total += 1
+                if canonical(row[field]) != canonical(doc[field]):
+                    indices.append(n)
+        return total, indices
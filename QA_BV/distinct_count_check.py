@@ -0,0 +1,128 @@
+# distinct_count_check.py
+import logging
+import math
+from statistics import NormalDist
+from typing import Any, Dict, List, Tuple
+
+from db_connections import OracleConnection, SolrConnection
+from config import (ORACLE_CONN_STR, ORACLE_DRIVER, QUERY_PARAMS, SOLR_URL, PARENT_QUERY, DOCTYPE,
+                    RECONCILE_MONTH_FIELD, RECONCILE_MONTH_START, DISTINCT_SOLR_FUNCTION,
+                    DISTINCT_RELATIVE_ERROR, DISTINCT_CONFIDENCE)  # Import from config
+from discrepancy_sink import DiscrepancySink, get_sink
+from perf_history import get_recorder
+from profiling import profiled
+from solr_normalizer import NULL_MARKER
+from facet_reconciliation import utc_month
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+TOTAL = "total"  # Group of the whole doctype
+ITEM_FIELD = "item_number"
+
+
+def distinct_count_query(parent_query: str, month_field: str = None) -> str:
+    """Approximate distinct items and parent rows per (UTC) release month, plus a ROLLUP total row."""
+    if not month_field:
+        return f"""
+SELECT '{TOTAL}' MONTH_KEY, APPROX_COUNT_DISTINCT(ITEM_NUMBER) DISTINCT_ITEMS, COUNT(*) ROW_COUNT FROM (
+{parent_query}
+)
+"""
+    month = f"NVL({utc_month(month_field.upper())}, '{NULL_MARKER}')"
+    return f"""
+SELECT NVL({month}, '{TOTAL}') MONTH_KEY, APPROX_COUNT_DISTINCT(ITEM_NUMBER) DISTINCT_ITEMS, COUNT(*) ROW_COUNT FROM (
+{parent_query}
+)
+GROUP BY ROLLUP({month})
+"""
+
+
+def distinct_count_facet(month_field: str = None, month_start: str = RECONCILE_MONTH_START,
+                         function: str = DISTINCT_SOLR_FUNCTION) -> Dict[str, Any]:
+    """JSON facet estimating distinct items in total, per release month and for undated documents."""
+    stat = {"items": f"{function}({ITEM_FIELD})"}
+    facet = dict(stat)
+    if month_field:
+        facet["month"] = {"type": "range", "field": month_field, "start": month_start,
+                          "end": "NOW/MONTH+1MONTH", "gap": "+1MONTH", "mincount": 1, "facet": stat}
+        facet["undated"] = {"type": "query", "q": f"-{month_field}:[* TO *]", "facet": stat}
+    return facet
+
+
+def flatten_distinct_counts(facets: Dict[str, Any]) -> Dict[str, Tuple[int, int]]:
+    """Turn the facet response into {month: (distinct items, documents)}."""
+    counts = {TOTAL: (facets.get("items", 0), facets.get("count", 0))}
+    for bucket in facets.get("month", {}).get("buckets", []):
+        counts[str(bucket["val"])[:7]] = (bucket.get("items", 0), bucket["count"])
+    if facets.get("undated", {}).get("count"):
+        counts[NULL_MARKER] = (facets["undated"].get("items", 0), facets["undated"]["count"])
+    return counts
+
+
+def drift_bound(oracle_count: int, solr_count: int, relative_error: float = DISTINCT_RELATIVE_ERROR,
+                confidence: float = DISTINCT_CONFIDENCE) -> float:
+    """Largest difference two independent estimates of the same count show at the given confidence."""
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    return z * relative_error * math.hypot(oracle_count, solr_count)
+
+
+class DistinctCountChecker:
+    def __init__(self, sink: DiscrepancySink = None):
+        self.oracle_conn = OracleConnection(ORACLE_CONN_STR, ORACLE_DRIVER, QUERY_PARAMS)
+        self.solr_conn = SolrConnection(SOLR_URL)
+        self.sink = sink or get_sink()
+        self.perf = get_recorder()
+        self.month_field = RECONCILE_MONTH_FIELD.lower() if RECONCILE_MONTH_FIELD else None
+
+    @profiled("distinct_count_check")
+    def run_distinct_count_check(self) -> List[str]:
+        """Compare HyperLogLog estimates of distinct items per month between Oracle and Solr."""
+        with self.perf.phase("distinct_count_check.oracle") as phase:
+            try:
+                self.oracle_conn.connect()
+                rows = self.oracle_conn.execute_query(distinct_count_query(PARENT_QUERY, self.month_field))
+            finally:
+                self.oracle_conn.close()
+            phase['rows'] = len(rows)
+        # Solr's month buckets start at RECONCILE_MONTH_START, so earlier months only count in the total
+        first_month = RECONCILE_MONTH_START[:7]
+        oracle_counts = {row["MONTH_KEY"]: (row["DISTINCT_ITEMS"], row["ROW_COUNT"]) for row in rows
+                         if row["MONTH_KEY"] in (TOTAL, NULL_MARKER) or row["MONTH_KEY"] >= first_month}
+
+        with self.perf.phase("distinct_count_check.solr") as phase:
+            solr_counts = flatten_distinct_counts(self.solr_conn.facet(distinct_count_facet(self.month_field)))
+            phase['rows'] = len(solr_counts)
+
+        return self.compare_distinct_counts(oracle_counts, solr_counts)
+
+    def compare_distinct_counts(self, oracle_counts: Dict[str, Tuple[int, int]],
+                                solr_counts: Dict[str, Tuple[int, int]]) -> List[str]:
+        """Record every month whose distinct-item drift exceeds the estimates' error bound; return those months."""
+        oracle_items, oracle_rows = oracle_counts.get(TOTAL, (0, 0))
+        solr_items, solr_docs = solr_counts.get(TOTAL, (0, 0))
+        logging.info(f"{DOCTYPE}: ~{oracle_items} distinct items in {oracle_rows} Oracle rows; "
+                     f"~{solr_items} distinct items in {solr_docs} Solr documents "
+                     f"({solr_docs / solr_items if solr_items else 0:.2f} documents per item)")
+
+        drifted = []
+        for month in sorted(set(oracle_counts) | set(solr_counts)):
+            oracle_count = oracle_counts.get(month, (0, 0))[0]
+            solr_count = solr_counts.get(month, (0, 0))[0]
+            bound = drift_bound(oracle_count, solr_count)
+            if abs(solr_count - oracle_count) > max(bound, 1):
+                drifted.append(month)
+                self.sink.record("distinct_count_check", "distinct_items", key={"doctype": DOCTYPE, "month": month},
+                                 oracle=oracle_count, solr=solr_count)
+                logging.warning(f"{month}: distinct items drift by {solr_count - oracle_count:+d} "
+                                f"(Oracle ~{oracle_count}, Solr ~{solr_count}, bound +/-{bound:.0f})")
+
+        if drifted:
+            logging.warning(f"Distinct-item drift beyond the {DISTINCT_CONFIDENCE:.0%} error bound in {len(drifted)} groups.")
+        else:
+            logging.info("Distinct item counts agree within the HyperLogLog error bounds.")
+        return drifted
+
+
+if __name__ == "__main__":
+    obj = DistinctCountChecker()
+    obj.run_distinct_count_check()
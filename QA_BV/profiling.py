@@ -0,0 +1,134 @@
+# profiling.py
+import cProfile
+import functools
+import inspect
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from config import PROFILE_DIR, PROFILE_SAMPLE_INTERVAL, PROFILE_TOP_ALLOCATIONS  # Import from config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Checkers or phases to profile, e.g. QA_PROFILE=record_counts,fetch_data (or "all")
+_targets = {name.strip() for name in os.environ.get("QA_PROFILE", "").split(",") if name.strip()}
+_active = threading.local()
+_profiles = {}
+
+
+def enable(targets):
+    """Profile the given checker or phase names (also settable with the QA_PROFILE environment variable)."""
+    _targets.update(name.strip() for name in targets if name.strip())
+
+
+def is_enabled(name: str) -> bool:
+    return bool(_targets) and (name in _targets or "all" in _targets)
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval and counts collapsed stacks for flame graphs."""
+
+    def __init__(self, thread_id: int, interval: float, counts: Counter):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = counts
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class Profile:
+    """cProfile stats, sampled stacks and allocation snapshots accumulated over every call of one target."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.profiler = cProfile.Profile()
+        self.stacks = Counter()
+        self.calls = 0
+
+    def write(self, snapshot):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, self.name)
+        self.profiler.dump_stats(f"{base}.pstats")
+        with open(f"{base}.collapsed", "w") as fh:
+            fh.writelines(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+        with open(f"{base}.tracemalloc.txt", "a") as fh:
+            fh.write(f"# {self.name} call {self.calls}: top {PROFILE_TOP_ALLOCATIONS} allocations by line\n")
+            for stat in snapshot.statistics("lineno")[:PROFILE_TOP_ALLOCATIONS]:
+                fh.write(f"{stat}\n")
+        logging.info(f"Wrote profile of {self.name} to {base}.*")
+
+
+@contextmanager
+def profile_section(name: str):
+    """Profile the enclosed block when name is a profiling target; a no-op otherwise.
+
+    Sections do not nest: inside a profiled checker its phases are already covered.
+    """
+    if not is_enabled(name) or getattr(_active, "name", None):
+        yield
+        return
+    profile = _profiles.setdefault(name, Profile(name))
+    profile.calls += 1
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    sampler = StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL, profile.stacks)
+    sampler.start()
+    _active.name = name
+    profile.profiler.enable()
+    try:
+        yield
+    finally:
+        profile.profiler.disable()
+        _active.name = None
+        sampler.stop()
+        snapshot = tracemalloc.take_snapshot()
+        if started_tracemalloc:
+            tracemalloc.stop()
+        profile.write(snapshot)
+
+
+def profiled(name: str):
+    """Decorator running a function (or iterating a generator) inside profile_section(name)."""
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def gen_wrapper(*args, **kwargs):
+                if not _targets:
+                    return func(*args, **kwargs)
+                return _profiled_iteration(name, func(*args, **kwargs))
+            return gen_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _targets:
+                return func(*args, **kwargs)
+            with profile_section(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _profiled_iteration(name, generator):
+    # Covers the whole iteration, including the consumer's work between items
+    with profile_section(name):
+        yield from generator
@@ -0,0 +1,253 @@
+# repair.py
+import argparse
+import gzip
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Set
+
+from db_connections import OracleConnection, SolrConnection
+from config import (ORACLE_CONN_STR, ORACLE_DRIVER, QUERY_PARAMS, SOLR_URL, PARENT_QUERY, CHILD_QUERIES, DISCREPANCY_FILE,
+                    REPAIR_BATCH_SIZE, REPAIR_CONCURRENCY, REPAIR_COMMIT_WITHIN, REPAIR_ID_FIELDS)  # Import from config
+from discrepancy_sink import DiscrepancySink, get_sink
+from perf_history import get_recorder
+from profiling import profiled
+from solr_normalizer import NULL_MARKER, DATE_TYPES, to_epoch
+from compare_kernel import CompareKernel, align
+from sample_check import SOLR_TERMS_CHUNK, IGNORED_FIELDS, KEY_FIELDS, document_key
+from watch_mode import items_filter
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ORACLE_IN_LIMIT = 1000
+# Checkers whose discrepancies name an item whose Solr documents are missing or hold stale values.
+# status_check keys are parsed from Solr values and cover non-production items PARENT_QUERY does not select.
+REPAIRABLE = {"sample_check", "watch_mode"}
+# Items only Solr has cannot be rebuilt from Oracle
+UNREPAIRABLE_FIELDS = {"missing_in_oracle"}
+# Maintained by Solr itself across atomic updates
+SOLR_INTERNAL_FIELDS = {"_root_", "_nest_path_", "_version_"}
+
+
+def divergent_items(path: str = DISCREPANCY_FILE) -> Set[str]:
+    """Item numbers of the repairable discrepancies of the latest run in a discrepancy file."""
+    items_by_run: Dict[Any, Set[str]] = {}
+    latest_run = None
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            rec = json.loads(line)
+            latest_run = rec.get("run")  # Records are appended in time order
+            items = items_by_run.setdefault(latest_run, set())
+            if rec["checker"] in REPAIRABLE and rec["field"] not in UNREPAIRABLE_FIELDS and isinstance(rec.get("key"), str):
+                items.add(rec["key"])
+    return items_by_run.get(latest_run, set())
+
+
+def solr_value(value, field_type: str):
+    """Oracle row value (after replace_null_values and format_cursor_data) as Solr indexes it."""
+    if value == NULL_MARKER:
+        return None
+    if isinstance(value, str) and len(value) > 1 and value[0] == value[-1] == "'":
+        value = value[1:-1]  # rev_number is quoted by replace_null_values
+    if field_type in DATE_TYPES and isinstance(value, str) and len(value) == 19:
+        # Oracle DATEs are local times of ORACLE_DATE_TIMEZONE; Solr stores UTC
+        return datetime.fromtimestamp(to_epoch(value), timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return value
+
+
+def atomic_update_losses(fields: List[Dict[str, Any]], copy_fields: List[Dict[str, str]]) -> List[str]:
+    """Fields whose values an atomic update drops: neither stored nor docValues, and not a copyField destination.
+
+    fields must come from get_schema_fields(show_defaults=True), so stored and docValues
+    are resolved from the field types.
+    """
+    destinations = {rule["dest"] for rule in copy_fields}
+    return sorted(field["name"] for field in fields
+                  if not field.get("stored", True) and not field.get("docValues", False)
+                  and field["name"] not in destinations and field["name"] not in SOLR_INTERNAL_FIELDS)
+
+
+class SolrRepairer:
+    """Reindexes the documents of divergent items from their Oracle rows.
+
+    Documents already in Solr are atomically updated ("set") under their existing id. Solr
+    rebuilds such a document from its stored and docValues fields, so an atomic update
+    drops every other field, and the extracted file content is usually indexed only; the
+    repair therefore refuses to run when the schema has such a field. With atomic=False
+    existing documents are replaced whole instead, which drops every field Oracle does not
+    provide. Missing documents are added whole with an id built from REPAIR_ID_FIELDS,
+    which must match the indexer's uniqueKey scheme. Batches of REPAIR_BATCH_SIZE go out on
+    REPAIR_CONCURRENCY threads with commitWithin, or without it and one commit at the end,
+    so Solr never commits per add. The repaired items are then compared again.
+    """
+
+    def __init__(self, sink: DiscrepancySink = None, batch_size: int = REPAIR_BATCH_SIZE,
+                 concurrency: int = REPAIR_CONCURRENCY, commit_within: int = REPAIR_COMMIT_WITHIN,
+                 atomic: bool = True, dry_run: bool = False):
+        self.oracle_conn = OracleConnection(ORACLE_CONN_STR, ORACLE_DRIVER, QUERY_PARAMS)
+        self.solr_conn = SolrConnection(SOLR_URL)
+        self.sink = sink or get_sink()
+        self.perf = get_recorder()
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.commit_within = commit_within  # Milliseconds; None for one commit after the last batch
+        self.atomic = atomic  # Atomic updates of existing documents instead of whole replacements
+        self.dry_run = dry_run  # Build the documents without sending them
+
+    def load_oracle_rows(self, item_numbers: List[str]) -> List[Dict[str, Any]]:
+        """Joined Oracle rows of the items.
+
+        With a pinned snapshot SCN the full queries come from the query cache of the
+        validation run, so nothing is fetched again; otherwise only the items are queried.
+        """
+        snapshot = self.oracle_conn.snapshot
+        try:
+            self.oracle_conn.connect()
+            if snapshot and snapshot.scn is not None:
+                wanted = {item.lower() for item in item_numbers}
+                parent_rs = [row for row in self.oracle_conn.execute_query(PARENT_QUERY) if str(row['ITEM_NUMBER']).lower() in wanted]
+                child_rs = [row for query in CHILD_QUERIES for row in self.oracle_conn.execute_query(query)
+                            if str(row['ITEM_NUMBER']).lower() in wanted]
+            else:
+                if self.oracle_conn.connection is None:
+                    self.oracle_conn.open_session()
+                parent_rs, child_rs = [], []
+                for start in range(0, len(item_numbers), ORACLE_IN_LIMIT):
+                    where, binds = items_filter("ITEM_NUMBER", item_numbers[start:start + ORACLE_IN_LIMIT])
+                    parent_rs.extend(self.oracle_conn.execute_query(f"SELECT * FROM ({PARENT_QUERY}\n) WHERE {where}", binds))
+                    for query in CHILD_QUERIES:
+                        child_rs.extend(self.oracle_conn.execute_query(f"SELECT * FROM ({query}\n) WHERE {where}", binds))
+        finally:
+            self.oracle_conn.close()
+        return list(self.oracle_conn.process_documents(self.oracle_conn.format_cursor_data(parent_rs),
+                                                       self.oracle_conn.format_cursor_data(child_rs)))
+
+    def fetch_solr_docs(self, item_numbers: List[str], fl: str = None) -> List[Dict[str, Any]]:
+        docs = []
+        for start in range(0, len(item_numbers), SOLR_TERMS_CHUNK):
+            query = "{!terms f=item_number}" + ",".join(item_numbers[start:start + SOLR_TERMS_CHUNK])
+            docs.extend(self.solr_conn.fetch_data(query, **({"fl": fl} if fl else {})))
+        return docs
+
+    def schema_fields(self) -> List[Dict[str, Any]]:
+        """Schema fields with their resolved properties; raises when atomic updates would lose field values."""
+        fields = self.solr_conn.get_schema_fields(show_defaults=True)
+        if not fields:
+            raise ValueError(f"No schema fields could be read from {SOLR_URL}; nothing can be repaired.")
+        if self.atomic:
+            lost = atomic_update_losses(fields, self.solr_conn.get_copy_fields())
+            if lost:
+                raise ValueError(f"Atomic updates would drop {', '.join(lost)}, which are neither stored nor docValues; "
+                                 f"run with --whole-documents to replace the documents instead.")
+        return fields
+
+    def build_documents(self, oracle_rows, existing_ids: Dict[tuple, str], fields: List[Dict[str, Any]]):
+        """Split the rows into updates of existing documents and whole new documents.
+
+        Atomic updates keep None values, which remove the field; whole documents leave them out.
+        """
+        field_types = {field['name']: field.get('type') for field in fields}
+        updates, additions = [], []
+        for row in oracle_rows:
+            doc = {field: solr_value(value, field_types[field]) for field, value in row.items() if field in field_types}
+            doc_id = existing_ids.get(document_key(row))
+            if doc_id is not None:
+                doc["id"] = doc_id
+                updates.append(doc if self.atomic else {field: value for field, value in doc.items() if value is not None})
+            else:
+                doc["id"] = "_".join(str(row.get(field)) for field in REPAIR_ID_FIELDS)
+                additions.append({field: value for field, value in doc.items() if value is not None})
+        return updates, additions
+
+    def send(self, docs: List[Dict[str, Any]], atomic: bool) -> int:
+        batches = [docs[start:start + self.batch_size] for start in range(0, len(docs), self.batch_size)]
+
+        def send_batch(batch):
+            field_updates = {field: "set" for doc in batch for field in doc if field != "id"} if atomic else None
+            self.solr_conn.add_documents(batch, commit_within=self.commit_within, field_updates=field_updates)
+            return len(batch)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return sum(executor.map(send_batch, batches))
+
+    @profiled("repair")
+    def repair(self, item_numbers: List[str], oracle_rows: List[Dict[str, Any]] = None) -> int:
+        """Reindex the documents of the items from oracle_rows (fetched when not given); return the items still divergent.
+
+        A dry run only logs the documents it would send and returns all items.
+        """
+        item_numbers = sorted(set(item_numbers))
+        if not item_numbers:
+            logging.info("Nothing to repair.")
+            return 0
+        if oracle_rows is None:
+            with self.perf.phase("repair.oracle") as phase:
+                oracle_rows = self.load_oracle_rows(item_numbers)
+                phase['rows'] = len(oracle_rows)
+
+        fields = self.schema_fields()
+        existing = self.fetch_solr_docs(item_numbers, fl="id,item_number,filename")
+        updates, additions = self.build_documents(oracle_rows, {document_key(doc): doc['id'] for doc in existing}, fields)
+        if self.dry_run:
+            logging.info(f"Dry run: would {'update' if self.atomic else 'replace'} {len(updates)} and add {len(additions)} "
+                         f"documents of {len(item_numbers)} items")
+            for doc in updates + additions:
+                logging.debug(f"Dry run document: {doc}")
+            return len(item_numbers)
+
+        with self.perf.phase("repair.solr_update") as phase:
+            start = time.perf_counter()
+            sent = self.send(updates, atomic=self.atomic) + self.send(additions, atomic=False)
+            if self.commit_within is None:
+                self.solr_conn.commit()
+            seconds = time.perf_counter() - start
+            phase['rows'] = sent
+        logging.info(f"Reindexed {sent} documents of {len(item_numbers)} items ({len(updates)} updated, {len(additions)} added) "
+                     f"in {seconds:.2f}s, {sent / max(seconds, 1e-9):.0f} documents/s")
+
+        if self.commit_within is not None:
+            time.sleep(self.commit_within / 1000)  # Until the commitWithin commit makes them visible
+        with self.perf.phase("repair.verify") as phase:
+            still_divergent = self.verify(oracle_rows, self.fetch_solr_docs(item_numbers))
+            phase['rows'] = len(oracle_rows)
+        return still_divergent
+
+    def verify(self, oracle_rows: List[Dict[str, Any]], solr_docs: List[Dict[str, Any]]) -> int:
+        """Compare the repaired items again and record whatever still differs."""
+        _, oracle_matched, solr_matched, unmatched, _ = align(oracle_rows, solr_docs, document_key)
+        divergent = {str(row['item_number']) for row in unmatched}
+        for row in unmatched:
+            self.sink.record("repair", "missing_in_solr", key=row['item_number'], oracle=row.get('filename'))
+        fields = sorted({field for row in oracle_matched for field in row} - IGNORED_FIELDS - KEY_FIELDS)
+        for field, (total, indices) in CompareKernel().compare(oracle_matched, solr_matched, fields).items():
+            for n in indices:
+                item_number = str(oracle_matched[n]['item_number'])
+                divergent.add(item_number)
+                self.sink.record("repair", field, key=item_number, oracle=oracle_matched[n][field], solr=solr_matched[n][field])
+        if divergent:
+            logging.warning(f"{len(divergent)} repaired items still differ from Oracle")
+        else:
+            logging.info("All repaired items match Oracle.")
+        return len(divergent)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reindex the items reported missing or divergent by a validation run.")
+    parser.add_argument("--discrepancies", default=DISCREPANCY_FILE, help="Discrepancy file of the validation run")
+    parser.add_argument("--items", nargs="*", default=[], help="Item numbers to repair instead of the reported ones")
+    parser.add_argument("--commit-within", type=int, default=REPAIR_COMMIT_WITHIN,
+                        help="commitWithin in milliseconds; 0 for a single commit after the last batch")
+    parser.add_argument("--whole-documents", action="store_true",
+                        help="Replace existing documents whole instead of atomic updates; drops fields Oracle does not provide")
+    parser.add_argument("--dry-run", action="store_true", help="Build and log the documents without sending them to Solr")
+    args = parser.parse_args()
+
+    items = args.items or sorted(divergent_items(args.discrepancies))
+    sink = DiscrepancySink(path=f"{args.discrepancies}.repair.jsonl.gz")
+    obj = SolrRepairer(sink=sink, commit_within=args.commit_within or None, atomic=not args.whole_documents,
+                       dry_run=args.dry_run)
+    obj.repair(items)
+    sink.close()
+    get_recorder().save()
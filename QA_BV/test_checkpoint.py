@@ -0,0 +1,36 @@
+import pytest
+import checkpoint
+
+ROWS = [{"ITEM_NUMBER": "DOC-1"}]
+
+@pytest.fixture(autouse=True)
+def reset_checkpoint(monkeypatch):
+    monkeypatch.setattr(checkpoint, "_default_checkpoint", None)
+
+def test_unfinished_run_is_discarded_unless_resumed(tmp_path):
+    run_dir = str(tmp_path / "DOC")
+    checkpoint.enable(run_dir).save_result("parents", ROWS)
+
+    assert checkpoint.enable(run_dir, resume=True).load_result("parents") == ROWS, \
+        "Test failed: --resume did not continue from the checkpoint."
+    assert checkpoint.enable(run_dir).load_result("parents") is None, \
+        "Test failed: A run without --resume reused the checkpoint of an earlier run."
+    assert checkpoint.get_checkpoint().run_dir == run_dir, "Test failed: Checkpointing was not enabled."
+
+def test_stale_checkpoints_are_ignored_on_resume(tmp_path):
+    run_checkpoint = checkpoint.RunCheckpoint(str(tmp_path), max_age=0)
+    run_checkpoint.save_result("parents", ROWS)
+
+    assert run_checkpoint.load_result("parents") is None, "Test failed: A checkpoint older than max_age was loaded."
+
+def test_truncated_page_stream_starts_over(tmp_path):
+    run_checkpoint = checkpoint.RunCheckpoint(str(tmp_path), every=1)
+    run_checkpoint.append_page("solr", 1, ROWS, "AoE1")
+    run_checkpoint.append_page("solr", 2, ROWS, "AoE2")
+    pages_path = run_checkpoint.path("solr", "pages")
+    with open(pages_path, "r+b") as fh:
+        fh.truncate(fh.seek(0, 2) - 5)
+
+    assert run_checkpoint.load_pages("solr") == (None, 0, []), "Test failed: A truncated page stream was loaded."
+    assert not (tmp_path / "solr.pages").exists() and not (tmp_path / "solr.json").exists(), \
+        "Test failed: The unreadable checkpoint was kept."
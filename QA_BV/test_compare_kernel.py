@@ -0,0 +1,31 @@
+import pytest
+from compare_kernel import CompareKernel, align
+
+ORACLE_ROWS = [
+    {"item_number": "DOC-1", "title": "A", "release_date": "2021-03-04 10:00:00"},
+    {"item_number": "DOC-2", "title": "B", "release_date": "#null#"},
+    {"item_number": "DOC-3", "title": "C"},
+]
+SOLR_DOCS = [
+    {"item_number": "DOC-2", "title": "X", "release_date": "#null#"},
+    {"item_number": "DOC-1", "title": "A", "release_date": "2021-03-04T10:00:00Z"},
+    {"item_number": "DOC-4", "title": "D"},
+]
+
+def test_compare_reports_mismatched_rows():
+    keys, oracle_matched, solr_matched, unmatched, solr_only = align(ORACLE_ROWS, SOLR_DOCS, lambda record: record["item_number"])
+
+    results = CompareKernel(workers=1).compare(oracle_matched, solr_matched, ["title", "release_date"])
+
+    assert [row["item_number"] for row in unmatched] == ["DOC-3"], "Test failed: An unmatched row was not reported."
+    assert [doc["item_number"] for doc in solr_only] == ["DOC-4"], "Test failed: A Solr-only document was not reported."
+    assert results["title"] == (2, [keys.index("DOC-2")]), "Test failed: The title mismatch was not detected."
+    assert results["release_date"] == (2, []), "Test failed: Equal dates in different formats were reported."
+
+def test_compare_in_worker_processes():
+    oracle_rows = [{"n": i, "value": str(i)} for i in range(100)]
+    solr_docs = [{"n": i, "value": str(i if i % 10 else -i)} for i in range(100)]
+
+    results = CompareKernel(workers=2, parallel_rows=10).compare(oracle_rows, solr_docs, ["value"])
+
+    assert results["value"] == (100, list(range(10, 100, 10))), "Test failed: Worker processes compared rows incorrectly."
@@ -0,0 +1,53 @@
+import sqlite3
+import types
+import pytest
+from perf_history import PerfRecorder, PerfHistory
+
+def save_run(db_path, seconds_by_phase):
+    recorder = PerfRecorder(doctype="DOC", db_path=db_path)
+    recorder.phases = [{"phase": phase, "seconds": seconds, "rows": 10, "peak_mem_kb": None}
+                       for phase, seconds in seconds_by_phase.items()]
+    return recorder.save()
+
+def test_recorder_saves_phases(tmp_path):
+    db_path = str(tmp_path / "perf_history.db")
+    recorder = PerfRecorder(doctype="DOC", db_path=db_path)
+    with recorder.phase("record_counts.oracle") as phase:
+        phase['rows'] = 42
+
+    run_id = recorder.save()
+
+    with sqlite3.connect(db_path) as db:
+        rows = db.execute("SELECT phase, rows FROM phases WHERE run_id = ?", (run_id,)).fetchall()
+    assert rows == [("record_counts.oracle", 42)], "Test failed: The phase timings were not saved."
+    assert recorder.save() is None, "Test failed: The same phases were saved twice."
+
+def test_compare_flags_slow_phases_only(tmp_path):
+    db_path = str(tmp_path / "perf_history.db")
+    for jitter in (0.0, 0.00001, -0.00001, 0.00002):
+        save_run(db_path, {"status_check.solr": 0.001 + jitter, "record_counts.oracle": 10.0 + jitter * 1000})
+    run_id = save_run(db_path, {"status_check.solr": 0.0014, "record_counts.oracle": 20.0})
+
+    regressions = PerfHistory(db_path).compare("DOC", run_id)
+
+    assert [reg["phase"] for reg in regressions] == ["record_counts.oracle"], \
+        "Test failed: Millisecond jitter was flagged, or a real slowdown was missed."
+
+def test_compare_needs_three_baseline_runs(tmp_path):
+    db_path = str(tmp_path / "perf_history.db")
+    save_run(db_path, {"record_counts.oracle": 1.0})
+    save_run(db_path, {"record_counts.oracle": 1.0})
+    run_id = save_run(db_path, {"record_counts.oracle": 60.0})
+
+    assert PerfHistory(db_path).compare("DOC", run_id) == [], "Test failed: A phase was flagged without a baseline."
+
+def test_only_recorded_sessions_are_saved(monkeypatch):
+    import conftest
+    saved = []
+    monkeypatch.setattr(conftest, "get_recorder", lambda: types.SimpleNamespace(save=lambda: saved.append("run") and None))
+    for record in (False, True):
+        options = {"--perf-record": record, "--perf-fail": False}
+        session = types.SimpleNamespace(config=types.SimpleNamespace(getoption=options.get, stash={}))
+        conftest.pytest_sessionfinish(session, 0)
+
+    assert saved == ["run"], "Test failed: A session without --perf-record was saved to the performance history."
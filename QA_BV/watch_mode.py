@@ -0,0 +1,282 @@
+# watch_mode.py
+import logging
+import queue
+import time
+from typing import Any, Dict, Iterator, List, Set
+
+from db_connections import OracleConnection, SolrConnection, load_oracle_driver
+from config import (ORACLE_CONN_STR, ORACLE_DRIVER, QUERY_PARAMS, SOLR_URL, PARENT_QUERY, CHILD_QUERIES,
+                    WATCH_USE_CQN, WATCH_POLL_INTERVAL, WATCH_BATCH_WINDOW, WATCH_MAX_BATCH)  # Import from config
+from discrepancy_sink import DiscrepancySink, get_sink
+from perf_history import get_recorder
+from profiling import profiled
+from compare_kernel import CompareKernel, align
+from sample_check import IGNORED_FIELDS, KEY_FIELDS, document_key
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+CHANGED_SINCE_QUERY = """
+SELECT I.ITEM_NUMBER, R.RELEASE_DATE
+FROM AGILE.REV R
+JOIN AGILE.ITEM I ON I.ID = R.ITEM
+JOIN AGILE.NODETABLE N ON N.ID = I.SUBCLASS
+WHERE R.RELEASE_DATE >= :since
+AND N.DESCRIPTION = :subclass
+"""
+
+CQN_QUERIES = [
+    "SELECT ITEM, RELEASE_DATE FROM AGILE.REV",
+    "SELECT ID, ITEM_NUMBER, DELETE_FLAG FROM AGILE.ITEM",
+]
+
+ITEM_NUMBER_BY_ROWID = {
+    "AGILE.REV": "SELECT I.ITEM_NUMBER FROM AGILE.REV R JOIN AGILE.ITEM I ON I.ID = R.ITEM WHERE R.ROWID = :rid",
+    "AGILE.ITEM": "SELECT ITEM_NUMBER FROM AGILE.ITEM WHERE ROWID = :rid",
+}
+
+
+class LocalChangeFeed:
+    """In-process change feed; stands in for Oracle in tests and manual runs."""
+
+    def __init__(self):
+        self.changes = queue.Queue()
+
+    def push(self, *item_numbers: str):
+        for item_number in item_numbers:
+            self.changes.put(item_number)
+
+    def poll(self, timeout: float) -> List[str]:
+        """Wait up to timeout seconds for changes and return every item_number available."""
+        try:
+            items = [self.changes.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                items.append(self.changes.get_nowait())
+            except queue.Empty:
+                return items
+
+    def close(self):
+        pass
+
+
+class PollingChangeFeed:
+    """Finds changed items by polling REV for release dates from the last one seen on.
+
+    The last release date is polled again (>=), since rows with the same timestamp can
+    be committed after a poll; the revisions already returned at it are skipped.
+    """
+
+    def __init__(self, oracle_conn: OracleConnection, interval: float = WATCH_POLL_INTERVAL):
+        self.oracle_conn = oracle_conn
+        self.interval = interval
+        self.since = None
+        self.seen_at_since = set()  # (item_number, release_date) already returned at the `since` timestamp
+        self.next_poll = 0.0
+
+    def start(self):
+        """Open the session and poll for changes from now on."""
+        self.oracle_conn.open_session()
+        self.since = self.oracle_conn.execute_query("SELECT SYSDATE NOW FROM DUAL")[0]["NOW"]
+        self.next_poll = time.monotonic() + self.interval
+
+    def poll(self, timeout: float) -> List[str]:
+        if self.oracle_conn.connection is None:
+            self.start()
+        wait = self.next_poll - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            if wait > timeout:
+                return []
+        self.next_poll = time.monotonic() + self.interval
+        rows = self.oracle_conn.execute_query(CHANGED_SINCE_QUERY, {"since": self.since})
+        changed = [row for row in rows if (row["ITEM_NUMBER"], row["RELEASE_DATE"]) not in self.seen_at_since]
+        if rows:
+            newest = max(row["RELEASE_DATE"] for row in rows)
+            if newest != self.since:
+                self.since, self.seen_at_since = newest, set()
+            self.seen_at_since.update((row["ITEM_NUMBER"], row["RELEASE_DATE"]) for row in rows if row["RELEASE_DATE"] == newest)
+        return [row["ITEM_NUMBER"] for row in changed]
+
+    def close(self):
+        self.oracle_conn.close()
+
+
+class ContinuousQueryChangeFeed:
+    """Oracle continuous query notification on REV and ITEM (cx_Oracle or python-oracledb thick mode).
+
+    Notifications arrive on a driver thread with ROWIDs; they are queued and resolved to
+    item_numbers when polled. When a change touched too many rows for Oracle to list
+    their ROWIDs, the changed items are found by a RELEASE_DATE poll instead.
+    """
+
+    ALL_ROWS = None  # Queued in place of a ROWID when a notification carries no rows
+
+    def __init__(self, oracle_conn_str: str, driver_name: str = ORACLE_DRIVER):
+        driver = load_oracle_driver(driver_name)
+        self.driver = driver
+        self.rowids = queue.Queue()
+        self.connection = driver.connect(oracle_conn_str, events=True)
+        self.subscription = self.connection.subscribe(
+            callback=self.on_notification,
+            operations=driver.OPCODE_INSERT | driver.OPCODE_UPDATE,
+            qos=driver.SUBSCR_QOS_ROWIDS | driver.SUBSCR_QOS_RELIABLE,
+        )
+        for query in CQN_QUERIES:
+            self.subscription.registerquery(query)
+        poll_conn = OracleConnection(oracle_conn_str, driver_name, QUERY_PARAMS)
+        poll_conn.snapshot = None
+        self.fallback = PollingChangeFeed(poll_conn, interval=0)
+        self.fallback.start()
+
+    def on_notification(self, message):
+        for table in message.tables:
+            if table.rows is None:
+                self.rowids.put((table.name.upper(), self.ALL_ROWS))
+            for row in table.rows or []:
+                self.rowids.put((table.name.upper(), row.rowid))
+
+    def poll(self, timeout: float) -> List[str]:
+        changes = []
+        try:
+            changes.append(self.rowids.get(timeout=timeout))
+            while True:
+                changes.append(self.rowids.get_nowait())
+        except queue.Empty:
+            pass
+        items = []
+        if any(rowid is self.ALL_ROWS for _, rowid in changes):
+            items.extend(self.fallback.poll(0))
+        cursor = self.connection.cursor()
+        try:
+            for table_name, rowid in set(changes):
+                query = ITEM_NUMBER_BY_ROWID.get(table_name)
+                if query and rowid is not self.ALL_ROWS:
+                    cursor.execute(query, {"rid": rowid})
+                    items.extend(row[0] for row in cursor.fetchall())
+        finally:
+            cursor.close()
+        return items
+
+    def close(self):
+        self.connection.unsubscribe(self.subscription)
+        self.connection.close()
+        self.fallback.close()
+
+
+def micro_batches(feed, window: float = WATCH_BATCH_WINDOW, max_batch: int = WATCH_MAX_BATCH,
+                  max_batches: int = None) -> Iterator[Set[str]]:
+    """Coalesce changed item_numbers into de-duplicated batches.
+
+    A batch is released `window` seconds after its first change arrived, or as soon as it
+    holds max_batch items, so a burst of releases turns into a few Solr queries.
+    """
+    pending: Set[str] = set()
+    first_seen = None
+    released = 0
+    while max_batches is None or released < max_batches:
+        timeout = window if first_seen is None else max(0.0, first_seen + window - time.monotonic())
+        items = feed.poll(timeout)
+        if items and first_seen is None:
+            first_seen = time.monotonic()
+        pending.update(items)
+        if pending and (len(pending) >= max_batch or time.monotonic() - first_seen >= window):
+            batch, pending = set(list(pending)[:max_batch]), set(list(pending)[max_batch:])
+            first_seen = time.monotonic() if pending else None
+            released += 1
+            yield batch
+
+
+def items_filter(column: str, item_numbers: List[str]):
+    """Bind variable IN-list for up to 1000 item numbers.
+
+    The list is padded to a power of two by repeating the last item, so batches of
+    similar size share one statement text and reuse its cached cursor.
+    """
+    size = 1
+    while size < len(item_numbers):
+        size *= 2
+    padded = list(item_numbers) + item_numbers[-1:] * (min(size, 1000) - len(item_numbers))
+    binds = {f"i{n}": item_number for n, item_number in enumerate(padded)}
+    return f"{column} IN ({', '.join(':' + name for name in binds)})", binds
+
+
+class WatchValidator:
+    def __init__(self, feed=None, sink: DiscrepancySink = None):
+        self.oracle_conn = OracleConnection(ORACLE_CONN_STR, ORACLE_DRIVER, QUERY_PARAMS)
+        self.oracle_conn.snapshot = None  # Changed items must be read as of now, never from a pinned SCN
+        self.solr_conn = SolrConnection(SOLR_URL)
+        self.sink = sink or get_sink()
+        self.perf = get_recorder()
+        self.feed = feed or self.default_feed()
+
+    def default_feed(self):
+        """Continuous query notification when available, polling on RELEASE_DATE otherwise."""
+        if WATCH_USE_CQN:
+            try:
+                return ContinuousQueryChangeFeed(ORACLE_CONN_STR)
+            except Exception as e:
+                logging.warning(f"Continuous query notification unavailable, polling instead: {e}")
+        poll_conn = OracleConnection(ORACLE_CONN_STR, ORACLE_DRIVER, QUERY_PARAMS)
+        poll_conn.snapshot = None
+        return PollingChangeFeed(poll_conn)
+
+    def run(self, max_batches: int = None):
+        """Validate changed items batch by batch until interrupted (or max_batches batches)."""
+        try:
+            self.oracle_conn.connect()
+            for batch in micro_batches(self.feed, max_batches=max_batches):
+                self.validate_items(sorted(batch))
+        except KeyboardInterrupt:
+            logging.info("Watch mode stopped.")
+        finally:
+            self.feed.close()
+            self.oracle_conn.close()
+
+    @profiled("watch_mode")
+    def validate_items(self, item_numbers: List[str]) -> int:
+        """Compare the joined Oracle rows of the given items with their Solr documents; return the discrepancy count."""
+        with self.perf.phase("watch_mode.oracle") as phase:
+            if self.oracle_conn.connection is None:
+                self.oracle_conn.open_session()
+            where, binds = items_filter("ITEM_NUMBER", item_numbers)
+            parent_rs = self.oracle_conn.format_cursor_data(
+                self.oracle_conn.execute_query(f"SELECT * FROM ({PARENT_QUERY}\n) WHERE {where}", binds))
+            child_rs = []
+            for query in CHILD_QUERIES:
+                child_rs.extend(self.oracle_conn.format_cursor_data(
+                    self.oracle_conn.execute_query(f"SELECT * FROM ({query}\n) WHERE {where}", binds)))
+            oracle_rows = list(self.oracle_conn.process_documents(parent_rs, child_rs))
+            phase['rows'] = len(oracle_rows)
+
+        with self.perf.phase("watch_mode.solr") as phase:
+            solr_docs = self.solr_conn.fetch_data("{!terms f=item_number}" + ",".join(item_numbers))
+            phase['rows'] = len(solr_docs)
+
+        return self.compare_items(item_numbers, oracle_rows, solr_docs)
+
+    def compare_items(self, item_numbers: List[str], oracle_rows: List[Dict[str, Any]], solr_docs: List[Dict[str, Any]]) -> int:
+        """Record documents missing on either side and every field value that differs, as sample_check does."""
+        keys, oracle_matched, solr_matched, unmatched, solr_only = align(oracle_rows, solr_docs, document_key)
+        discrepancies = 0
+        for row in unmatched:
+            item_number, filename = document_key(row)
+            self.sink.record("watch_mode", "missing_in_solr", key=item_number, oracle=filename)
+            discrepancies += 1
+        for doc in solr_only:
+            item_number, filename = document_key(doc)
+            self.sink.record("watch_mode", "missing_in_oracle", key=item_number, solr=filename)
+            discrepancies += 1
+
+        fields = sorted({field for row in oracle_matched for field in row} - IGNORED_FIELDS - KEY_FIELDS)
+        for field, (total, indices) in CompareKernel().compare(oracle_matched, solr_matched, fields).items():
+            for n in indices:
+                self.sink.record("watch_mode", field, key=keys[n][0], oracle=oracle_matched[n][field], solr=solr_matched[n][field])
+            discrepancies += len(indices)
+        logging.info(f"Validated {len(item_numbers)} changed items: {discrepancies} discrepancies")
+        return discrepancies
+
+if __name__ == "__main__":
+    obj = WatchValidator()
+    obj.run()
@@ -2,34 +2,41 @@
 
 from db_connections import OracleConnection, SolrConnection
 import logging
-from config import ORACLE_CONN_STR, SOLR_URL, PARENT_QUERY, CHILD_QUERY,CHILD_QUERY_2  # Import from config
+from config import ORACLE_CONN_STR, ORACLE_DRIVER, ORACLE_PARTITIONS, QUERY_PARAMS, SOLR_URL, PARENT_QUERY, CHILD_QUERIES, ORACLE_JOIN_MODE  # Import from config
+from discrepancy_sink import DiscrepancySink, get_sink
+from perf_history import get_recorder
+from profiling import profiled
 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class ColumnComparator:
-    def __init__(self):
-        self.oracle_conn = OracleConnection(ORACLE_CONN_STR)  # Use connection string from config
+    def __init__(self, sink: DiscrepancySink = None):
+        self.oracle_conn = OracleConnection(ORACLE_CONN_STR, ORACLE_DRIVER, QUERY_PARAMS)  # Use connection string from config
         self.solr_conn = SolrConnection(SOLR_URL)  # Use Solr URL from config
+        self.sink = sink or get_sink()
+        self.perf = get_recorder()
 
+    @profiled("column_comparator")
     def compare_columns(self):
         """Fetch and compare column metadata between Oracle and Solr."""
-        try:
-            self.oracle_conn.connect()
-            parent_rs = self.oracle_conn.format_cursor_data(self.oracle_conn.execute_query(PARENT_QUERY))
-            logging.info(f"Fetched {len(parent_rs)} records from PARENT_QUERY")
-            child_rs = self.oracle_conn.format_cursor_data(self.oracle_conn.execute_query(CHILD_QUERY))
-            logging.info(f"Fetched {len(child_rs)} records from CHILD_QUERY")
-            child_r2 = self.oracle_conn.format_cursor_data(self.oracle_conn.execute_query(CHILD_QUERY_2))
-            logging.info(f"Fetched {len(child_rs)} records from another CHILD_QUERY")
-            child_rs.extend(child_r2)
-            oracle_columns = list(self.oracle_conn.process_documents(parent_rs, child_rs))  # Convert to list
-            #logging.info(f"Final Oracle data count: {(oracle_data)}")
-        finally:
-            self.oracle_conn.close()
+        with self.perf.phase("column_comparator.oracle") as phase:
+            try:
+                self.oracle_conn.connect()
+                oracle_columns = self.oracle_conn.fetch_documents(PARENT_QUERY, CHILD_QUERIES, partitions=ORACLE_PARTITIONS,
+                                                                  join_mode=ORACLE_JOIN_MODE)
+            finally:
+                self.oracle_conn.close()
+            phase['rows'] = len(oracle_columns)
 
+        self.check_columns(oracle_columns)
+
+    def check_columns(self, oracle_columns):
+        """Compare the columns of fetched Oracle documents with the Solr schema fields."""
         # Fetch Solr schema (fields)
-        solr_fields = self.solr_conn.get_schema_fields()
+        with self.perf.phase("column_comparator.solr") as phase:
+            solr_fields = self.solr_conn.get_schema_fields()
+            phase['rows'] = len(solr_fields)
 
         # Compare columns
         self.compare_column_metadata(oracle_columns, solr_fields)
@@ -46,6 +53,10 @@ class ColumnComparator:
 
         only_in_oracle = oracle_column_names - solr_field_names
         only_in_solr = solr_field_names - oracle_column_names
+        for column in sorted(only_in_oracle):
+            self.sink.record("column_comparator", column, oracle="present", solr="missing")
+        for column in sorted(only_in_solr):
+            self.sink.record("column_comparator", column, oracle="missing", solr="present")
 
         if not only_in_oracle and not only_in_solr:
             logging.info("Columns match between Oracle and Solr.")
@@ -0,0 +1,220 @@
+import re
+import sqlite3
+import threading
+import zlib
+import pytest
+import db_connections
+from config import DOCTYPE
+from oracle_snapshot import CURRENT_SCN_QUERY
+from perf_history import PerfHistory, get_recorder, format_regression
+from sql_diagnostics import get_sql_diagnostics, format_sql_record
+
+perf_regressions_key = pytest.StashKey[list]()
+
+
+def to_sqlite(query: str) -> str:
+    """The Oracle constructs the query builders generate, rewritten for SQLite."""
+    query = rollup_to_union(query)
+    query = re.sub(r"TO_CHAR\(([^,()]+(?:\([^()]*\))?), 'YYYY-MM-DD HH24:MI:SS'\)", r"\1", query)
+    query = re.sub(r"TO_CHAR\(([^,()]+), 'YYYY-MM'\)", r"SUBSTR(\1, 1, 7)", query)
+    query = re.sub(r"TO_CHAR\(([^()]+)\)", r"CAST(\1 AS TEXT)", query)
+    return query.replace("NVL(", "IFNULL(").replace("DBMS_LOB.GETLENGTH(", "LENGTH(").replace("GREATEST(", "MAX(").replace("ROWNUM", "ROW_NUMBER() OVER ()")
+
+
+def rollup_to_union(query: str) -> str:
+    """A one-column GROUP BY ROLLUP(x) as GROUP BY x UNION ALL the grand total row (the SELECT without GROUP BY, x as NULL)."""
+    group_by = query.find("GROUP BY ROLLUP(")
+    if group_by < 0:
+        return query
+    depth, end = 0, group_by + len("GROUP BY ROLLUP(")
+    while depth >= 0:
+        depth += {"(": 1, ")": -1}.get(query[end], 0)
+        end += 1
+    column = query[group_by + len("GROUP BY ROLLUP("):end - 1]
+    # The SELECT of the GROUP BY is the last one before it at the same parenthesis depth
+    depth, start = 0, group_by
+    while depth != 0 or not query.startswith("SELECT", start):
+        start -= 1
+        depth += {")": 1, "(": -1}.get(query[start], 0)
+    body = query[start:group_by]
+    return f"{query[:start]}{body}GROUP BY {column}\nUNION ALL\n{body.replace(column, 'NULL')}{query[end:]}"
+
+
+def ora_hash(value, max_bucket):
+    return None if value is None else zlib.crc32(str(value).encode("utf-8")) % (max_bucket + 1)
+
+
+class ApproxCountDistinct:
+    """APPROX_COUNT_DISTINCT, counted exactly."""
+
+    def __init__(self):
+        self.values = set()
+
+    def step(self, value):
+        if value is not None:
+            self.values.add(value)
+
+    def finalize(self):
+        return len(self.values)
+
+
+class FakeLob:
+    """LOB locator of a row fetched without the inline output type handler."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def read(self):
+        return self.value
+
+
+class FakeOracleCursor:
+    def __init__(self, oracle):
+        self.oracle = oracle
+        self.arraysize = 100
+        self.prefetchrows = 2
+        self.outputtypehandler = None
+        self.description = None
+        self.rows = []
+
+    def var(self, type_code, arraysize=None):
+        return type_code
+
+    def execute(self, query, params=None):
+        self.oracle.statements.append((query, params))
+        if query == CURRENT_SCN_QUERY:
+            self.description, self.rows = [("GET_SYSTEM_CHANGE_NUMBER", self.oracle.DB_TYPE_NUMBER)], [(self.oracle.scn,)]
+            return
+        with self.oracle.lock:
+            cursor = self.oracle.db.execute(to_sqlite(query), params or {})
+            rows = cursor.fetchall()
+        self.description = [(col[0], self.oracle.types.get(col[0].upper(), self.oracle.DB_TYPE_VARCHAR)) for col in cursor.description]
+        lob_types = {self.oracle.DB_TYPE_CLOB, self.oracle.DB_TYPE_NCLOB, self.oracle.DB_TYPE_BLOB}
+        inlined = {name for name, type_code in self.description
+                   if self.outputtypehandler and self.outputtypehandler(self, name, type_code, None, None, None)}
+        locators = [n for n, (name, type_code) in enumerate(self.description) if type_code in lob_types and name not in inlined]
+        self.rows = [tuple(FakeLob(value) if n in locators and value is not None else value for n, value in enumerate(row))
+                     for row in rows]
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size=None):
+        size = size or self.arraysize
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def callproc(self, name, args=()):
+        self.oracle.calls.append((name, list(args)))
+
+    def close(self):
+        pass
+
+
+class FakeOracleConnection:
+    def __init__(self, oracle):
+        self.oracle = oracle
+        self.stmtcachesize = 0
+
+    def cursor(self):
+        cursor = FakeOracleCursor(self.oracle)
+        cursor.connection = self
+        return cursor
+
+    def close(self):
+        pass
+
+
+class FakeSessionPool:
+    def __init__(self, oracle, max):
+        self.oracle = oracle
+        self.max = max
+
+    def acquire(self):
+        return FakeOracleConnection(self.oracle)
+
+    def release(self, connection):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeOracle:
+    """cx_Oracle stand-in running the statements on an in-memory SQLite database.
+
+    Tests create tables in db and map column names to Oracle types in types (VARCHAR
+    by default); statements and procedure calls are recorded.
+    """
+
+    DatabaseError = sqlite3.Error
+
+    def __init__(self):
+        for name in ("VARCHAR", "CHAR", "NVARCHAR", "NCHAR", "NUMBER", "DATE", "TIMESTAMP", "TIMESTAMP_TZ",
+                     "TIMESTAMP_LTZ", "CLOB", "NCLOB", "BLOB", "LONG", "LONG_RAW"):
+            setattr(self, f"DB_TYPE_{name}", name)
+        self.db = sqlite3.connect(":memory:", check_same_thread=False)
+        self.db.create_function("ORA_HASH", 2, ora_hash)
+        self.db.create_aggregate("APPROX_COUNT_DISTINCT", 1, ApproxCountDistinct)
+        self.lock = threading.Lock()
+        self.types = {}
+        self.statements = []
+        self.calls = []
+        self.connections = 0
+        self.scn = 4242
+
+    def connect(self, conn_str):
+        self.connections += 1
+        return FakeOracleConnection(self)
+
+    def SessionPool(self, max, **kwargs):
+        return FakeSessionPool(self, max)
+
+
+@pytest.fixture
+def fake_oracle(monkeypatch):
+    """A FakeOracle installed as the cx_Oracle and oracledb drivers of db_connections."""
+    oracle = FakeOracle()
+    monkeypatch.setitem(db_connections._loaded_drivers, "oracle", oracle)
+    monkeypatch.setitem(db_connections._loaded_drivers, "oracledb", oracle)
+    return oracle
+
+
+def pytest_addoption(parser):
+    parser.addoption("--perf-record", action="store_true", default=False,
+                     help="Save the phase timings to the performance history and compare them with the rolling "
+                          "baseline; only for sessions that ran the integration tests against Oracle and Solr")
+    parser.addoption("--perf-fail", action="store_true", default=False,
+                     help="With --perf-record, fail the session when a phase is slower than its rolling baseline")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """With --perf-record, save the phase timings of this session and compare them with the baseline.
+
+    Unit runs time the fake Oracle and Solr clients, which would skew the baseline of the real runs.
+    """
+    if not session.config.getoption("--perf-record"):
+        return
+    run_id = get_recorder().save()
+    regressions = PerfHistory().compare(DOCTYPE, run_id) if run_id else []
+    session.config.stash[perf_regressions_key] = regressions
+    if regressions and session.config.getoption("--perf-fail"):
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    regressions = config.stash.get(perf_regressions_key, [])
+    if regressions:
+        terminalreporter.section("performance regressions")
+        for reg in regressions:
+            terminalreporter.write_line(format_regression(reg))
+    diagnostics = get_sql_diagnostics()
+    if diagnostics and diagnostics.records:
+        terminalreporter.section("sql diagnostics")
+        for record in diagnostics.records:
+            terminalreporter.write_line(format_sql_record(record))
+        terminalreporter.write_line(f"Plans and statistics: {diagnostics.write()}")
@@ -1,38 +1,593 @@
-import cx_Oracle
-import pysolr
+import asyncio
+import importlib
+import json
 import logging
-import requests
+import re
+import time
+from collections import defaultdict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Dict, Any, Iterator
 
+from checkpoint import get_checkpoint, checkpoint_key
+from fetch_controller import AdaptiveFetchController, get_controller
+from oracle_snapshot import get_snapshot, CURRENT_SCN_QUERY, ENABLE_FLASHBACK_PROC
+from perf_history import get_recorder
+from profiling import profiled
+from solr_normalizer import SolrNormalizer, NULL_MARKER
+from sql_diagnostics import DIAGNOSTICS_VIEWS, get_sql_diagnostics
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Driver module used by each backend. Drivers are imported on first use only, so a
+# Solr-only check never loads cx_Oracle (and never needs the Oracle Instant Client).
+DRIVERS = {
+    "oracle": "cx_Oracle",
+    "oracledb": "oracledb",
+    "solr": "pysolr",
+    "http": "requests",
+    "async_http": "aiohttp",
+}
+_loaded_drivers = {}
+
+
+def load_driver(backend: str):
+    """Import and cache the driver module registered for a backend."""
+    if backend not in _loaded_drivers:
+        module_name = DRIVERS[backend]
+        try:
+            _loaded_drivers[backend] = importlib.import_module(module_name)
+        except ImportError as e:
+            raise ImportError(f"The {backend} backend needs the '{module_name}' package: {e}") from e
+    return _loaded_drivers[backend]
+
+
+# Oracle driver choices for OracleConnection: name -> (DRIVERS backend, needs the Oracle client libraries)
+ORACLE_DRIVERS = {
+    "cx_Oracle": ("oracle", True),
+    "oracledb": ("oracledb", False),  # python-oracledb thin mode, pure Python
+    "oracledb-thick": ("oracledb", True),
+}
+_thick_mode_initialized = False
+
+
+def load_oracle_driver(driver_name: str):
+    """Load the driver module for an ORACLE_DRIVERS entry, initializing the client libraries if it needs them."""
+    global _thick_mode_initialized
+    backend, thick = ORACLE_DRIVERS[driver_name]
+    module = load_driver(backend)
+    if backend == "oracledb" and thick and not _thick_mode_initialized:
+        module.init_oracle_client()
+        _thick_mode_initialized = True
+    return module
+
+
+# Child columns that never override the parent's value in a joined row
+JOIN_HIDDEN_CHILD_FIELDS = ('item_number', 'description', 'lifecycle', 'release_date')
+
+
+def normalized_column(ref: str, name: str, type_code, driver) -> str:
+    """SQL applying the replace_null_values (and format_cursor_data) rules to one column.
+
+    Character, LOB and date columns are normalized in Oracle; other types (numbers) keep
+    their type, so their NULLs become '#null#' on the client.
+    """
+    column = f'{ref}."{name}"'
+    text_types = {driver.DB_TYPE_VARCHAR, driver.DB_TYPE_CHAR, driver.DB_TYPE_NVARCHAR, driver.DB_TYPE_NCHAR}
+    date_types = {driver.DB_TYPE_DATE, driver.DB_TYPE_TIMESTAMP, driver.DB_TYPE_TIMESTAMP_TZ, driver.DB_TYPE_TIMESTAMP_LTZ}
+    if type_code in date_types:
+        expr = f"NVL(TO_CHAR({column}, 'YYYY-MM-DD HH24:MI:SS'), '{NULL_MARKER}')"
+    elif type_code in (driver.DB_TYPE_CLOB, driver.DB_TYPE_NCLOB):
+        # CLOBs cannot be compared with '='; only short ones can be a null form
+        expr = (f"CASE WHEN {column} IS NULL OR DBMS_LOB.GETLENGTH({column}) = 0 THEN TO_CLOB('{NULL_MARKER}') "
+                f"WHEN DBMS_LOB.GETLENGTH({column}) > 4 THEN {column} "
+                f"WHEN TO_CHAR({column}) = 'null' OR LOWER(TO_CHAR({column})) = 'n/a' THEN TO_CLOB('{NULL_MARKER}') "
+                f"ELSE {column} END")
+    elif type_code in text_types or name.lower() == 'rev_number':
+        if type_code not in text_types:
+            column = f"TO_CHAR({column})"
+        expr = f"CASE WHEN {column} IS NULL OR {column} = 'null' OR LOWER({column}) = 'n/a' THEN '{NULL_MARKER}' ELSE {column} END"
+    else:
+        return column
+    if name.lower() == 'rev_number':
+        expr = f"'''' || {expr} || ''''"  # Quoted like replace_null_values does
+    return expr
+
+
+def hash_partition(query: str) -> str:
+    """One ORA_HASH(ITEM_NUMBER) partition of a query, chosen by the :partition_max and :partition binds.
+
+    Hashing the lowercase item number keeps a parent and its attachments in the same partition.
+    """
+    return f"SELECT * FROM ({query}\n) WHERE ORA_HASH(LOWER(ITEM_NUMBER), :partition_max) = :partition"
+
+
+def joined_documents_query(parent_query: str, child_queries: List[str], parent_columns: List[tuple],
+                           child_columns: List[tuple], driver, partitioned: bool = False) -> str:
+    """process_documents as one statement: every parent LEFT OUTER JOINed with its attachment rows.
+
+    Parent columns come back as P0, P1, ... and the visible child columns as C0, C1, ...;
+    P_PART, P_SEQ, C_SRC and C_SEQ give the order process_documents would produce the rows in.
+    When partitioned, the parent and child queries are filtered by hash_partition before
+    ROWNUM numbers them, so Oracle only joins the rows of one partition.
+    """
+    if partitioned:
+        parent_query = hash_partition(parent_query)
+        child_queries = [hash_partition(query) for query in child_queries]
+    parent_select = ", ".join(f"{normalized_column('P', name, type_code, driver)} P{i}"
+                              for i, (name, type_code) in enumerate(parent_columns))
+    child_select = "".join(f", {normalized_column('C', name, type_code, driver)} C{i}"
+                           for i, (name, type_code) in enumerate(child_columns))
+    children = "\n    UNION ALL\n".join(f"    SELECT {n} C_SRC, ROWNUM C_SEQ, X.* FROM (\n{query}\n    ) X"
+                                          for n, query in enumerate(child_queries))
+    return f"""
+SELECT P.ITEM_NUMBER, {':partition' if partitioned else '0'} P_PART, P.P_SEQ, C.C_SRC, C.C_SEQ, {parent_select}{child_select}
+FROM (
+    SELECT ROWNUM P_SEQ, Q.* FROM (
+{parent_query}
+    ) Q
+) P
+LEFT OUTER JOIN (
+{children}
+) C ON LOWER(C.ITEM_NUMBER) = LOWER(P.ITEM_NUMBER)
+WHERE P.ITEM_NUMBER IS NOT NULL
+"""
+
+
+class JoinedRow(Mapping):
+    """Read-only view of a parent row joined with one of its attachment rows.
+
+    The normalized parent dict is shared by all of its children, so only the child's own
+    (already normalized) fields are stored per row. Child fields win over parent fields,
+    the same as parent.update(child) would.
+    """
+
+    __slots__ = ('parent', 'child')
+
+    def __init__(self, parent: Dict[str, Any], child: Dict[str, Any]):
+        self.parent = parent
+        self.child = child
+
+    def __getitem__(self, key):
+        if key in self.child:
+            return self.child[key]
+        return self.parent[key]
+
+    def __contains__(self, key):
+        return key in self.child or key in self.parent
+
+    def __iter__(self):
+        yield from self.parent
+        for key in self.child:
+            if key not in self.parent:
+                yield key
+
+    def __len__(self):
+        return len(self.parent) + sum(1 for key in self.child if key not in self.parent)
+
+    def __repr__(self):
+        return f"JoinedRow({dict(self)!r})"
+
+
+# Attempts at a failing Solr page before the fetch is reported as truncated
+SOLR_RETRIES = 3
+
+
+class SolrFetchError(Exception):
+    """A Solr fetch stopped before every matching document was read."""
+
+
+# Parsed statements kept per session, so re-executing a query text skips the parse
+STMT_CACHE_SIZE = 50
+
+# Rows per fetch round trip (and per prefetch); LOB values fetched inline travel with their batch
+FETCH_ARRAYSIZE = 500
+
+# Characters/bytes up to which a LOB value is fetched inline; longer values come as locators
+LOB_INLINE_LIMIT = 1024 * 1024
+LOCATOR_PREFIX = "LOCATOR$"
+
+BIND_NAME = re.compile(r":(\w+)")
+STRING_LITERAL = re.compile(r"'[^']*'")
+
+
+def bind_names(query: str) -> set:
+    """Names of the bind variables in a query (string literals are ignored)."""
+    return {name.lower() for name in BIND_NAME.findall(STRING_LITERAL.sub("", query))}
+
+
+def lob_types(driver) -> dict:
+    """LOB column type -> the LONG type its values are fetched inline as."""
+    return {driver.DB_TYPE_CLOB: driver.DB_TYPE_LONG, driver.DB_TYPE_NCLOB: driver.DB_TYPE_LONG,
+            driver.DB_TYPE_BLOB: driver.DB_TYPE_LONG_RAW}
+
+
+def inline_lob_handler(driver, lob_columns: List[str]):
+    """outputtypehandler fetching LOB columns as str/bytes in the row batches instead of as
+    locators, each of which takes further round trips to read. Appends the names of the LOB
+    columns it handled to lob_columns. Columns named LOCATOR$n (see bounded_lob_query) are
+    left as locators.
+    """
+    inline = lob_types(driver)
+
+    def handler(cursor, name, default_type, size, precision, scale):
+        if default_type in inline and not name.startswith(LOCATOR_PREFIX):
+            lob_columns.append(name)
+            return cursor.var(inline[default_type], arraysize=cursor.arraysize)
+    return handler
+
+
+def bounded_lob_query(query: str, columns: List[tuple], driver, limit: int) -> tuple:
+    """(statement, [(column, locator column)]) splitting each LOB column of a query at limit characters/bytes.
+
+    Values up to the limit stay in their column and are fetched inline; longer ones move
+    to a LOCATOR$n column, so a few huge values do not make every row batch huge. The
+    query is returned unchanged when it has no LOB column (or repeats a column name).
+    """
+    names = [name for name, _ in columns]
+    if len(set(names)) != len(names) or not any(type_code in lob_types(driver) for _, type_code in columns):
+        return query, []
+    select, locators = [], []
+    for name, type_code in columns:
+        column = f'Q."{name}"'
+        if type_code in lob_types(driver):
+            alias = f"{LOCATOR_PREFIX}{len(locators)}"
+            select.append(f'CASE WHEN DBMS_LOB.GETLENGTH({column}) <= {limit} THEN {column} END "{name}"')
+            select.append(f'CASE WHEN DBMS_LOB.GETLENGTH({column}) > {limit} THEN {column} END "{alias}"')
+            locators.append((name, alias))
+        else:
+            select.append(column)
+    return f"SELECT {', '.join(select)} FROM ({query}\n) Q", locators
+
+
+def read_locators(rows: List[Dict[str, Any]], locators: List[tuple]) -> int:
+    """Replace the LOB locators of fetched rows by their values; return how many were read.
+
+    A (column, locator column) pair moves the value read from the locator column into column.
+    """
+    read = 0
+    for rec in rows:
+        for column, locator_column in locators:
+            lob = rec.pop(locator_column) if locator_column != column else rec[column]
+            if lob is not None:
+                rec[column] = lob.read()
+                read += 1
+    return read
+
+
+def lob_size(value) -> int:
+    return len(value) if isinstance(value, (str, bytes)) else 0
+
+
+def lob_share(results: List[Dict[str, Any]], lob_columns: List[str]) -> tuple:
+    """(LOB characters/bytes, all characters/bytes) of fetched rows; other values count as their text length."""
+    lob_bytes = sum(lob_size(rec[column]) for rec in results for column in lob_columns)
+    total_bytes = sum(lob_size(value) if isinstance(value, (str, bytes)) else len(str(value))
+                      for rec in results for value in rec.values() if value is not None)
+    return lob_bytes, total_bytes
+
 
 class OracleConnection:
-    def __init__(self, oracle_conn_str: str):
+    def __init__(self, oracle_conn_str: str, driver_name: str = "cx_Oracle",
+                 query_params: Dict[str, Any] = None, stmt_cache_size: int = STMT_CACHE_SIZE,
+                 inline_lobs: bool = True, arraysize: int = FETCH_ARRAYSIZE, lob_inline_limit: int = LOB_INLINE_LIMIT):
         self.oracle_conn_str = oracle_conn_str
+        self.driver_name = driver_name
+        self.query_params = query_params or {}  # Defaults for the bind variables of every query
+        self.stmt_cache_size = stmt_cache_size
+        self.inline_lobs = inline_lobs  # False: fetch LOB locators and read them after each row batch
+        self.lob_inline_limit = lob_inline_limit  # With inline_lobs, longer values are read through locators
+        self.arraysize = arraysize
         self.connection = None
+        self.pool = None  # Sessions for partitioned queries, created on first use
+        self.snapshot = get_snapshot()  # None unless snapshot-consistent reads are enabled
+        self.diagnostics = get_sql_diagnostics()  # None unless SQL diagnostics are enabled
+
+    @property
+    def driver(self):
+        return load_oracle_driver(self.driver_name)
 
     def connect(self):
         """Establish connection to Oracle DB."""
+        if self.snapshot and self.snapshot.scn is not None:
+            return  # The SCN is already known, so connect only on the first cache miss
+        self.open_session()
+
+    def open_session(self):
+        with get_recorder().phase(f"oracle.connect.{self.driver_name}"):
+            start = time.perf_counter()
+            try:
+                self.connection = self.driver.connect(self.oracle_conn_str)
+                self.connection.stmtcachesize = self.stmt_cache_size
+                if self.diagnostics:
+                    self.diagnostics.prepare(self.connection)
+            except self.driver.DatabaseError as e:
+                logging.error(f"Failed to connect to Oracle: {e}")
+                raise
+        logging.info(f"Connected to Oracle with {self.driver_name} in {time.perf_counter() - start:.3f}s")
+        if self.snapshot:
+            self.snapshot.pin(self.connection)
+            logging.info(f"Reading Oracle as of SCN {self.snapshot.scn}")
+
+    def bind_params(self, query: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
+        """The default query_params overridden by params, limited to the binds the query uses.
+
+        Oracle rejects values for bind variables a statement does not have, and one set of
+        defaults serves every query of a doctype.
+        """
+        names = bind_names(query)
+        merged = {**self.query_params, **(params or {})}
+        return {key: value for key, value in merged.items() if key.lower() in names}
+
+    @profiled("execute_query")
+    def execute_query(self, query: str, params: Dict[str, Any] = None):
+        """Execute a query, with optional bind variables, and return the result.
+
+        Database errors are raised, never turned into an empty result that would read as "no rows".
+        """
+        params = self.bind_params(query, params)
+        if self.snapshot:
+            cached = self.snapshot.load(query, params)
+            if cached is not None:
+                logging.info(f"Loaded {len(cached)} cached records for SCN {self.snapshot.scn}")
+                return cached
+        checkpoint = get_checkpoint()
+        key = self.checkpoint_key(query, params)
+        if checkpoint:
+            saved = checkpoint.load_result(key)
+            if saved is not None:
+                logging.info(f"Resumed {len(saved)} records from checkpoint")
+                return saved
+        if self.snapshot and self.connection is None:
+            self.open_session()
+        with get_recorder().phase(f"oracle.query.{self.driver_name}") as phase:
+            try:
+                cursor = self.connection.cursor()
+                results = self.fetch_rows(cursor, query, params)
+                cursor.close()
+                phase['rows'] = len(results)
+                if self.snapshot:
+                    self.snapshot.store(query, results, params)
+                if checkpoint:
+                    checkpoint.save_result(key, results)
+                return results
+            except self.driver.DatabaseError as e:
+                logging.error(f"Oracle Database Error: {e}")
+                raise
+
+    def checkpoint_key(self, query: str, params: Dict[str, Any], partition: int = None) -> str:
+        scn = self.snapshot.scn if self.snapshot else None
+        return checkpoint_key("oracle", query, sorted(params.items()), scn, partition)
+
+    def execute_queries(self, queries: List[str]) -> List[List[Dict[str, Any]]]:
+        """Execute several queries and return their results in the same order."""
+        return [self.execute_query(query) for query in queries]
+
+    @profiled("execute_query")
+    def execute_partitioned(self, query: str, partitions: int, params: Dict[str, Any] = None, partitioned: str = None):
+        """Execute a query as disjoint ORA_HASH(ITEM_NUMBER) partitions on concurrent pooled sessions.
+
+        Returns the rows of all partitions merged, in partition order; a failing partition
+        raises its DatabaseError (the completed ones stay checkpointed). Each partition runs
+        partitioned, a statement with the :partition_max and :partition binds, by default
+        hash_partition(query), which needs ITEM_NUMBER in the select list. With snapshot
+        reads enabled, every session reads as of the run's SCN, so the partitions are
+        mutually consistent.
+        """
+        if partitions <= 1:
+            return self.execute_query(query, params)
+        params = self.bind_params(query, params)
+        if self.snapshot:
+            cached = self.snapshot.load(query, params)
+            if cached is not None:
+                logging.info(f"Loaded {len(cached)} cached records for SCN {self.snapshot.scn}")
+                return cached
+            if self.connection is None:
+                self.open_session()  # Captures the SCN the partitions are pinned to
+        partitioned = partitioned or hash_partition(query)
+        partition_params = [{**params, "partition_max": partitions - 1, "partition": n} for n in range(partitions)]
+        checkpoint = get_checkpoint()
+        slices = [checkpoint.load_result(self.checkpoint_key(partitioned, p)) if checkpoint else None for p in partition_params]
+        pending = [p for p, rows in zip(partition_params, slices) if rows is None]
+        if len(pending) < partitions:
+            logging.info(f"Resumed {partitions - len(pending)} of {partitions} partitions from checkpoint")
+        with get_recorder().phase(f"oracle.query.{self.driver_name}-partitioned") as phase:
+            try:
+                if pending:
+                    pool = self.session_pool(len(pending))
+                    with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                        fetched = executor.map(lambda p: self.fetch_partition(pool, partitioned, p), pending)
+                        for p, rows in zip(pending, fetched):
+                            slices[p["partition"]] = rows
+            except self.driver.DatabaseError as e:
+                # A missing partition would silently shorten every count, so fail the whole query
+                logging.error(f"Oracle Database Error in a partition of {partitions}: {e}")
+                raise
+            results = [row for rows in slices for row in rows]
+            phase['rows'] = len(results)
+        logging.info(f"Fetched {len(results)} records in {partitions} partitions ({', '.join(str(len(rows)) for rows in slices)})")
+        if self.snapshot:
+            self.snapshot.store(query, results, params)
+        return results
+
+    def session_pool(self, size: int):
+        """Session pool for partitioned queries, grown to at least size sessions."""
+        if self.pool is None or self.pool.max < size:
+            if self.pool is not None:
+                self.pool.close()
+            # Connection strings are user/password@dsn
+            user, _, rest = self.oracle_conn_str.partition("/")
+            password, _, dsn = rest.partition("@")
+            self.pool = self.driver.SessionPool(user=user, password=password, dsn=dsn, min=1, max=size,
+                                                increment=1, threaded=True)
+        return self.pool
+
+    def fetch_partition(self, pool, query: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        connection = pool.acquire()
         try:
-            self.connection = cx_Oracle.connect(self.oracle_conn_str)
-        except cx_Oracle.DatabaseError as e:
-            logging.error(f"Failed to connect to Oracle: {e}")
-            raise
+            connection.stmtcachesize = self.stmt_cache_size
+            if self.diagnostics:
+                self.diagnostics.prepare(connection)
+            cursor = connection.cursor()
+            if self.snapshot:
+                cursor.callproc(ENABLE_FLASHBACK_PROC, [self.snapshot.scn])
+            results = self.fetch_rows(cursor, query, params)
+            if self.snapshot:
+                # Pooled sessions are reused, so leave flashback mode before releasing it
+                cursor.callproc("DBMS_FLASHBACK.DISABLE")
+            cursor.close()
+        finally:
+            pool.release(connection)
+        checkpoint = get_checkpoint()
+        if checkpoint:
+            checkpoint.save_result(self.checkpoint_key(query, params), results)
+        return results
+
+    def prepare_cursor(self, cursor) -> List[str]:
+        """Set the fetch batch sizes and, with inline_lobs, the LOB output type handler.
+
+        Returns the list the handler fills with the names of the LOB columns it inlined.
+        """
+        cursor.arraysize = self.arraysize
+        cursor.prefetchrows = self.arraysize
+        lob_columns: List[str] = []
+        if self.inline_lobs:
+            cursor.outputtypehandler = inline_lob_handler(self.driver, lob_columns)
+        return lob_columns
+
+    def fetch_rows(self, cursor, query: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Execute a query on a cursor and return its rows as dicts, with LOB values as str/bytes.
+
+        LOB locators (every LOB without inline_lobs, those over lob_inline_limit with it) are
+        read batch by batch as the rows arrive, so only one batch of locators is open at a time.
+        """
+        lob_columns = self.prepare_cursor(cursor)
+        statement, locators = query, []
+        if self.inline_lobs and self.lob_inline_limit:
+            cursor.execute(f"SELECT * FROM ({query}\n) WHERE 1 = 0", params)
+            statement, locators = bounded_lob_query(query, [(col[0], col[1]) for col in cursor.description],
+                                                    self.driver, self.lob_inline_limit)
+            lob_columns.clear()  # Filled again by the statement's own execute
+        before = self.snapshot_diagnostics(cursor.connection, statement) if self.diagnostics else None
+        start = time.perf_counter()
+        cursor.execute(statement, params)
+        columns = [col[0] for col in cursor.description]
+        if not self.inline_lobs:
+            locators = [(col[0], col[0]) for col in cursor.description if col[1] in lob_types(self.driver)]
+        results = []
+        lob_seconds, lob_values = 0.0, 0
+        while True:
+            batch = [dict(zip(columns, row)) for row in cursor.fetchmany(self.arraysize)]
+            if not batch:
+                break
+            if locators:
+                with get_recorder().phase(f"oracle.lob_read.{self.driver_name}") as phase:
+                    lob_start = time.perf_counter()
+                    lob_values += read_locators(batch, locators)
+                    lob_seconds += time.perf_counter() - lob_start
+                    phase['rows'] = len(batch)
+            results.extend(batch)
+        fetch_seconds = time.perf_counter() - start - lob_seconds
+        if not self.inline_lobs:
+            lob_columns = [column for column, _ in locators]
+            if lob_columns:
+                lob_bytes, total_bytes = lob_share(results, lob_columns)
+                logging.info(f"Read {len(lob_columns)} LOB columns of {len(results)} rows through locators in "
+                             f"{lob_seconds:.3f}s ({lob_seconds / max(fetch_seconds + lob_seconds, 1e-9):.0%} of the fetch time); "
+                             f"{lob_bytes} characters/bytes ({lob_bytes / max(total_bytes, 1):.0%} of the fetched data)")
+        elif lob_columns:
+            # Inline LOBs arrive with the rows, so their time share is estimated from their share of the data
+            lob_bytes, total_bytes = lob_share(results, lob_columns)
+            byte_share = lob_bytes / max(total_bytes, 1)
+            logging.info(f"Fetched {len(lob_columns)} LOB columns ({', '.join(lob_columns)}) inline: "
+                         f"{lob_bytes} characters/bytes in {len(results)} rows ({byte_share:.0%} of the fetched data), "
+                         f"~{fetch_seconds * byte_share:.3f}s of the {fetch_seconds:.3f}s fetch")
+            if lob_values:
+                logging.info(f"Read {lob_values} LOB values over {self.lob_inline_limit} characters/bytes through locators "
+                             f"in {lob_seconds:.3f}s")
+        if self.diagnostics:
+            self.collect_diagnostics(cursor.connection, statement, time.perf_counter() - start, len(results), before)
+        return results
+
+    def snapshot_diagnostics(self, connection, query: str):
+        try:
+            return self.diagnostics.snapshot(connection, query)
+        except self.driver.DatabaseError as e:
+            logging.warning(f"SQL diagnostics unavailable (needs SELECT on {DIAGNOSTICS_VIEWS}): {e}")
+            return None
+
+    def collect_diagnostics(self, connection, query: str, client_seconds: float, rows: int, before: tuple = None):
+        try:
+            self.diagnostics.collect(connection, query, client_seconds, rows, before)
+        except self.driver.DatabaseError as e:
+            logging.warning(f"SQL diagnostics unavailable (needs SELECT on {DIAGNOSTICS_VIEWS}): {e}")
 
-    def execute_query(self, query: str):
-        """Execute a query and return the result."""
+    def describe(self, query: str, params: Dict[str, Any] = None) -> List[tuple]:
+        """(name, type) of the columns a query returns, without fetching any row."""
+        cursor = self.connection.cursor()
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(query)
-            columns = [col[0] for col in cursor.description]
-            results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            cursor.execute(f"SELECT * FROM ({query}\n) WHERE 1 = 0", self.bind_params(query, params))
+            return [(col[0], col[1]) for col in cursor.description]
+        finally:
             cursor.close()
-            return results
-        except cx_Oracle.DatabaseError as e:
-            logging.error(f"Oracle Database Error: {e}")
-            return []
+
+    @profiled("execute_joined")
+    def execute_joined(self, parent_query: str, child_queries: List[str], params: Dict[str, Any] = None,
+                       partitions: int = 1) -> List[JoinedRow]:
+        """The rows process_documents would yield for these queries, joined and normalized in Oracle.
+
+        Only the joined rows are transferred, each carrying its parent's values, instead
+        of the parent and child result sets. The child queries are combined with UNION ALL,
+        so they must return the same columns. Rows are returned in process_documents order,
+        and the parent dict is still shared by the rows of one parent. With partitions, the
+        parent and child queries are filtered per partition before they are numbered and
+        joined, and the parents come in partition order, the same as fetch_documents' client join.
+        """
+        if self.connection is None:
+            self.open_session()
+        parent_columns = self.describe(parent_query, params)
+        described = [self.describe(query, params) for query in child_queries]
+        names = [[name for name, _ in columns] for columns in described]
+        if any(child_names != names[0] for child_names in names):
+            raise ValueError(f"Child queries must return the same columns to be joined in Oracle: {names}")
+        child_columns = [(name, type_code) for name, type_code in described[0] if name.lower() not in JOIN_HIDDEN_CHILD_FIELDS]
+
+        query = joined_documents_query(parent_query, child_queries, parent_columns, child_columns, self.driver)
+        partitioned = (joined_documents_query(parent_query, child_queries, parent_columns, child_columns, self.driver, True)
+                       if partitions > 1 else None)
+        rows = self.execute_partitioned(query, partitions, params, partitioned)
+        # P_SEQ numbers the parents within one partition
+        rows.sort(key=lambda row: (row['P_PART'], row['P_SEQ'], -1 if row['C_SRC'] is None else row['C_SRC'], row['C_SEQ'] or 0))
+
+        parent_names = [name.lower() for name, _ in parent_columns]
+        child_names = [name.lower() for name, _ in child_columns]
+        documents = []
+        parent, parent_seq = None, None
+        for row in rows:
+            if (row['P_PART'], row['P_SEQ']) != parent_seq:
+                parent_seq = (row['P_PART'], row['P_SEQ'])
+                parent = {name: NULL_MARKER if row[f"P{i}"] is None else row[f"P{i}"] for i, name in enumerate(parent_names)}
+            if row['C_SRC'] is None:
+                documents.append(JoinedRow(parent, {}))
+            else:
+                documents.append(JoinedRow(parent, {name: NULL_MARKER if row[f"C{i}"] is None else row[f"C{i}"]
+                                                    for i, name in enumerate(child_names)}))
+        logging.info(f"Joined {len(documents)} documents in Oracle")
+        return documents
+
+    def fetch_documents(self, parent_query: str, child_queries: List[str], params: Dict[str, Any] = None,
+                        partitions: int = 1, join_mode: str = "client") -> List[JoinedRow]:
+        """Joined rows of the parent and child queries, joined in Oracle ("server") or by process_documents ("client")."""
+        if join_mode == "server":
+            return self.execute_joined(parent_query, child_queries, params, partitions)
+        parent_rs = self.format_cursor_data(self.execute_partitioned(parent_query, partitions, params))
+        logging.info(f"Fetched {len(parent_rs)} records from the parent query")
+        child_rs = []
+        for n, query in enumerate(child_queries, 1):
+            child_rs.extend(self.format_cursor_data(self.execute_partitioned(query, partitions, params)))
+            logging.info(f"Fetched {len(child_rs)} records from {n} of {len(child_queries)} child queries")
+        return list(self.process_documents(parent_rs, child_rs))
 
     def format_cursor_data(self, resultset):
         results = []
@@ -43,11 +598,16 @@ class OracleConnection:
             results.append(rec)
         return results
 
-    def replace_null_values(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Replace null, empty, or 'n/a' values with '#null#' and handle case-insensitive keys."""
+    def replace_null_values(self, data: Dict[str, Any], exclude=()) -> Dict[str, Any]:
+        """Replace null, empty, or 'n/a' values with '#null#' and handle case-insensitive keys.
+
+        Keys listed in exclude (lowercase) are left out of the result.
+        """
         tmp_dict = {}
         for key, value in data.items():
             key = key.lower()  # Normalize key to lowercase
+            if key in exclude:
+                continue
             if value is None or value == "" or value == "null" or (isinstance(value, str) and value.lower() == "n/a"):
                 value = "#null#"
             if key == 'rev_number':  # Case-insensitive match for 'rev_number'
@@ -55,29 +615,30 @@ class OracleConnection:
             tmp_dict[key] = value
         return tmp_dict
 
-    def process_documents(self, parents: List[Dict[str, Any]], children: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    @profiled("process_documents")
+    def process_documents(self, parents: List[Dict[str, Any]], children: List[Dict[str, Any]]) -> Iterator[JoinedRow]:
+        """Join every parent with its attachment rows, yielding one JoinedRow per attachment (or per childless parent)."""
+        children_by_item = defaultdict(list)
+        for child in children:
+            children_by_item[(child.get('ITEM_NUMBER') or '').lower()].append(child)
+
         for parent in parents:
-            parent = {k.lower(): v for k, v in parent.items()}  # Normalize parent keys to lowercase
-            item_number = parent.get('item_number')
+            item_number = parent.get('ITEM_NUMBER') or parent.get('item_number')
 
             if not item_number:
                 logging.warning(f"Parent record missing item_number: {parent}")
                 continue
 
-            parent_children = [
-                {k.lower(): v for k, v in child.items()}  # Normalize child keys to lowercase
-                for child in children if child.get('ITEM_NUMBER', '').lower() == item_number.lower()
-            ]
+            parent = self.replace_null_values(parent)  # Normalized once, shared by all of its children
+
+            parent_children = children_by_item.get(item_number.lower())
 
             if parent_children:
                 for child in parent_children:
                     try:
-                        combined_item = self.replace_null_values(parent)
+                        child_item = self.replace_null_values(child, exclude=JOIN_HIDDEN_CHILD_FIELDS)
 
-                        child_item = {k: v for k, v in child.items() if k not in ['item_number', 'description', 'lifecycle', 'release_date']}
-                        child_item = self.replace_null_values(child_item)
-
-                        file_path = child.get('ifs_filepath') or child.get('hfs_filepath')
+                        file_path = child_item.get('ifs_filepath') or child_item.get('hfs_filepath')
                        # if file_path:
                             #full_path = os.path.join(settings.FILEVAULT_PATH, file_path)
                             #if os.path.exists(full_path):
@@ -92,56 +653,342 @@ class OracleConnection:
                             #logging.error(f"Null value for IFS_filepath / HFS_filepath: {file_path}")
                             #child_item['content'] = "No-content"
 
-                        combined_item.update(child_item)
-                        yield combined_item
+                        yield JoinedRow(parent, child_item)
                     except Exception as e:
                         logging.error(f"Error processing child document for item_number {item_number}: {str(e)}")
             else:
-                yield self.replace_null_values(parent)
+                yield JoinedRow(parent, {})
 
     def close(self):
         """Close the Oracle DB connection."""
         if self.connection:
             try:
                 self.connection.close()
-            except cx_Oracle.DatabaseError as e:
+            except self.driver.DatabaseError as e:
                 logging.error(f"Failed to close Oracle connection: {e}")
+            self.connection = None  # A later cache miss opens a new session
+        if self.pool:
+            try:
+                self.pool.close()
+            except self.driver.DatabaseError as e:
+                logging.error(f"Failed to close Oracle session pool: {e}")
+            self.pool = None
+
+
+class AsyncOracleConnection(OracleConnection):
+    """OracleConnection that runs parent and child queries concurrently on one asyncio event loop.
+
+    Uses the python-oracledb asyncio API (thin mode only) with a small session pool,
+    since one session executes one statement at a time.
+    """
+
+    def __init__(self, oracle_conn_str: str, max_sessions: int = 4, query_params: Dict[str, Any] = None,
+                 stmt_cache_size: int = STMT_CACHE_SIZE, inline_lobs: bool = True, arraysize: int = FETCH_ARRAYSIZE):
+        super().__init__(oracle_conn_str, "oracledb", query_params, stmt_cache_size, inline_lobs, arraysize)
+        self.max_sessions = max_sessions
+
+    def connect(self):
+        """Nothing to do: execute_queries opens its own asyncio session pool."""
+
+    async def execute_query_async(self, pool, query: str):
+        """Execute a query on a pooled session and return the result."""
+        params = self.bind_params(query)
+        if self.snapshot:
+            cached = self.snapshot.load(query, params)
+            if cached is not None:
+                logging.info(f"Loaded {len(cached)} cached records for SCN {self.snapshot.scn}")
+                return cached
+        with get_recorder().phase(f"oracle.query.{self.driver_name}-async") as phase:
+            try:
+                async with pool.acquire() as connection:
+                    cursor = connection.cursor()
+                    self.prepare_cursor(cursor)
+                    if self.snapshot:
+                        await cursor.callproc(ENABLE_FLASHBACK_PROC, [self.snapshot.scn])
+                    await cursor.execute(query, params)
+                    columns = [col[0] for col in cursor.description]
+                    results = [dict(zip(columns, row)) for row in await cursor.fetchall()]
+                    if not self.inline_lobs:
+                        lob_columns = [col[0] for col in cursor.description if col[1] in lob_types(self.driver)]
+                        for rec in results:
+                            for column in lob_columns:
+                                if rec[column] is not None:
+                                    rec[column] = await rec[column].read()
+                    if self.snapshot:
+                        # Pooled sessions are reused, so leave flashback mode before releasing it
+                        await cursor.callproc("DBMS_FLASHBACK.DISABLE")
+                    cursor.close()
+                phase['rows'] = len(results)
+                if self.snapshot:
+                    self.snapshot.store(query, results, params)
+                return results
+            except self.driver.DatabaseError as e:
+                logging.error(f"Oracle Database Error: {e}")
+                raise
+
+    async def execute_queries_async(self, queries: List[str]) -> List[List[Dict[str, Any]]]:
+        with get_recorder().phase(f"oracle.connect.{self.driver_name}-async"):
+            pool = self.driver.create_pool_async(dsn=self.oracle_conn_str, min=1, max=self.max_sessions, increment=1,
+                                                  stmtcachesize=self.stmt_cache_size)
+        try:
+            if self.snapshot and self.snapshot.scn is None:
+                # Capture the SCN once, before the queries run concurrently
+                async with pool.acquire() as connection:
+                    cursor = connection.cursor()
+                    await cursor.execute(CURRENT_SCN_QUERY)
+                    self.snapshot.scn = int((await cursor.fetchone())[0])
+                    cursor.close()
+                logging.info(f"Captured Oracle SCN {self.snapshot.scn}; rerun with QA_ORACLE_SCN={self.snapshot.scn} to reuse cached results")
+            return list(await asyncio.gather(*(self.execute_query_async(pool, query) for query in queries)))
+        finally:
+            await pool.close()
+
+    def execute_queries(self, queries: List[str]) -> List[List[Dict[str, Any]]]:
+        """Execute the queries concurrently and return their results in the same order."""
+        return asyncio.run(self.execute_queries_async(queries))
+
+
+# Normalizers compiled from the schema, one per Solr core URL
+_normalizers: Dict[str, SolrNormalizer] = {}
 
 
 class SolrConnection:
     def __init__(self, solr_url: str):
-        self.solr_client = pysolr.Solr(solr_url, always_commit=True, timeout=10)
         self.solr_url = solr_url
+        self._solr_client = None
+        self._http_session = None
+
+    @property
+    def solr_client(self):
+        """pysolr client, created on first use."""
+        if self._solr_client is None:
+            self._solr_client = load_driver("solr").Solr(self.solr_url, always_commit=False, timeout=self.controller.timeout)
+        return self._solr_client
 
-    def fetch_data(self, query: str = '*:*', rows: int = 2000) -> list:
-        """Fetch data from Solr in batches."""
-        solr_data = []
-        start = 0
+    @property
+    def controller(self) -> AdaptiveFetchController:
+        """Page size and load budget, shared with every connection to the same Solr node."""
+        return get_controller(self.solr_url)
+
+    @property
+    def normalizer(self) -> SolrNormalizer:
+        """Normalizer compiled from the core's schema on first use."""
+        if self.solr_url not in _normalizers:
+            _normalizers[self.solr_url] = SolrNormalizer(self.get_schema_fields(show_defaults=True))
+        return _normalizers[self.solr_url]
+
+    @profiled("fetch_data")
+    def fetch_data(self, query: str = '*:*', rows: int = None, normalize: bool = True, **kwargs) -> list:
+        """Fetch data from Solr with cursorMark paging. Extra kwargs (e.g. fl) are passed to pysolr.
+
+        Pages are sized by the node's AdaptiveFetchController unless rows is given, and
+        requests wait for its token bucket. Documents are normalized as they arrive (see SolrNormalizer) unless normalize is False.
+        A failing page is retried SOLR_RETRIES times, then SolrFetchError is raised instead of
+        returning a partial result. With checkpointing enabled, fetched pages and the cursorMark
+        are saved as they arrive, and the next run resumes where this one stopped.
+        """
+        kwargs.setdefault('sort', 'id asc')  # cursorMark needs a sort on the uniqueKey
+        normalizer = self.normalizer if normalize else None
+        checkpoint = get_checkpoint()
+        key = checkpoint_key("solr", self.solr_url, query, rows, normalize, sorted(kwargs.items()))
+        if checkpoint:
+            saved = checkpoint.load_result(key)
+            if saved is not None:
+                logging.info(f"Resumed {len(saved)} Solr documents from checkpoint")
+                return saved
+        cursor_mark, pages, solr_data = checkpoint.load_pages(key) if checkpoint else (None, 0, [])
+        if solr_data:
+            logging.info(f"Resuming Solr fetch after {len(solr_data)} documents from checkpoint")
+        cursor_mark = cursor_mark or '*'
+        controller = self.controller
+        attempt = 0
         while True:
+            page_rows = rows or controller.rows
+            controller.before_request()
+            start = time.perf_counter()
             try:
-                solr_results = self.solr_client.search(query, rows=rows, start=start)
-                batch_size = len(solr_results)
-                solr_data.extend(solr_results)
-                if batch_size < rows:
-                    break
-                start += rows
+                solr_results = self.solr_client.search(query, rows=page_rows, cursorMark=cursor_mark, **kwargs)
             except Exception as e:
-                logging.error(f"Solr Error: {e}")
+                controller.record_error()
+                attempt += 1
+                if attempt > SOLR_RETRIES:
+                    if checkpoint:
+                        checkpoint.save_pages(key, pages, cursor_mark)
+                    raise SolrFetchError(f"Solr fetch of {query!r} stopped after {len(solr_data)} documents: {e}") from e
+                logging.warning(f"Solr Error (attempt {attempt} of {SOLR_RETRIES}): {e}")
+                time.sleep(2 ** attempt)
+                continue
+            controller.record(time.perf_counter() - start, getattr(solr_results, 'qtime', None))
+            attempt = 0
+            page = normalizer.normalize_all(solr_results) if normalizer else list(solr_results)
+            solr_data.extend(page)
+            pages += 1
+            next_cursor_mark = solr_results.nextCursorMark
+            if checkpoint:
+                checkpoint.append_page(key, pages, page, next_cursor_mark)
+            if len(page) < page_rows or next_cursor_mark == cursor_mark:
                 break
+            cursor_mark = next_cursor_mark
+        if len(solr_data) != solr_results.hits:
+            logging.warning(f"Fetched {len(solr_data)} Solr documents but {solr_results.hits} match; "
+                            f"the index changed during the fetch")
+        if checkpoint:
+            checkpoint.save_result(key, solr_data)
+            checkpoint.clear_pages(key)
         return solr_data
 
-    def get_schema_fields(self):
-        """Fetch the schema fields from the Solr instance."""
-        schema_url = f"{self.solr_url}/schema/fields"
+    def count_documents(self, query: str = '*:*') -> int:
+        """Return the number of matching documents without transferring any."""
+        self.controller.before_request()
+        start = time.perf_counter()
+        try:
+            results = self.solr_client.search(query, rows=0)
+        except Exception as e:
+            logging.error(f"Solr Error: {e}")
+            raise
+        self.controller.record(time.perf_counter() - start, getattr(results, 'qtime', None), adapt=False)
+        return results.hits
+
+    def facet(self, json_facet: Dict[str, Any], query: str = '*:*') -> Dict[str, Any]:
+        """Run a JSON Facet API request with rows=0 and return the 'facets' section of the response."""
+        self.controller.before_request()
+        start = time.perf_counter()
+        try:
+            results = self.solr_client.search(query, rows=0, **{"json.facet": json.dumps(json_facet)})
+        except Exception as e:
+            logging.error(f"Solr Error: {e}")
+            raise
+        self.controller.record(time.perf_counter() - start, getattr(results, 'qtime', None), adapt=False)
+        return results.raw_response.get('facets', {})
+
+    def add_documents(self, docs: List[Dict[str, Any]], commit_within: int = None, field_updates: Dict[str, str] = None):
+        """Send one batch of documents to the update handler, made visible by commitWithin (milliseconds)
+        or a later commit(). field_updates (e.g. {"title": "set"}) turns them into atomic updates.
+        """
+        self.controller.before_request()
+        start = time.perf_counter()
+        try:
+            self.solr_client.add(docs, commit=False, commitWithin=commit_within, fieldUpdates=field_updates)
+        except Exception as e:
+            logging.error(f"Solr Error: {e}")
+            raise
+        self.controller.record(time.perf_counter() - start, None, adapt=False)
+
+    def commit(self):
         try:
-            response = requests.get(schema_url)
+            self.solr_client.commit()
+        except Exception as e:
+            logging.error(f"Solr Error: {e}")
+            raise
+
+    def get_schema_fields(self, show_defaults: bool = False):
+        """Fetch the schema fields from the Solr instance.
+
+        With show_defaults, each field also carries the properties inherited from its
+        field type (e.g. multiValued, stored, docValues).
+        """
+        return self.get_schema("fields", {"showDefaults": "true"} if show_defaults else None)
+
+    def get_copy_fields(self):
+        """Fetch the copyField rules ({"source": ..., "dest": ...}) from the Solr instance."""
+        return self.get_schema("copyfields")
+
+    def get_schema(self, resource: str, params: Dict[str, str] = None):
+        """Fetch one list of the Schema API (e.g. fields, copyfields); empty on errors."""
+        key = {"copyfields": "copyFields"}.get(resource, resource)
+        schema_url = f"{self.solr_url}/schema/{resource}"
+        requests = load_driver("http")
+        if self._http_session is None:
+            self._http_session = requests.Session()  # Keep-alive across schema requests
+        try:
+            response = self._http_session.get(schema_url, params=params, timeout=self.controller.timeout)
             response.raise_for_status()
             schema_data = response.json()
-            if 'fields' in schema_data:
-                return schema_data['fields']
+            if key in schema_data:
+                return schema_data[key]
             else:
-                logging.error("No fields found in Solr schema.")
+                logging.error(f"No {key} found in Solr schema.")
                 return []
         except requests.exceptions.RequestException as e:
-            logging.error(f"Error fetching Solr schema fields: {e}")
+            logging.error(f"Error fetching Solr schema {key}: {e}")
             return []
+
+
+class AsyncSolrConnection(SolrConnection):
+    """SolrConnection whose fetch_data reads disjoint slices of the core concurrently over aiohttp.
+
+    Slices are the shard cores in shard_urls, queried directly with distrib=false, or
+    otherwise `slices` hash partitions of the uniqueKey ({!hash} filter, which needs
+    docValues on id). Each slice is paged with its own cursorMark on one pooled
+    keep-alive session with gzip responses; the node's AdaptiveFetchController sets page
+    size, concurrency and load budget. Slices are not checkpointed: a failing slice
+    raises SolrFetchError.
+    """
+
+    def __init__(self, solr_url: str, shard_urls: List[str] = None, slices: int = 4):
+        super().__init__(solr_url)
+        self.shard_urls = shard_urls or []
+        self.slices = slices
+
+    def slice_requests(self, query: str, params: Dict[str, Any]) -> List[tuple]:
+        """(core URL, request parameters) for every slice."""
+        if self.shard_urls:
+            return [(url, {**params, "q": query, "distrib": "false"}) for url in self.shard_urls]
+        return [(self.solr_url, {**params, "q": query, "fq": f"{{!hash workers={self.slices} worker={n} partitionKeys=id}}"})
+                for n in range(self.slices)]
+
+    async def fetch_slice(self, session, url: str, params: Dict[str, Any], normalizer, active: List[int]) -> List[Dict[str, Any]]:
+        controller = self.controller
+        docs = []
+        cursor_mark = '*'
+        attempt = 0
+        while True:
+            while active[0] >= controller.concurrency:
+                await asyncio.sleep(0.01)
+            active[0] += 1  # Taken before any await, so no other slice passes the check for the same slot
+            try:
+                await controller.before_request_async()
+                page_rows = controller.rows
+                start = time.perf_counter()
+                async with session.get(f"{url}/select", params={**params, "rows": str(page_rows), "cursorMark": cursor_mark}) as response:
+                    response.raise_for_status()
+                    data = await response.json()
+            except Exception as e:
+                controller.record_error()
+                attempt += 1
+                if attempt > SOLR_RETRIES:
+                    raise SolrFetchError(f"Solr fetch from {url} stopped after {len(docs)} documents: {e}") from e
+                logging.warning(f"Solr Error from {url} (attempt {attempt} of {SOLR_RETRIES}): {e}")
+                await asyncio.sleep(2 ** attempt)
+                continue
+            finally:
+                active[0] -= 1
+            controller.record(time.perf_counter() - start, data.get("responseHeader", {}).get("QTime"))
+            attempt = 0
+            page = data["response"]["docs"]
+            docs.extend(normalizer.normalize_all(page) if normalizer else page)
+            next_cursor_mark = data.get("nextCursorMark", cursor_mark)
+            if len(page) < page_rows or next_cursor_mark == cursor_mark:
+                return docs
+            cursor_mark = next_cursor_mark
+
+    async def fetch_data_async(self, query: str = '*:*', normalize: bool = True, **kwargs) -> list:
+        aiohttp = load_driver("async_http")
+        normalizer = self.normalizer if normalize else None
+        params = {"wt": "json", "sort": "id asc", **{key: str(value) for key, value in kwargs.items()}}
+        slice_requests = self.slice_requests(query, params)
+        connector = aiohttp.TCPConnector(limit=self.controller.max_concurrency, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=self.controller.timeout)
+        active = [0]  # Requests in flight, kept under the controller's concurrency
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers={"Accept-Encoding": "gzip"}) as session:
+            slices = await asyncio.gather(*(self.fetch_slice(session, url, slice_params, normalizer, active)
+                                            for url, slice_params in slice_requests))
+        logging.info(f"Fetched {sum(len(docs) for docs in slices)} Solr documents from {len(slices)} slices "
+                     f"({', '.join(str(len(docs)) for docs in slices)})")
+        return [doc for docs in slices for doc in docs]
+
+    @profiled("fetch_data")
+    def fetch_data(self, query: str = '*:*', rows: int = None, normalize: bool = True, **kwargs) -> list:
+        """Fetch every matching document, all slices concurrently. Page size is adaptive, so rows is ignored."""
+        return asyncio.run(self.fetch_data_async(query, normalize, **kwargs))
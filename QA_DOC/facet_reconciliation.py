@@ -0,0 +1,169 @@
+# facet_reconciliation.py
+import logging
+from typing import Any, Dict, List, Tuple
+
+from db_connections import OracleConnection, SolrConnection
+from config import (ORACLE_CONN_STR, ORACLE_DRIVER, QUERY_PARAMS, SOLR_URL, PARENT_QUERY, CHILD_QUERIES,
+                    RECONCILE_GROUP_FIELDS, RECONCILE_MONTH_FIELD, RECONCILE_MONTH_START, ORACLE_DATE_TIMEZONE)  # Import from config
+from discrepancy_sink import DiscrepancySink, get_sink
+from perf_history import get_recorder
+from profiling import profiled
+from solr_normalizer import NULL_MARKER
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def utc_month(column: str, timezone: str = ORACLE_DATE_TIMEZONE) -> str:
+    """SQL for the UTC 'YYYY-MM' of a DATE column holding local times of `timezone`.
+
+    Solr stores dates in UTC and buckets months in UTC, so Oracle must too, or rows
+    near a month boundary land in different months on the two sides. to_epoch reads
+    the DATE values in the same time zone for the field comparisons.
+    """
+    if timezone.upper() == "UTC":
+        return f"TO_CHAR({column}, 'YYYY-MM')"
+    return f"TO_CHAR(SYS_EXTRACT_UTC(FROM_TZ(CAST({column} AS TIMESTAMP), '{timezone}')), 'YYYY-MM')"
+
+
+def null_normalized(expr: str) -> str:
+    """SQL for the '#null#' mapping replace_null_values applies to Oracle values."""
+    return f"CASE WHEN {expr} IS NULL OR LOWER({expr}) IN ('null', 'n/a') THEN '{NULL_MARKER}' ELSE TO_CHAR({expr}) END"
+
+
+def grouped_count_query(parent_query: str, child_queries: List[str], group_fields: List[str], month_field: str = None) -> str:
+    """Count, per group, the documents process_documents would produce: one per attachment, or one for a parent without any."""
+    group_exprs = [null_normalized(f"P.{field.upper()}") for field in group_fields]
+    if month_field:
+        group_exprs.append(f"NVL({utc_month(f'P.{month_field.upper()}')}, '{NULL_MARKER}')")
+    aliases = [f"G{i}" for i in range(len(group_exprs))]
+    children = "\n    UNION ALL\n".join(f"    SELECT ITEM_NUMBER FROM (\n{query}\n    )" for query in child_queries)
+    return f"""
+SELECT {', '.join(aliases)}, SUM(DOCS) DOC_COUNT FROM (
+    SELECT {', '.join(f'{expr} {alias}' for expr, alias in zip(group_exprs, aliases))},
+           GREATEST(NVL(C.N, 0), 1) DOCS
+    FROM (
+{parent_query}
+    ) P
+    LEFT JOIN (
+        SELECT LOWER(ITEM_NUMBER) ITEM_KEY, COUNT(*) N FROM (
+{children}
+        ) GROUP BY LOWER(ITEM_NUMBER)
+    ) C ON C.ITEM_KEY = LOWER(P.ITEM_NUMBER)
+)
+GROUP BY {', '.join(aliases)}
+"""
+
+
+def before_month(month_start: str = RECONCILE_MONTH_START) -> str:
+    """Month group of the dates before month_start, which Solr counts in the range facet's "before" bucket."""
+    return f"<{month_start[:7]}"
+
+
+def fold_early_months(counts: Dict[Tuple, int], month_start: str = RECONCILE_MONTH_START) -> Dict[Tuple, int]:
+    """Merge the Oracle groups of months before month_start into one before_month group per group value."""
+    first_month = month_start[:7]
+    folded = {}
+    for group, n in counts.items():
+        if group[-1] != NULL_MARKER and group[-1] < first_month:
+            group = group[:-1] + (before_month(month_start),)
+        folded[group] = folded.get(group, 0) + n
+    return folded
+
+
+def grouped_count_facet(group_fields: List[str], month_field: str = None, month_start: str = RECONCILE_MONTH_START) -> Dict[str, Any]:
+    """Nested JSON facet that returns the same grouped document counts from Solr in one request.
+
+    The month range facet also counts the dates before month_start, and an "undated"
+    query facet counts the documents without a date, which Oracle groups as '#null#'.
+    """
+    facet = {}
+    if month_field:
+        facet = {"month": {"type": "range", "field": month_field, "start": month_start,
+                           "end": "NOW/MONTH+1MONTH", "gap": "+1MONTH", "mincount": 1, "other": "before"},
+                 "undated": {"type": "query", "q": f"-{month_field}:[* TO *]"}}
+    for field in reversed(group_fields):
+        facet = {field: {"type": "terms", "field": field, "limit": -1, "missing": True, "facet": facet}}
+    return facet
+
+
+def flatten_facets(node: Dict[str, Any], group_fields: List[str], month_field: str = None,
+                   prefix: Tuple = (), counts: Dict[Tuple, int] = None,
+                   month_start: str = RECONCILE_MONTH_START) -> Dict[Tuple, int]:
+    """Turn nested facet buckets into {(group value, ..., month): count}."""
+    counts = {} if counts is None else counts
+    if not group_fields:
+        if month_field:
+            month_facet = node.get("month", {})
+            buckets = [(str(bucket["val"])[:7], bucket["count"]) for bucket in month_facet.get("buckets", [])]
+            buckets.append((before_month(month_start), month_facet.get("before", {}).get("count", 0)))
+            buckets.append((NULL_MARKER, node.get("undated", {}).get("count", 0)))
+            for month, n in buckets:
+                if n:
+                    counts[prefix + (month,)] = counts.get(prefix + (month,), 0) + n
+        elif node.get("count"):
+            counts[prefix] = counts.get(prefix, 0) + node["count"]
+        return counts
+    field_facet = node.get(group_fields[0], {})
+    buckets = list(field_facet.get("buckets", []))
+    if field_facet.get("missing", {}).get("count"):
+        buckets.append(dict(field_facet["missing"], val=NULL_MARKER))
+    for bucket in buckets:
+        flatten_facets(bucket, group_fields[1:], month_field, prefix + (str(bucket["val"]),), counts, month_start)
+    return counts
+
+
+class FacetReconciliationChecker:
+    def __init__(self, sink: DiscrepancySink = None):
+        self.oracle_conn = OracleConnection(ORACLE_CONN_STR, ORACLE_DRIVER, QUERY_PARAMS)
+        self.solr_conn = SolrConnection(SOLR_URL)
+        self.sink = sink or get_sink()
+        self.perf = get_recorder()
+        self.group_fields = [field.lower() for field in RECONCILE_GROUP_FIELDS]
+        self.month_field = RECONCILE_MONTH_FIELD.lower() if RECONCILE_MONTH_FIELD else None
+
+    @profiled("facet_reconciliation")
+    def run_facet_reconciliation(self):
+        """Compare grouped document counts between Oracle and Solr without transferring documents."""
+        query = grouped_count_query(PARENT_QUERY, CHILD_QUERIES, self.group_fields, self.month_field)
+        with self.perf.phase("facet_reconciliation.oracle") as phase:
+            try:
+                self.oracle_conn.connect()
+                rows = self.oracle_conn.execute_query(query)
+            finally:
+                self.oracle_conn.close()
+            phase['rows'] = len(rows)
+        oracle_counts = {tuple(row[f"G{i}"] for i in range(len(row) - 1)): row["DOC_COUNT"] for row in rows}
+        if self.month_field:
+            oracle_counts = fold_early_months(oracle_counts)
+        logging.info(f"Fetched {len(oracle_counts)} groups from Oracle")
+
+        with self.perf.phase("facet_reconciliation.solr") as phase:
+            facets = self.solr_conn.facet(grouped_count_facet(self.group_fields, self.month_field))
+            solr_counts = flatten_facets(facets, self.group_fields, self.month_field)
+            phase['rows'] = len(solr_counts)
+        logging.info(f"Fetched {len(solr_counts)} groups from Solr")
+
+        return self.compare_group_counts(oracle_counts, solr_counts)
+
+    def compare_group_counts(self, oracle_counts: Dict[Tuple, int], solr_counts: Dict[Tuple, int]) -> List[Tuple]:
+        """Record every group whose document count differs and return those groups."""
+        columns = self.group_fields + ([f"{self.month_field}_month"] if self.month_field else [])
+        mismatched = []
+        for group in sorted(set(oracle_counts) | set(solr_counts)):
+            oracle_count = oracle_counts.get(group, 0)
+            solr_count = solr_counts.get(group, 0)
+            if oracle_count != solr_count:
+                mismatched.append(group)
+                self.sink.record("facet_reconciliation", "group_count", key=dict(zip(columns, group)),
+                                 oracle=oracle_count, solr=solr_count)
+
+        if mismatched:
+            logging.warning(f"Group count discrepancy in {len(mismatched)} of {len(set(oracle_counts) | set(solr_counts))} groups "
+                            f"(Oracle total {sum(oracle_counts.values())}, Solr total {sum(solr_counts.values())}).")
+        else:
+            logging.info("Grouped record counts match between Oracle and Solr.")
+        return mismatched
+
+
+if __name__ == "__main__":
+    obj = FacetReconciliationChecker()
+    obj.run_facet_reconciliation()
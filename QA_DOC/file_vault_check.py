@@ -0,0 +1,198 @@
+# file_vault_check.py
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Iterable
+
+from db_connections import OracleConnection, AsyncOracleConnection, SolrConnection, AsyncSolrConnection
+from config import ORACLE_CONN_STR, ORACLE_DRIVER, ORACLE_ASYNC_QUERIES, ORACLE_ASYNC_SESSIONS, QUERY_PARAMS, SOLR_URL, SOLR_ASYNC_FETCH, SOLR_FETCH_SLICES, SOLR_SHARD_URLS, CHILD_QUERIES, FILEVAULT_PATH, STAT_WORKERS, STAT_CACHE_FILE, STAT_CACHE_TTL  # Import from config
+from discrepancy_sink import DiscrepancySink, get_sink
+from perf_history import get_recorder
+from profiling import profiled
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+STAT_OK = "ok"
+STAT_MISSING = "missing"
+STAT_UNREADABLE = "unreadable"
+
+
+class StatCache:
+    """Stat results persisted between runs so an unchanged vault is not re-stat'ed over NFS.
+
+    Only readable files are cached, and an entry is only reused while its directory's
+    mtime is unchanged, so restored, added, removed or replaced (renamed over) files are
+    stat'ed again on the next run. Files rewritten in place are re-checked after the ttl.
+    """
+
+    def __init__(self, cache_file: str, ttl: int):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+    def load(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file) as fh:
+                self.entries = json.load(fh)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable stat cache {self.cache_file}: {e}")
+            self.entries = {}
+
+    def save(self):
+        tmp_file = f"{self.cache_file}.tmp"
+        with open(tmp_file, "w") as fh:
+            json.dump(self.entries, fh)
+        os.replace(tmp_file, self.cache_file)
+
+    def get(self, path: str, dir_mtime: float):
+        entry = self.entries.get(path)
+        if (entry and entry["status"] == STAT_OK and entry.get("dir_mtime") == dir_mtime
+                and time.time() - entry["checked"] < self.ttl):
+            return entry
+        return None
+
+    def put(self, path: str, status: str, size, dir_mtime: float):
+        entry = {"status": status, "size": size, "checked": time.time(), "dir_mtime": dir_mtime}
+        if status == STAT_OK and dir_mtime is not None:
+            self.entries[path] = entry
+        else:
+            self.entries.pop(path, None)  # Missing and unreadable files are checked again every run
+        return entry
+
+
+def directory_mtime(directory: str):
+    try:
+        return os.stat(directory).st_mtime
+    except OSError:
+        return None
+
+
+def stat_directory(directory: str, names: List[str], cache: StatCache = None) -> Dict[str, Dict[str, Any]]:
+    """Stat the requested files of one directory.
+
+    The directory itself is stat'ed once; cached results are reused while its mtime is
+    the one they were recorded with.
+    """
+    dir_mtime = directory_mtime(directory) if cache else None
+    results = {}
+    for name in names:
+        path = os.path.join(directory, name)
+        cached = cache.get(path, dir_mtime) if cache and dir_mtime is not None else None
+        if cached:
+            results[path] = cached
+            continue
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            results[path] = {"status": STAT_MISSING, "size": None, "dir_mtime": dir_mtime}
+            continue
+        except OSError:
+            results[path] = {"status": STAT_UNREADABLE, "size": None, "dir_mtime": dir_mtime}
+            continue
+        status = STAT_OK if os.access(path, os.R_OK) else STAT_UNREADABLE
+        results[path] = {"status": status, "size": st.st_size, "dir_mtime": dir_mtime}
+    return results
+
+
+def stat_paths(paths: Iterable[str], workers: int, cache: StatCache = None) -> Dict[str, Dict[str, Any]]:
+    """Stat paths concurrently, one thread pool task per directory."""
+    results = {}
+    by_directory = defaultdict(list)
+    for path in set(paths):
+        by_directory[os.path.dirname(path)].append(os.path.basename(path))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for dir_results in executor.map(lambda item: stat_directory(*item, cache), by_directory.items()):
+            for path, entry in dir_results.items():
+                if cache and entry.get("checked") is None:
+                    entry = cache.put(path, entry["status"], entry["size"], entry["dir_mtime"])
+                results[path] = entry
+    return results
+
+
+def first_value(value):
+    """Solr returns single-valued fields as lists; take the first element."""
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
+
+
+class FileVaultChecker:
+    def __init__(self, workers: int = STAT_WORKERS, sink: DiscrepancySink = None):
+        self.oracle_conn = (AsyncOracleConnection(ORACLE_CONN_STR, ORACLE_ASYNC_SESSIONS, QUERY_PARAMS) if ORACLE_ASYNC_QUERIES
+                            else OracleConnection(ORACLE_CONN_STR, ORACLE_DRIVER, QUERY_PARAMS))
+        self.solr_conn = (AsyncSolrConnection(SOLR_URL, SOLR_SHARD_URLS, SOLR_FETCH_SLICES) if SOLR_ASYNC_FETCH
+                          else SolrConnection(SOLR_URL))
+        self.sink = sink or get_sink()
+        self.perf = get_recorder()
+        self.stat_cache = StatCache(STAT_CACHE_FILE, STAT_CACHE_TTL)
+        self.workers = workers
+
+    @profiled("file_vault_check")
+    def run_file_vault_check(self):
+        """Validate that every attachment exists, is readable and matches the Solr file_size."""
+        with self.perf.phase("file_vault_check.oracle") as phase:
+            try:
+                self.oracle_conn.connect()
+                child_rs = [row for rs in self.oracle_conn.execute_queries(CHILD_QUERIES) for row in rs]
+                logging.info(f"Fetched {len(child_rs)} attachment records from CHILD_QUERY")
+            finally:
+                self.oracle_conn.close()
+            phase['rows'] = len(child_rs)
+
+        with self.perf.phase("file_vault_check.solr") as phase:
+            solr_data = self.solr_conn.fetch_data(fl="item_number,filename,file_size")
+            phase['rows'] = len(solr_data)
+        solr_sizes = {
+            (str(first_value(doc.get('item_number'))).lower(), str(first_value(doc.get('filename'))).lower()): first_value(doc.get('file_size'))
+            for doc in solr_data
+        }
+
+        self.stat_cache.load()
+        return self.check_attachments(child_rs, solr_sizes)
+
+    def check_attachments(self, child_rs: List[Dict[str, Any]], solr_sizes: Dict[tuple, Any]) -> Dict[str, int]:
+        """Stat the attachment paths and report missing, unreadable and size mismatched files."""
+        attachments = []
+        for child in child_rs:
+            child = {k.lower(): v for k, v in child.items()}
+            file_path = child.get('ifs_filepath') or child.get('hfs_filepath')
+            if not file_path:
+                logging.error(f"Null value for IFS_filepath / HFS_filepath: item_number {child.get('item_number')}")
+                continue
+            attachments.append((child, os.path.join(FILEVAULT_PATH, file_path)))
+
+        start = time.perf_counter()
+        with self.perf.phase("file_vault_check.stat") as phase:
+            stats = stat_paths((path for _, path in attachments), self.workers, self.stat_cache)
+            phase['rows'] = len(stats)
+        logging.info(f"Stat'ed {len(stats)} attachment paths in {time.perf_counter() - start:.2f}s with {self.workers} workers")
+        self.stat_cache.save()
+
+        counts = {STAT_MISSING: 0, STAT_UNREADABLE: 0, "size_mismatch": 0}
+        for child, path in attachments:
+            entry = stats[path]
+            if entry["status"] != STAT_OK:
+                self.sink.record("file_vault_check", entry["status"], key=child.get('item_number'), path=path)
+                counts[entry["status"]] += 1
+                continue
+            key = (str(child.get('item_number')).lower(), str(child.get('filename')).lower())
+            solr_size = solr_sizes.get(key)
+            if solr_size is not None and int(solr_size) != entry["size"]:
+                self.sink.record("file_vault_check", "file_size", key=child.get('item_number'), oracle=entry["size"], solr=solr_size, path=path)
+                counts["size_mismatch"] += 1
+
+        logging.info(f"Missing files: {counts[STAT_MISSING]}")
+        logging.info(f"Unreadable files: {counts[STAT_UNREADABLE]}")
+        logging.info(f"File size mismatches: {counts['size_mismatch']}")
+        return counts
+
+
+if __name__ == "__main__":
+    obj = FileVaultChecker()
+    obj.run_file_vault_check()
@@ -1,34 +1,42 @@
 # data_consistency_checker.py
 from db_connections import OracleConnection, SolrConnection
 import logging
-from config import ORACLE_CONN_STR, SOLR_URL, PARENT_QUERY, CHILD_QUERY, CHILD_QUERY_2  # Import from config
+from config import ORACLE_CONN_STR, ORACLE_DRIVER, ORACLE_PARTITIONS, QUERY_PARAMS, SOLR_URL, PARENT_QUERY, CHILD_QUERIES, ORACLE_JOIN_MODE  # Import from config
+from discrepancy_sink import DiscrepancySink, get_sink
+from perf_history import get_recorder
+from profiling import profiled
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class DataConsistencyChecker:
-    def __init__(self):
-        self.oracle_conn = OracleConnection(ORACLE_CONN_STR)
+    def __init__(self, sink: DiscrepancySink = None):
+        self.oracle_conn = OracleConnection(ORACLE_CONN_STR, ORACLE_DRIVER, QUERY_PARAMS)
         self.solr_conn = SolrConnection(SOLR_URL)
+        self.sink = sink or get_sink()
+        self.perf = get_recorder()
 
+    @profiled("record_counts")
     def run_consistency_check(self):
         """Run the full consistency check between Oracle and Solr."""
         # Fetch data from Oracle
-        try:
-            self.oracle_conn.connect()
-            parent_rs = self.oracle_conn.format_cursor_data(self.oracle_conn.execute_query(PARENT_QUERY))
-            logging.info(f"Fetched {len(parent_rs)} records from PARENT_QUERY")
-            child_rs = self.oracle_conn.format_cursor_data(self.oracle_conn.execute_query(CHILD_QUERY))
-            logging.info(f"Fetched {len(child_rs)} records from CHILD_QUERY")
-            child_r2 = self.oracle_conn.format_cursor_data(self.oracle_conn.execute_query(CHILD_QUERY_2))
-            logging.info(f"Fetched {len(child_r2)} records from another CHILD_QUERY")
-            child_rs.extend(child_r2)
-            oracle_data = list(self.oracle_conn.process_documents(parent_rs, child_rs))  # Convert to list
-            logging.info(f"Final Oracle data count: {len(oracle_data)}")
-        finally:
-            self.oracle_conn.close()
-
+        with self.perf.phase("record_counts.oracle") as phase:
+            try:
+                self.oracle_conn.connect()
+                oracle_data = self.oracle_conn.fetch_documents(PARENT_QUERY, CHILD_QUERIES, partitions=ORACLE_PARTITIONS,
+                                                               join_mode=ORACLE_JOIN_MODE)
+                logging.info(f"Final Oracle data count: {len(oracle_data)}")
+            finally:
+                self.oracle_conn.close()
+            phase['rows'] = len(oracle_data)
+
+        self.check_counts(oracle_data)
+
+    def check_counts(self, oracle_data):
+        """Compare the number of fetched Oracle documents with the Solr count."""
         # Fetch data from Solr
-        solr_data = self.solr_conn.count_documents()
+        with self.perf.phase("record_counts.solr") as phase:
+            solr_data = self.solr_conn.count_documents()
+            phase['rows'] = solr_data
 
         # Compare counts
         self.compare_data_count(oracle_data, solr_data)
@@ -44,6 +52,7 @@ class DataConsistencyChecker:
         if oracle_count == solr_count:
             logging.info("Record counts match between Oracle and Solr.")
         else:
+            self.sink.record("record_counts", "count", oracle=oracle_count, solr=solr_count)
             logging.warning(f"Record count discrepancy: Oracle ({oracle_count}) vs Solr ({solr_count}).")
 
     def check_dsr(self, oracle_data, solr_data):
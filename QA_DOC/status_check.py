@@ -1,13 +1,20 @@
 # status_check.py
-from db_connections import OracleConnection, SolrConnection
+from db_connections import OracleConnection, SolrConnection, AsyncSolrConnection
 import logging
-from config import SOLR_URL  # Import from config
+from datetime import datetime, timezone
+from config import SOLR_URL, SOLR_ASYNC_FETCH, SOLR_FETCH_SLICES, SOLR_SHARD_URLS  # Import from config
+from discrepancy_sink import DiscrepancySink, get_sink
+from perf_history import get_recorder
+from profiling import profiled
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class LifeCycleChecker:
-    def __init__(self):
-        self.solr_conn = SolrConnection(SOLR_URL)
+    def __init__(self, sink: DiscrepancySink = None):
+        self.solr_conn = (AsyncSolrConnection(SOLR_URL, SOLR_SHARD_URLS, SOLR_FETCH_SLICES) if SOLR_ASYNC_FETCH
+                          else SolrConnection(SOLR_URL))
+        self.sink = sink or get_sink()
+        self.perf = get_recorder()
 
     def is_valid_date(self, date_string):
         try:
@@ -20,20 +27,33 @@ class LifeCycleChecker:
         except ValueError:
             return False
 
+    def release_day(self, release_date):
+        """YYYY-MM-DD of a normalized release_date (epoch seconds); '#null#' and other values are returned as is."""
+        if isinstance(release_date, int):
+            return datetime.fromtimestamp(release_date, timezone.utc).strftime('%Y-%m-%d')
+        return str(release_date)
+
+    @profiled("status_check")
     def run_solr_data_lifecycle_and_production_check(self):
         """Checks for the valid lifecycle and release date"""
 
         # Fetch data from Solr
-        solr_data = self.solr_conn.fetch_data()
+        with self.perf.phase("status_check.solr") as phase:
+            solr_data = self.solr_conn.fetch_data()
+            phase['rows'] = len(solr_data)
         discrepancy_count = 0
         for data in solr_data:
-            lifecycle = data.get('lifecycle')[0].split()[1]
-            release_date = data.get('release_date')[0].split()[1]
-            item_number = data.get('item_number')[0].split()[1]  # Assuming item_number is part of the data
+            # fetch_data has already unwrapped the single-valued fields and turned dates into epoch seconds
+            lifecycle = data.get('lifecycle').split()[1]
+            release_date = self.release_day(data.get('release_date'))
+            item_number = data.get('item_number').split()[1]  # Assuming item_number is part of the data
 
             # Check for discrepancies
+            if lifecycle != "Production":
+                self.sink.record("status_check", "lifecycle", key=item_number, solr=lifecycle)
+            if not self.is_valid_date(release_date):
+                self.sink.record("status_check", "release_date", key=item_number, solr=release_date)
             if lifecycle != "Production" or not self.is_valid_date(release_date):
-                logging.info(f"Discrepancy found in the item number: {item_number}. Release Date: {release_date}, Lifecycle: {lifecycle}")
                 discrepancy_count += 1
 
         logging.info(f"Discrepancy Count: {discrepancy_count}")
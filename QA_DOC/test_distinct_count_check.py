@@ -0,0 +1,53 @@
+import pytest
+from db_connections import OracleConnection
+from distinct_count_check import DistinctCountChecker, distinct_count_query, flatten_distinct_counts, drift_bound
+from discrepancy_sink import DiscrepancySink
+
+def test_flatten_distinct_counts():
+    facets = {"count": 30, "items": 12,
+              "month": {"buckets": [{"val": "2021-03-01T00:00:00Z", "count": 20, "items": 8}]},
+              "undated": {"count": 10, "items": 4}}
+
+    counts = flatten_distinct_counts(facets)
+
+    assert counts == {"total": (12, 30), "2021-03": (8, 20), "#null#": (4, 10)}, "Test failed: Facet buckets were not flattened."
+
+def test_drift_bound_grows_with_counts():
+    assert drift_bound(100, 100) < drift_bound(10000, 10000), "Test failed: The error bound does not scale with the counts."
+
+def test_distinct_count_query_counts_items_per_month(fake_oracle):
+    fake_oracle.db.executescript("""
+        CREATE TABLE parents (ITEM_NUMBER TEXT, RELEASE_DATE TEXT);
+        INSERT INTO parents VALUES ('DOC-1', '2021-03-02 10:00:00'), ('DOC-1', '2021-03-02 10:00:00'),
+                                   ('DOC-2', '2021-03-15 08:00:00'), ('DOC-3', '2021-04-01 00:00:00'), ('DOC-4', NULL);
+    """)
+    conn = OracleConnection("user/password@db")
+    conn.connect()
+    rows = conn.execute_query(distinct_count_query("SELECT ITEM_NUMBER, RELEASE_DATE FROM parents", "release_date"))
+    conn.close()
+
+    counts = {row["MONTH_KEY"]: (row["DISTINCT_ITEMS"], row["ROW_COUNT"]) for row in rows}
+    assert counts == {"2021-03": (2, 3), "2021-04": (1, 1), "#null#": (1, 1), "total": (4, 5)}, \
+        f"Test failed: Unexpected distinct counts {counts}"
+
+def test_compare_distinct_counts_reports_drift_beyond_the_bound(tmp_path):
+    sink = DiscrepancySink(path=str(tmp_path / "discrepancies.jsonl.gz"))
+    checker = DistinctCountChecker(sink=sink)
+    oracle_counts = {"total": (2000, 2600), "2021-03": (1000, 1300), "2021-04": (1000, 1300)}
+    solr_counts = {"total": (2210, 2800), "2021-03": (1010, 1310), "2021-04": (1200, 1490), "2021-05": (5, 5)}
+
+    drifted = checker.compare_distinct_counts(oracle_counts, solr_counts)
+    sink.close()
+
+    assert abs(1010 - 1000) < drift_bound(1000, 1010) < abs(1200 - 1000), "Test failed: The counts do not straddle the bound."
+    assert drifted == ["2021-04", "2021-05", "total"], f"Test failed: Unexpected drifted months {drifted}"
+    assert sink.count(checker="distinct_count_check", field="distinct_items") == 3, "Test failed: The drift was not recorded."
+
+def test_run_distinct_count_check(tmp_path):
+    sink = DiscrepancySink(path=str(tmp_path / "discrepancies.jsonl.gz"))
+    checker = DistinctCountChecker(sink=sink)
+
+    drifted = checker.run_distinct_count_check()
+    sink.close()
+
+    assert sink.count(checker="distinct_count_check") == 0, f"Test failed: Distinct item counts drift in {drifted}"
@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+import fetch_controller
+from fetch_controller import AdaptiveFetchController, TokenBucket, get_controller
+
+class FakeClock:
+    """time.monotonic and time.sleep of fetch_controller; sleeping advances the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(fetch_controller.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(fetch_controller.time, "sleep", clock.sleep)
+    return clock
+
+def test_token_bucket_waits_off_its_debt(clock):
+    bucket = TokenBucket(rate=100, capacity=500)
+
+    bucket.consume(400)
+    assert bucket.wait() == 0, "Test failed: A request waited while the bucket had tokens."
+    bucket.consume(300)
+    assert bucket.delay() == pytest.approx(2.0), "Test failed: The delay does not pay off the 200 ms debt at 100 ms/s."
+    assert bucket.wait() == pytest.approx(2.0), "Test failed: The request did not wait for the refill."
+    clock.now += 60
+    assert bucket.delay() == 0 and bucket.tokens == 500, "Test failed: The bucket refilled beyond its capacity."
+
+def test_controller_grows_on_fast_pages_and_backs_off(clock):
+    controller = AdaptiveFetchController(rows=1000, min_rows=100, max_rows=1500, target_latency=1.0,
+                                         max_concurrency=3, load_share=1.0)
+
+    for _ in range(4):
+        controller.record(0.2, qtime=10)
+    assert (controller.rows, controller.concurrency) == (1500, 3), "Test failed: Fast pages did not grow up to the limits."
+    controller.record(2.5, qtime=10)
+    assert (controller.rows, controller.concurrency) == (750, 1), "Test failed: A slow page did not halve the page size and concurrency."
+    for _ in range(5):
+        controller.record_error()
+    assert (controller.rows, controller.concurrency) == (100, 1), "Test failed: Errors backed off below the minimums."
+
+def test_record_charges_qtime_or_latency_without_adapting(clock):
+    controller = AdaptiveFetchController(rows=1000, target_latency=1.0, load_share=0.5)
+
+    controller.record(0.1, qtime=None, adapt=False)
+    assert controller.bucket.tokens == pytest.approx(900), "Test failed: The latency was not charged when QTime was missing."
+    controller.record(0.1, qtime=1400, adapt=False)
+    assert controller.rows == 1000 and controller.concurrency == 1, "Test failed: A non-page request adapted the controller."
+    assert controller.bucket.delay() == pytest.approx(1.0), "Test failed: The QTime was not charged to the bucket."
+
+def test_async_wait_does_not_block_the_event_loop(clock, monkeypatch):
+    controller = AdaptiveFetchController(target_latency=1.0, load_share=1.0)
+    controller.bucket.consume(3000)
+    waits = []
+
+    async def fake_sleep(seconds):
+        waits.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(fetch_controller.asyncio, "sleep", fake_sleep)
+    asyncio.run(controller.before_request_async())
+
+    assert waits == [pytest.approx(2.0)] and clock.slept == [], "Test failed: The coroutine did not wait with asyncio.sleep."
+
+def test_controllers_are_shared_per_node(monkeypatch):
+    monkeypatch.setattr(fetch_controller, "_controllers", {})
+
+    assert get_controller("http://solr1:8983/solr/doc") is get_controller("http://solr1:8983/solr/bv"), \
+        "Test failed: Two cores on one node got separate controllers."
+    assert get_controller("http://solr2:8983/solr/doc") is not get_controller("http://solr1:8983/solr/doc"), \
+        "Test failed: Two nodes shared a controller."
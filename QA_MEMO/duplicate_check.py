@@ -0,0 +1,75 @@
+# duplicate_check.py
+import logging
+from typing import Any, Dict, List, Tuple
+
+from db_connections import SolrConnection
+from config import SOLR_URL, DUPLICATE_KEY_FIELDS  # Import from config
+from discrepancy_sink import DiscrepancySink, get_sink
+from perf_history import get_recorder
+from profiling import profiled
+from solr_normalizer import NULL_MARKER
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def duplicate_facet(key_fields: List[str]) -> Dict[str, Any]:
+    """Nested terms facet of the key fields, pruned to the buckets that can hold a duplicate.
+
+    Every level uses mincount 2: a key cannot be duplicated unless each of its
+    prefixes occurs twice, so values seen once are dropped at every level. The outer
+    levels still return every prefix with several documents (e.g. each item with more
+    than one attachment); only the innermost buckets are duplicated keys, and
+    flatten_duplicates keeps just those.
+    """
+    facet = {}
+    for field in reversed(key_fields):
+        facet = {field: {"type": "terms", "field": field, "limit": -1, "mincount": 2, "missing": True, "facet": facet}}
+    return facet
+
+
+def flatten_duplicates(node: Dict[str, Any], key_fields: List[str], prefix: Tuple = (),
+                       duplicates: Dict[Tuple, int] = None) -> Dict[Tuple, int]:
+    """Turn nested facet buckets into {(key value, ...): document count}."""
+    duplicates = {} if duplicates is None else duplicates
+    if not key_fields:
+        duplicates[prefix] = node["count"]
+        return duplicates
+    field_facet = node.get(key_fields[0], {})
+    buckets = list(field_facet.get("buckets", []))
+    # The missing bucket ignores mincount
+    if field_facet.get("missing", {}).get("count", 0) >= 2:
+        buckets.append(dict(field_facet["missing"], val=NULL_MARKER))
+    for bucket in buckets:
+        flatten_duplicates(bucket, key_fields[1:], prefix + (str(bucket["val"]),), duplicates)
+    return duplicates
+
+
+class DuplicateChecker:
+    def __init__(self, sink: DiscrepancySink = None, key_fields: List[str] = DUPLICATE_KEY_FIELDS):
+        self.solr_conn = SolrConnection(SOLR_URL)
+        self.sink = sink or get_sink()
+        self.perf = get_recorder()
+        self.key_fields = key_fields
+
+    @profiled("duplicate_check")
+    def run_duplicate_check(self) -> Dict[Tuple, int]:
+        """Find documents indexed more than once with one facet request; return {key: count}."""
+        with self.perf.phase("duplicate_check.solr") as phase:
+            facets = self.solr_conn.facet(duplicate_facet(self.key_fields))
+            duplicates = flatten_duplicates(facets, self.key_fields)
+            phase['rows'] = len(duplicates)
+
+        for key, count in sorted(duplicates.items()):
+            self.sink.record("duplicate_check", "duplicate", key=dict(zip(self.key_fields, key)), solr=count)
+
+        if duplicates:
+            logging.warning(f"{len(duplicates)} keys are indexed more than once "
+                            f"({sum(duplicates.values()) - len(duplicates)} extra documents in Solr).")
+        else:
+            logging.info(f"No duplicate {' x '.join(self.key_fields)} keys in Solr.")
+        return duplicates
+
+
+if __name__ == "__main__":
+    obj = DuplicateChecker()
+    obj.run_duplicate_check()
@@ -0,0 +1,118 @@
+# fetch_controller.py
+import asyncio
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+from config import (SOLR_TIMEOUT, SOLR_PAGE_ROWS, SOLR_MIN_ROWS, SOLR_MAX_ROWS, SOLR_TARGET_LATENCY,
+                    SOLR_MAX_CONCURRENCY, SOLR_LOAD_SHARE)  # Import from config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class TokenBucket:
+    """Budget of Solr query time: refills at `rate` milliseconds of QTime per second, up to `capacity`.
+
+    Requests wait while the bucket is empty and are charged their QTime afterwards,
+    so over time validation uses at most rate / 1000 of one node's query time.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until the bucket is no longer in debt (0 when a request may go now)."""
+        with self.lock:
+            self.refill()
+            return 0.0 if self.tokens > 0 else -self.tokens / self.rate
+
+    def wait(self) -> float:
+        """Block until the bucket is no longer in debt; return the seconds waited."""
+        waited = 0.0
+        delay = self.delay()
+        while delay:
+            time.sleep(delay)
+            waited += delay
+            delay = self.delay()
+        return waited
+
+    def consume(self, amount: float):
+        with self.lock:
+            self.refill()
+            self.tokens -= amount
+
+
+class AdaptiveFetchController:
+    """Tunes page size and concurrency for one Solr node from the latency of each page.
+
+    Pages faster than target_latency grow the page size by a quarter and allow one
+    more concurrent request; slow pages and errors halve both.
+    """
+
+    def __init__(self, rows: int = SOLR_PAGE_ROWS, min_rows: int = SOLR_MIN_ROWS, max_rows: int = SOLR_MAX_ROWS,
+                 target_latency: float = SOLR_TARGET_LATENCY, max_concurrency: int = SOLR_MAX_CONCURRENCY,
+                 load_share: float = SOLR_LOAD_SHARE):
+        self.rows = rows
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.target_latency = target_latency
+        self.max_concurrency = max_concurrency
+        self.concurrency = 1
+        self.timeout = SOLR_TIMEOUT
+        # Up to target_latency seconds of query time may be spent in one burst
+        self.bucket = TokenBucket(rate=load_share * 1000, capacity=target_latency * 1000)
+        self.lock = threading.Lock()
+
+    def before_request(self):
+        waited = self.bucket.wait()
+        if waited > 1:
+            logging.info(f"Throttled Solr request for {waited:.1f}s to stay within the load share")
+
+    async def before_request_async(self):
+        """before_request for coroutines: waits without blocking the event loop."""
+        delay = self.bucket.delay()
+        while delay:
+            await asyncio.sleep(delay)
+            delay = self.bucket.delay()
+
+    def record(self, latency: float, qtime, adapt: bool = True):
+        """Charge the request's QTime (latency when Solr did not report it) and, for pages, adapt."""
+        self.bucket.consume(qtime if qtime is not None else latency * 1000)
+        if not adapt:
+            return
+        with self.lock:
+            if latency <= self.target_latency:
+                self.rows = min(self.max_rows, int(self.rows * 1.25))
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+            else:
+                self.back_off()
+                logging.info(f"Slow Solr page ({latency:.2f}s): page size now {self.rows}, concurrency {self.concurrency}")
+
+    def record_error(self):
+        with self.lock:
+            self.back_off()
+
+    def back_off(self):
+        self.rows = max(self.min_rows, self.rows // 2)
+        self.concurrency = max(1, self.concurrency // 2)
+
+
+_controllers = {}
+
+
+def get_controller(solr_url: str) -> AdaptiveFetchController:
+    """Controller shared by every connection to the node serving solr_url."""
+    node = urlsplit(solr_url).netloc
+    if node not in _controllers:
+        _controllers[node] = AdaptiveFetchController()
+    return _controllers[node]
@@ -1,7 +1,17 @@
 # main.py
+import argparse
 import logging
 from record_counts import DataConsistencyChecker
 from column_comparator import ColumnComparator
+from file_vault_check import FileVaultChecker
+from facet_reconciliation import FacetReconciliationChecker
+from duplicate_check import DuplicateChecker
+from distinct_count_check import DistinctCountChecker
+from discrepancy_sink import get_sink
+from perf_history import get_recorder
+import profiling
+import checkpoint
+import sql_diagnostics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,6 +23,21 @@ def log_section_start(name):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", default="", help="Comma separated checkers or phases to profile "
+                        "(e.g. record_counts,execute_query,process_documents,fetch_data or all); also QA_PROFILE")
+    parser.add_argument("--sql-diagnostics", action="store_true", help="Record sql_id, V$SQL statistics and the "
+                        "executed plan of every Oracle query; also QA_SQL_DIAGNOSTICS")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run from its checkpoints "
+                        "instead of starting over")
+    args = parser.parse_args()
+    profiling.enable(args.profile.split(","))
+    if args.sql_diagnostics:
+        sql_diagnostics.enable()
+
+    # Save progress so an interrupted run can be resumed with --resume instead of starting over
+    run_checkpoint = checkpoint.enable(resume=args.resume)
+
     # Running Data Consistency Check
     log_section_start("No of Records Checker for Doctype: MEMO")
     consistency_checker = DataConsistencyChecker()
@@ -22,3 +47,29 @@ if __name__ == "__main__":
     log_section_start("Column Checker for Doctype: MEMO")
     column_checker = ColumnComparator()
     column_checker.compare_columns()
+
+    log_section_start("File Vault Checker for Doctype: MEMO")
+    file_vault_checker = FileVaultChecker()
+    file_vault_checker.run_file_vault_check()
+
+    log_section_start("Grouped Count Reconciliation for Doctype: MEMO")
+    facet_checker = FacetReconciliationChecker()
+    facet_checker.run_facet_reconciliation()
+
+    log_section_start("Duplicate Document Checker for Doctype: MEMO")
+    duplicate_checker = DuplicateChecker()
+    duplicate_checker.run_duplicate_check()
+
+    log_section_start("Distinct Item Reconciliation for Doctype: MEMO")
+    distinct_checker = DistinctCountChecker()
+    distinct_checker.run_distinct_count_check()
+
+    # Flush the discrepancy records and log the aggregates
+    get_sink().close()
+    if sql_diagnostics.get_sql_diagnostics():
+        sql_diagnostics.get_sql_diagnostics().write()
+    run_checkpoint.complete()
+
+    # Save the phase timings to the performance history (compare with: python perf_history.py)
+    run_id = get_recorder().save()
+    logging.info(f"Saved performance history for run {run_id}")
@@ -0,0 +1,158 @@
+# sample_check.py
+import argparse
+import logging
+import math
+from statistics import NormalDist
+from typing import Any, Dict, List, Tuple
+
+from db_connections import OracleConnection, SolrConnection
+from config import (ORACLE_CONN_STR, ORACLE_DRIVER, QUERY_PARAMS, SOLR_URL, PARENT_QUERY, CHILD_QUERIES,
+                    SAMPLE_FRACTION, SAMPLE_SEED, SAMPLE_CONFIDENCE)  # Import from config
+from discrepancy_sink import DiscrepancySink, get_sink
+from perf_history import get_recorder
+from profiling import profiled
+from solr_normalizer import NULL_MARKER
+from compare_kernel import CompareKernel, align
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+HASH_BUCKETS = 10000
+SOLR_TERMS_CHUNK = 1000
+KEY_FIELDS = {'item_number', 'filename'}  # Matched case-insensitively by document_key
+IGNORED_FIELDS = {'_text_', '_nest_path_', 'id', '_root_', '_version_', 'content', 'file_size', 'score'}
+
+
+def sampled_query(query: str) -> str:
+    """Restrict a query to the item_numbers whose hash bucket is in [:sample_low, :sample_high).
+
+    ORA_HASH of the lower-cased item number puts a parent and its attachments in the
+    same bucket, and the same seed always draws the same sample.
+    """
+    return (f"SELECT * FROM ({query}\n) "
+            f"WHERE ORA_HASH(LOWER(ITEM_NUMBER), {HASH_BUCKETS - 1}, :sample_seed) >= :sample_low "
+            f"AND ORA_HASH(LOWER(ITEM_NUMBER), {HASH_BUCKETS - 1}, :sample_seed) < :sample_high")
+
+
+def hash_range(part: int, parts: int) -> Tuple[int, int]:
+    """Buckets [low, high) of the part-th of `parts` disjoint slices covering every item."""
+    return part * HASH_BUCKETS // parts, (part + 1) * HASH_BUCKETS // parts
+
+
+def wilson_interval(errors: int, total: int, confidence: float = SAMPLE_CONFIDENCE) -> Tuple[float, float]:
+    """Wilson score interval of a proportion; stays inside [0, 1] for rates near zero."""
+    if total == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = errors / total
+    denominator = 1 + z * z / total
+    centre = (p + z * z / (2 * total)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / total + z * z / (4 * total * total)) / denominator
+    return (max(0.0, centre - margin) if errors else 0.0), min(1.0, centre + margin)
+
+
+def document_key(doc: Dict[str, Any]) -> Tuple[str, str]:
+    return str(doc.get('item_number')).lower(), str(doc.get('filename') or NULL_MARKER).lower()
+
+
+class SampleChecker:
+    """Field-level comparison of the items in a range of ORA_HASH buckets.
+
+    By default the range is the first `fraction` of the buckets (a sample); a
+    distributed run gives each task one hash_range slice instead.
+    """
+
+    def __init__(self, fraction: float = SAMPLE_FRACTION, seed: int = SAMPLE_SEED, sink: DiscrepancySink = None,
+                 buckets: Tuple[int, int] = None):
+        self.oracle_conn = OracleConnection(ORACLE_CONN_STR, ORACLE_DRIVER, QUERY_PARAMS)
+        self.solr_conn = SolrConnection(SOLR_URL)
+        self.sink = sink or get_sink()
+        self.perf = get_recorder()
+        self.buckets = buckets or (0, max(1, round(fraction * HASH_BUCKETS)))
+        self.fraction = (self.buckets[1] - self.buckets[0]) / HASH_BUCKETS
+        self.seed = seed
+
+    @profiled("sample_check")
+    def run_sample_check(self) -> Dict[str, Dict[str, Any]]:
+        """Compare field values on a hash sample of items and return the estimated mismatch rates."""
+        params = {"sample_seed": self.seed, "sample_low": self.buckets[0], "sample_high": self.buckets[1]}
+        with self.perf.phase("sample_check.oracle") as phase:
+            try:
+                self.oracle_conn.connect()
+                parent_rs = self.oracle_conn.format_cursor_data(
+                    self.oracle_conn.execute_query(sampled_query(PARENT_QUERY), params))
+                child_rs = []
+                for query in CHILD_QUERIES:
+                    child_rs.extend(self.oracle_conn.format_cursor_data(
+                        self.oracle_conn.execute_query(sampled_query(query), params)))
+                oracle_rows = list(self.oracle_conn.process_documents(parent_rs, child_rs))
+            finally:
+                self.oracle_conn.close()
+            phase['rows'] = len(oracle_rows)
+        logging.info(f"Sampled {len(parent_rs)} items ({len(oracle_rows)} documents) from Oracle at {self.fraction:.2%}")
+
+        # Solr cannot compute ORA_HASH, so it is filtered to the sampled item numbers instead
+        item_numbers = sorted({str(row['item_number']) for row in oracle_rows})
+        with self.perf.phase("sample_check.solr") as phase:
+            solr_docs = []
+            for start in range(0, len(item_numbers), SOLR_TERMS_CHUNK):
+                chunk = item_numbers[start:start + SOLR_TERMS_CHUNK]
+                solr_docs.extend(self.solr_conn.fetch_data("{!terms f=item_number}" + ",".join(chunk)))
+            phase['rows'] = len(solr_docs)
+
+        return self.compare_sample(oracle_rows, solr_docs)
+
+    def compare_sample(self, oracle_rows: List[Dict[str, Any]], solr_docs: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Record every differing value and estimate per-field mismatch rates with confidence intervals.
+
+        The "document" rate counts documents missing on either side among all documents of the sampled items.
+        """
+        keys, oracle_matched, solr_matched, unmatched, solr_only = align(oracle_rows, solr_docs, document_key)
+        for row in unmatched:
+            item_number, filename = document_key(row)
+            self.sink.record("sample_check", "missing_in_solr", key=item_number, oracle=filename)
+        # The terms query returns every document of the sampled items, so extra Solr documents are seen too
+        for doc in solr_only:
+            item_number, filename = document_key(doc)
+            self.sink.record("sample_check", "missing_in_oracle", key=item_number, solr=filename)
+        missing = len(unmatched) + len(solr_only)
+
+        fields = sorted({field for row in oracle_matched for field in row} - IGNORED_FIELDS - KEY_FIELDS)
+        results = CompareKernel().compare(oracle_matched, solr_matched, fields)
+        compared: Dict[str, int] = {}
+        mismatched: Dict[str, int] = {}
+        for field, (total, indices) in results.items():
+            if not total:
+                continue
+            compared[field] = total
+            mismatched[field] = len(indices)
+            for n in indices:
+                self.sink.record("sample_check", field, key=keys[n][0], oracle=oracle_matched[n][field], solr=solr_matched[n][field])
+
+        estimates = {"document": self.estimate(missing, len(oracle_rows) + len(solr_only))}
+        for field, total in sorted(compared.items()):
+            estimates[field] = self.estimate(mismatched.get(field, 0), total)
+        for field, estimate in estimates.items():
+            message = (f"{field}: {estimate['errors']}/{estimate['total']} mismatched, estimated rate "
+                       f"{estimate['rate']:.3%} ({SAMPLE_CONFIDENCE:.0%} CI {estimate['low']:.3%} - {estimate['high']:.3%})")
+            if estimate['errors']:
+                logging.warning(message)
+            else:
+                logging.info(message)
+        return estimates
+
+    def estimate(self, errors: int, total: int) -> Dict[str, Any]:
+        low, high = wilson_interval(errors, total)
+        return {"errors": errors, "total": total, "rate": errors / total if total else 0.0,
+                "low": low, "high": high, "estimated_total": round(errors / self.fraction)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Spot check a deterministic sample of items between Oracle and Solr.")
+    parser.add_argument("--fraction", type=float, default=SAMPLE_FRACTION, help="Share of item numbers to check, e.g. 0.01")
+    parser.add_argument("--seed", type=int, default=SAMPLE_SEED, help="ORA_HASH seed selecting the sample")
+    args = parser.parse_args()
+
+    obj = SampleChecker(args.fraction, args.seed)
+    obj.run_sample_check()
+    get_sink().close()
+    get_recorder().save()
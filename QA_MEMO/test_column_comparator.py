@@ -1,16 +1,14 @@
 import pytest
 from column_comparator import ColumnComparator
+from discrepancy_sink import DiscrepancySink
+
+def test_compare_columns(tmp_path):
+    sink = DiscrepancySink(path=str(tmp_path / "discrepancies.jsonl.gz"))
+    comparator = ColumnComparator(sink=sink)
 
-@pytest.mark.usefixtures("caplog")
-def test_compare_columns(caplog):
-    comparator = ColumnComparator()
-    
     # Perform the comparison
-    with caplog.at_level("WARNING"):
-        comparator.compare_columns()
-    
-    # Check if a mismatch was logged (which should cause the test to fail)
-    assert "Columns mismatch" not in caplog.text, "Test failed: Column mismatch was detected"
-    assert "Columns only in Oracle but not in Solr" not in caplog.text, "Test failed: Columns are missing from Solr"
-    assert "Columns only in Solr but not in Oracle" not in caplog.text, "Test failed: Columns are missing from Oracle"
+    comparator.compare_columns()
+    sink.close()
 
+    # Any column present on only one side is recorded as a discrepancy (which should cause the test to fail)
+    assert sink.count(checker="column_comparator") == 0, "Test failed: Column mismatch was detected"
@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+import types
+import pytest
+import db_connections
+from db_connections import load_driver, AsyncOracleConnection, OracleConnection
+from perf_history import get_recorder
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def test_solr_only_modules_import_without_oracle_drivers():
+    # An entry of None in sys.modules makes the import raise ImportError, as if the package were not installed
+    code = ("import sys; sys.modules['cx_Oracle'] = sys.modules['oracledb'] = None; "
+            "import status_check, duplicate_check, db_connections; db_connections.SolrConnection('http://solr/core')")
+    result = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True)
+
+    assert result.returncode == 0, f"Test failed: A Solr-only module needed an Oracle driver: {result.stderr}"
+
+def test_load_driver_caches_modules_and_names_missing_packages(monkeypatch):
+    monkeypatch.setitem(db_connections.DRIVERS, "missing", "no_such_driver_module")
+
+    assert load_driver("http") is load_driver("http"), "Test failed: The driver module was not cached."
+    with pytest.raises(ImportError, match="'no_such_driver_module' package"):
+        load_driver("missing")
+
+PARENT_ROWS = [
+    {"ITEM_NUMBER": "DOC-1", "DESCRIPTION": "First", "LIFECYCLE": "Production", "RELEASE_DATE": "2021-03-04 10:00:00", "REV_NUMBER": "A"},
+    {"ITEM_NUMBER": "doc-2", "DESCRIPTION": "n/a", "LIFECYCLE": None, "RELEASE_DATE": None, "REV_NUMBER": None},
+    {"ITEM_NUMBER": "DOC-3", "DESCRIPTION": "", "LIFECYCLE": "null", "RELEASE_DATE": "2022-01-01 00:00:00", "REV_NUMBER": "B"},
+    {"ITEM_NUMBER": None, "DESCRIPTION": "orphan", "LIFECYCLE": None, "RELEASE_DATE": None, "REV_NUMBER": None},
+]
+CHILD_ROWS = [
+    {"ITEM_NUMBER": "DOC-1", "DESCRIPTION": "child", "LIFECYCLE": "x", "RELEASE_DATE": "y", "FILENAME": "a.pdf",
+     "IFS_FILEPATH": "v/a.pdf", "REV_NUMBER": "C"},
+    {"ITEM_NUMBER": "DOC-2", "DESCRIPTION": None, "LIFECYCLE": None, "RELEASE_DATE": None, "FILENAME": "N/A",
+     "IFS_FILEPATH": None, "REV_NUMBER": ""},
+    {"ITEM_NUMBER": "doc-1", "DESCRIPTION": "child", "LIFECYCLE": "x", "RELEASE_DATE": "y", "FILENAME": "b.pdf",
+     "IFS_FILEPATH": "null", "REV_NUMBER": "D"},
+]
+
+def baseline_process_documents(conn, parents, children):
+    """process_documents as it was before JoinedRow: one fresh dict per row."""
+    for parent in parents:
+        parent = {k.lower(): v for k, v in parent.items()}
+        item_number = parent.get('item_number')
+        if not item_number:
+            continue
+        parent_children = [{k.lower(): v for k, v in child.items()}
+                           for child in children if child.get('ITEM_NUMBER', '').lower() == item_number.lower()]
+        if parent_children:
+            for child in parent_children:
+                combined_item = conn.replace_null_values(parent)
+                child_item = {k: v for k, v in child.items() if k not in ['item_number', 'description', 'lifecycle', 'release_date']}
+                combined_item.update(conn.replace_null_values(child_item))
+                yield combined_item
+        else:
+            yield conn.replace_null_values(parent)
+
+def test_process_documents_matches_the_dict_rows():
+    conn = OracleConnection("user/password@db")
+
+    rows = list(conn.process_documents(PARENT_ROWS, CHILD_ROWS))
+    expected = list(baseline_process_documents(conn, PARENT_ROWS, CHILD_ROWS))
+
+    assert [list(row.items()) for row in rows] == [list(row.items()) for row in expected], \
+        "Test failed: JoinedRow values or key order differ from the dict rows."
+    assert [len(row) for row in rows] == [len(row) for row in expected], "Test failed: JoinedRow has the wrong length."
+    assert rows[0].parent is rows[1].parent, "Test failed: The rows of one parent do not share its dict."
+
+
+class FakeAsyncCursor:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def execute(self, query, params=None):
+        self.pool.active += 1
+        self.pool.peak = max(self.pool.peak, self.pool.active)
+        await asyncio.sleep(0.05)
+        self.pool.active -= 1
+        self.description = [("ITEM_NUMBER", None)]
+        self.rows = [(query,)]
+
+    async def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeAsyncPool:
+    def __init__(self):
+        self.active = self.peak = 0
+        self.closed = False
+
+    def acquire(self):
+        pool = self
+
+        class Session:
+            async def __aenter__(self):
+                return types.SimpleNamespace(cursor=lambda: FakeAsyncCursor(pool))
+
+            async def __aexit__(self, *exc):
+                return False
+        return Session()
+
+    async def close(self):
+        self.closed = True
+
+
+def fake_oracledb(pool):
+    return types.SimpleNamespace(create_pool_async=lambda **kwargs: pool, DatabaseError=Exception,
+                                 DB_TYPE_CLOB="CLOB", DB_TYPE_NCLOB="NCLOB", DB_TYPE_BLOB="BLOB",
+                                 DB_TYPE_LONG="LONG", DB_TYPE_LONG_RAW="LONG_RAW")
+
+def test_async_oracle_connection_runs_queries_concurrently(monkeypatch):
+    pool = FakeAsyncPool()
+    monkeypatch.setitem(db_connections._loaded_drivers, "oracledb", fake_oracledb(pool))
+    conn = AsyncOracleConnection("user/password@db", max_sessions=2)
+
+    conn.connect()
+    results = conn.execute_queries(["SELECT 1 FROM A", "SELECT 2 FROM B"])
+
+    assert results == [[{"ITEM_NUMBER": "SELECT 1 FROM A"}], [{"ITEM_NUMBER": "SELECT 2 FROM B"}]], \
+        "Test failed: Query results were lost or reordered."
+    assert pool.peak == 2, "Test failed: The queries did not run concurrently."
+    assert pool.closed and conn.connection is None, "Test failed: A session was left open."
+
+ITEMS_TABLE = "CREATE TABLE items (ITEM_NUMBER TEXT, DOC_TYPE TEXT, REV INTEGER);"
+ITEMS_QUERY = "SELECT ITEM_NUMBER, DOC_TYPE, REV FROM items WHERE DOC_TYPE = :doc_type"
+
+def fill_items(fake_oracle, count=40):
+    fake_oracle.db.execute(ITEMS_TABLE)
+    fake_oracle.db.executemany("INSERT INTO items VALUES (?, ?, ?)",
+                               [(f"DOC-{n}", "DOC" if n % 5 else "BV", n) for n in range(count)])
+
+def test_partitioned_query_merges_to_the_serial_result(fake_oracle):
+    fill_items(fake_oracle)
+    conn = OracleConnection("user/password@db", query_params={"doc_type": "DOC"})
+    conn.connect()
+    serial = conn.execute_query(ITEMS_QUERY)
+    partitioned = conn.execute_partitioned(ITEMS_QUERY, 4)
+    conn.close()
+
+    key = lambda row: row["ITEM_NUMBER"]
+    assert len(serial) == 32, "Test failed: The serial query did not filter on the bind value."
+    assert sorted(partitioned, key=key) == sorted(serial, key=key), "Test failed: The merged partitions differ from the serial result."
+
+def test_failed_partition_raises_instead_of_shortening_the_result(fake_oracle, monkeypatch):
+    fill_items(fake_oracle)
+    conn = OracleConnection("user/password@db", query_params={"doc_type": "DOC"})
+    fetch_partition = conn.fetch_partition
+
+    def failing_partition(pool, query, params):
+        if params["partition"] == 2:
+            raise fake_oracle.DatabaseError("ORA-03113: end-of-file on communication channel")
+        return fetch_partition(pool, query, params)
+
+    monkeypatch.setattr(conn, "fetch_partition", failing_partition)
+    conn.connect()
+    with pytest.raises(fake_oracle.DatabaseError, match="ORA-03113"):
+        conn.execute_partitioned(ITEMS_QUERY, 4)
+    conn.close()
+
+def test_database_error_is_raised_instead_of_an_empty_result(fake_oracle):
+    conn = OracleConnection("user/password@db")
+    conn.connect()
+    with pytest.raises(fake_oracle.DatabaseError):
+        conn.execute_query("SELECT ITEM_NUMBER FROM missing_table")
+    conn.close()
+
+NOTES_QUERY = "SELECT ITEM_NUMBER, BODY FROM notes"
+
+def fill_notes(fake_oracle):
+    fake_oracle.db.executescript("CREATE TABLE notes (ITEM_NUMBER TEXT, BODY TEXT);"
+                                 f"INSERT INTO notes VALUES ('DOC-1', '{'x' * 95}'); INSERT INTO notes VALUES ('DOC-2', NULL);")
+    fake_oracle.types["BODY"] = fake_oracle.DB_TYPE_CLOB
+
+def test_inline_lobs_report_their_share_of_the_fetch(fake_oracle, caplog):
+    fill_notes(fake_oracle)
+    conn = OracleConnection("user/password@db")
+    conn.connect()
+    with caplog.at_level(logging.INFO):
+        rows = conn.execute_query(NOTES_QUERY)
+    conn.close()
+
+    assert rows == [{"ITEM_NUMBER": "DOC-1", "BODY": "x" * 95}, {"ITEM_NUMBER": "DOC-2", "BODY": None}], \
+        "Test failed: The LOB was not fetched inline as a string."
+    assert "Fetched 1 LOB columns (BODY) inline: 95 characters/bytes in 2 rows (90% of the fetched data)" in caplog.text, \
+        "Test failed: The inline fetch did not report the LOB share."
+
+def test_lob_locators_are_read_after_the_rows(fake_oracle, caplog):
+    fill_notes(fake_oracle)
+    conn = OracleConnection("user/password@db", inline_lobs=False)
+    conn.connect()
+    with caplog.at_level(logging.INFO):
+        rows = conn.execute_query(NOTES_QUERY)
+    conn.close()
+
+    assert rows == [{"ITEM_NUMBER": "DOC-1", "BODY": "x" * 95}, {"ITEM_NUMBER": "DOC-2", "BODY": None}], \
+        "Test failed: The LOB locators were not read."
+    assert "Read 1 LOB columns of 2 rows through locators" in caplog.text and "(90% of the fetched data)" in caplog.text, \
+        "Test failed: The locator fetch did not report the LOB share."
+
+JOIN_PARENT_QUERY = "SELECT * FROM parents"
+JOIN_CHILD_QUERIES = ["SELECT * FROM children WHERE FILENAME LIKE '%.pdf'", "SELECT * FROM children WHERE FILENAME NOT LIKE '%.pdf'"]
+
+def test_lobs_over_the_inline_limit_are_read_through_locators(fake_oracle, caplog):
+    fill_notes(fake_oracle)
+    fake_oracle.db.execute("INSERT INTO notes VALUES ('DOC-3', 'short')")
+    fake_oracle.types["LOCATOR$0"] = fake_oracle.DB_TYPE_CLOB
+    conn = OracleConnection("user/password@db", lob_inline_limit=50)
+    conn.connect()
+    with caplog.at_level(logging.INFO):
+        rows = conn.execute_query(NOTES_QUERY)
+    conn.close()
+
+    assert rows == [{"ITEM_NUMBER": "DOC-1", "BODY": "x" * 95}, {"ITEM_NUMBER": "DOC-2", "BODY": None},
+                    {"ITEM_NUMBER": "DOC-3", "BODY": "short"}], "Test failed: The LOB values were not all fetched."
+    assert "DBMS_LOB.GETLENGTH(Q.\"BODY\") <= 50" in fake_oracle.statements[-1][0], "Test failed: The LOB column was not split at the limit."
+    assert "Read 1 LOB values over 50 characters/bytes through locators" in caplog.text, \
+        "Test failed: Only the LOB over the limit should have been read through its locator."
+
+def test_lob_locators_are_read_batch_by_batch(fake_oracle):
+    fill_notes(fake_oracle)
+    conn = OracleConnection("user/password@db", inline_lobs=False, arraysize=1)
+    recorder = get_recorder()
+    phases = len(recorder.phases)
+    conn.connect()
+    rows = conn.execute_query(NOTES_QUERY)
+    conn.close()
+
+    reads = [phase for phase in recorder.phases[phases:] if phase["phase"] == "oracle.lob_read.cx_Oracle"]
+    assert [phase["rows"] for phase in reads] == [1, 1], "Test failed: The locators were not read after each row batch."
+    assert rows[0]["BODY"] == "x" * 95, "Test failed: The LOB locator was not read."
+
+def fill_documents(fake_oracle):
+    parents = PARENT_ROWS + [{**PARENT_ROWS[0], "ITEM_NUMBER": f"DOC-{n}"} for n in range(10, 30)]
+    children = CHILD_ROWS + [{**CHILD_ROWS[0], "ITEM_NUMBER": f"doc-{n}", "FILENAME": f"{n}-{k}.pdf"}
+                             for n in range(10, 30) for k in range(n % 3)]
+    for table, rows in (("parents", parents), ("children", children)):
+        columns = list(rows[0])
+        fake_oracle.db.execute(f"CREATE TABLE {table} ({', '.join(columns)})")
+        # Oracle stores empty strings as NULL
+        fake_oracle.db.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(columns))})",
+                                   [tuple(row[column] or None for column in columns) for row in rows])
+    fake_oracle.types["RELEASE_DATE"] = fake_oracle.DB_TYPE_DATE
+
+@pytest.mark.parametrize("partitions", [1, 3])
+def test_execute_joined_matches_process_documents(fake_oracle, partitions):
+    fill_documents(fake_oracle)
+    conn = OracleConnection("user/password@db")
+    conn.connect()
+    joined = conn.fetch_documents(JOIN_PARENT_QUERY, JOIN_CHILD_QUERIES, partitions=partitions, join_mode="server")
+    processed = conn.fetch_documents(JOIN_PARENT_QUERY, JOIN_CHILD_QUERIES, partitions=partitions, join_mode="client")
+    conn.close()
+
+    assert len(processed) == 2 + 1 + 1 + sum(max(n % 3, 1) for n in range(10, 30)), "Test failed: Wrong number of fixture documents."
+    assert [dict(row) for row in joined] == [dict(row) for row in processed], \
+        "Test failed: The Oracle join differs from process_documents."
+    if partitions > 1:
+        joins = [query for query, _ in fake_oracle.statements if "P_PART" in query]
+        assert joins and all(query.count("ORA_HASH") == 1 + len(JOIN_CHILD_QUERIES) for query in joins), \
+            "Test failed: The parent and child queries were not partitioned before they were numbered."
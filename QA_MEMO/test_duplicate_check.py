@@ -0,0 +1,25 @@
+import pytest
+from duplicate_check import DuplicateChecker, flatten_duplicates
+from discrepancy_sink import DiscrepancySink
+
+def test_run_duplicate_check(tmp_path):
+    sink = DiscrepancySink(path=str(tmp_path / "discrepancies.jsonl.gz"))
+    checker = DuplicateChecker(sink=sink)
+
+    duplicates = checker.run_duplicate_check()
+    sink.close()
+
+    assert sink.count(checker="duplicate_check") == 0, f"Test failed: Documents indexed more than once: {duplicates}"
+
+def test_flatten_duplicates_keeps_only_complete_keys():
+    # DOC-1 has two different attachments: its item bucket comes back, but no filename bucket reaches mincount 2
+    facets = {"item_number": {"buckets": [
+        {"val": "DOC-1", "count": 2, "filename": {"buckets": []}},
+        {"val": "DOC-2", "count": 3, "filename": {"buckets": [{"val": "a.pdf", "count": 2}], "missing": {"count": 1}}},
+        {"val": "DOC-3", "count": 2, "filename": {"buckets": [], "missing": {"count": 2}}},
+    ]}}
+
+    duplicates = flatten_duplicates(facets, ["item_number", "filename"])
+
+    assert duplicates == {("DOC-2", "a.pdf"): 2, ("DOC-3", "#null#"): 2}, \
+        "Test failed: An item with several attachments was taken for a duplicate."
@@ -0,0 +1,35 @@
+import pytest
+import os
+from file_vault_check import FileVaultChecker, StatCache, stat_paths, STAT_MISSING, STAT_OK
+from discrepancy_sink import DiscrepancySink
+
+def test_run_file_vault_check(tmp_path):
+    sink = DiscrepancySink(path=str(tmp_path / "discrepancies.jsonl.gz"))
+    checker = FileVaultChecker(sink=sink)
+
+    checker.run_file_vault_check()
+    sink.close()
+
+    assert sink.count(checker="file_vault_check", field="missing") == 0, "Test failed: Attachments are missing from the file vault."
+    assert sink.count(checker="file_vault_check", field="unreadable") == 0, "Test failed: Attachments are not readable."
+    assert sink.count(checker="file_vault_check", field="file_size") == 0, "Test failed: Attachment sizes differ from Solr file_size."
+
+def test_stat_cache_revalidates_changed_directories(tmp_path):
+    cache = StatCache(str(tmp_path / "stat_cache.json"), ttl=3600)
+    path = tmp_path / "vault" / "a.pdf"
+    path.parent.mkdir()
+
+    assert stat_paths([str(path)], workers=1, cache=cache)[str(path)]["status"] == STAT_MISSING
+    assert cache.entries == {}, "Test failed: A missing file was cached."
+
+    path.write_bytes(b"12345")
+    os.utime(path.parent, (1, 1))
+    entry = stat_paths([str(path)], workers=1, cache=cache)[str(path)]
+    assert (entry["status"], entry["size"]) == (STAT_OK, 5), "Test failed: A restored file was not found."
+
+    replacement = tmp_path / "vault" / "a.pdf.new"
+    replacement.write_bytes(b"123")
+    os.replace(replacement, path)
+    os.utime(path.parent, (2, 2))
+    assert stat_paths([str(path)], workers=1, cache=cache)[str(path)]["size"] == 3, \
+        "Test failed: The cached size of a replaced file was reused."
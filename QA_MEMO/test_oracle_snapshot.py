@@ -0,0 +1,41 @@
+import pytest
+from db_connections import OracleConnection
+from oracle_snapshot import OracleSnapshot, CURRENT_SCN_QUERY, ENABLE_FLASHBACK_PROC
+
+QUERY = "SELECT ITEM_NUMBER FROM items WHERE DOC_TYPE = :doc_type"
+
+def test_cache_is_keyed_by_query_binds_and_scn(tmp_path):
+    snapshot = OracleSnapshot(str(tmp_path), scn=100)
+    snapshot.store(QUERY, [{"ITEM_NUMBER": "DOC-1"}], {"doc_type": "DOC"})
+
+    assert snapshot.load(QUERY, {"doc_type": "DOC"}) == [{"ITEM_NUMBER": "DOC-1"}], "Test failed: The cached result was not loaded."
+    assert snapshot.load(QUERY, {"doc_type": "BV"}) is None, "Test failed: A result was reused for other bind values."
+    assert OracleSnapshot(str(tmp_path), scn=101).load(QUERY, {"doc_type": "DOC"}) is None, \
+        "Test failed: A result was reused at another SCN."
+    assert OracleSnapshot(str(tmp_path)).load(QUERY, {"doc_type": "DOC"}) is None, \
+        "Test failed: A result was loaded before the SCN was known."
+
+def test_scn_is_captured_once_and_pinned(fake_oracle, tmp_path):
+    snapshot = OracleSnapshot(str(tmp_path))
+
+    snapshot.pin(fake_oracle.connect("user/password@db"))
+    snapshot.pin(fake_oracle.connect("user/password@db"))
+
+    assert snapshot.scn == fake_oracle.scn, "Test failed: The SCN was not captured."
+    assert [query for query, _ in fake_oracle.statements] == [CURRENT_SCN_QUERY], "Test failed: The SCN was read more than once."
+    assert fake_oracle.calls == [(ENABLE_FLASHBACK_PROC, [fake_oracle.scn])] * 2, "Test failed: A session was not pinned to the SCN."
+
+def test_known_scn_defers_connecting_until_a_cache_miss(fake_oracle, tmp_path):
+    fake_oracle.db.executescript("CREATE TABLE items (ITEM_NUMBER TEXT, DOC_TYPE TEXT); INSERT INTO items VALUES ('DOC-1', 'DOC');")
+    conn = OracleConnection("user/password@db", query_params={"doc_type": "DOC"})
+    conn.snapshot = OracleSnapshot(str(tmp_path), scn=fake_oracle.scn)
+
+    conn.connect()
+    assert fake_oracle.connections == 0, "Test failed: A session was opened although the SCN is known."
+    first = conn.execute_query(QUERY)
+    conn.close()
+    conn.connect()
+    second = conn.execute_query(QUERY)
+
+    assert first == second == [{"ITEM_NUMBER": "DOC-1"}], "Test failed: The query result changed."
+    assert fake_oracle.connections == 1, "Test failed: The cached result did not spare the second session."
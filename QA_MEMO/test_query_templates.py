@@ -0,0 +1,28 @@
+import pytest
+from config import PARENT_QUERY, CHILD_QUERIES, QUERY_PARAMS
+from db_connections import OracleConnection, STMT_CACHE_SIZE, bind_names
+from query_templates import CHILD_QUERY_TEMPLATE, VERSION_CHILD_QUERY_TEMPLATE
+
+def test_templates_bind_the_doctype_values():
+    for template in (CHILD_QUERY_TEMPLATE, VERSION_CHILD_QUERY_TEMPLATE):
+        assert bind_names(template) == {"subclass", "excluded_ids"}, "Test failed: A template has unexpected bind variables."
+    for query in [PARENT_QUERY] + CHILD_QUERIES:
+        assert bind_names(query) <= {name.lower() for name in QUERY_PARAMS}, "Test failed: A query uses a bind variable QUERY_PARAMS lacks."
+
+def test_bind_names_ignore_string_literals():
+    assert bind_names("SELECT ':x' A, TO_CHAR(D, 'HH24:MI:SS') FROM T WHERE B = :Item AND C = :item") == {"item"}, \
+        "Test failed: Colons in string literals were taken for bind variables."
+
+def test_bind_params_are_limited_to_the_query():
+    conn = OracleConnection("user/password@db", query_params={"subclass": "Document", "excluded_ids": "1,2"})
+
+    params = conn.bind_params("SELECT * FROM T WHERE S = :subclass AND N = :n", {"subclass": "Memo", "n": 1, "unused": 2})
+
+    assert params == {"subclass": "Memo", "n": 1}, "Test failed: Binds were not merged with the defaults or not limited to the query."
+
+def test_sessions_cache_statements(fake_oracle):
+    conn = OracleConnection("user/password@db")
+
+    conn.open_session()
+
+    assert conn.connection.stmtcachesize == STMT_CACHE_SIZE, "Test failed: The statement cache size was not set."
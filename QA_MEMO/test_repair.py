@@ -0,0 +1,126 @@
+import gzip
+import json
+import pytest
+from repair import SolrRepairer, divergent_items, solr_value
+
+FIELDS = [{"name": "id", "type": "string", "stored": True},
+          {"name": "item_number", "type": "string", "stored": True},
+          {"name": "filename", "type": "string", "stored": True},
+          {"name": "title", "type": "string", "stored": True},
+          {"name": "release_date", "type": "pdate", "stored": False, "docValues": True},
+          {"name": "_text_", "type": "text_general", "stored": False},
+          {"name": "_version_", "type": "plong", "stored": False, "docValues": True}]
+CONTENT = {"name": "content", "type": "text_general", "stored": False}
+
+class FakeSolr:
+    """SolrConnection stand-in recording the update batches and commits."""
+
+    def __init__(self, fields=FIELDS, docs=()):
+        self.fields = fields
+        self.docs = list(docs)
+        self.batches = []
+        self.commits = 0
+
+    def get_schema_fields(self, show_defaults=False):
+        return self.fields
+
+    def get_copy_fields(self):
+        return [{"source": "title", "dest": "_text_"}]
+
+    def fetch_data(self, query, fl=None):
+        return self.docs
+
+    def add_documents(self, docs, commit_within=None, field_updates=None):
+        self.batches.append((docs, commit_within, field_updates))
+
+    def commit(self):
+        self.commits += 1
+
+class RecordingSink:
+    def __init__(self):
+        self.records = []
+
+    def record(self, checker, field, **kwargs):
+        self.records.append((checker, field, kwargs.get("key")))
+
+def repairer(solr, **kwargs):
+    obj = SolrRepairer(sink=RecordingSink(), **kwargs)
+    obj.solr_conn = solr
+    return obj
+
+def rows(count):
+    return [{"item_number": f"DOC-{n}", "filename": f"f{n}.pdf", "title": f"T{n}", "release_date": "#null#"} for n in range(count)]
+
+def test_divergent_items(tmp_path):
+    path = tmp_path / "discrepancies.jsonl.gz"
+    records = [{"run": "r1", "checker": "sample_check", "field": "title", "key": "DOC-0"},
+               {"run": "r2", "checker": "sample_check", "field": "title", "key": "DOC-1"},
+               {"run": "r2", "checker": "watch_mode", "field": "missing_in_solr", "key": "DOC-2"},
+               {"run": "r2", "checker": "watch_mode", "field": "missing_in_oracle", "key": "DOC-3"},
+               {"run": "r2", "checker": "duplicate_check", "field": "duplicate", "key": {"item_number": "DOC-4"}},
+               {"run": "r2", "checker": "status_check", "field": "lifecycle", "key": "5"},
+               {"run": "r2", "checker": "watch_mode", "field": "title", "key": "DOC-6"}]
+    with gzip.open(path, "wt", encoding="utf-8") as fh:
+        fh.writelines(json.dumps(rec) + "\n" for rec in records)
+
+    assert divergent_items(str(path)) == {"DOC-1", "DOC-2", "DOC-6"}, "Test failed: Wrong items selected for repair."
+
+def test_solr_value():
+    assert solr_value("#null#", "string") is None, "Test failed: #null# was indexed."
+    assert solr_value("'A'", "string") == "A", "Test failed: The rev_number quotes were indexed."
+    assert solr_value("2021-03-04 10:00:00", "pdate") == "2021-03-04T10:00:00Z", "Test failed: Date not in Solr format."
+
+def test_build_documents_splits_updates_and_additions():
+    obj = repairer(FakeSolr())
+
+    updates, additions = obj.build_documents(rows(2), {("doc-0", "f0.pdf"): "solr-id-0"}, FIELDS)
+
+    assert updates == [{"id": "solr-id-0", "item_number": "DOC-0", "filename": "f0.pdf", "title": "T0", "release_date": None}], \
+        "Test failed: An existing document was not updated under its id with None removing the field."
+    assert additions == [{"id": "DOC-1_f1.pdf", "item_number": "DOC-1", "filename": "f1.pdf", "title": "T1"}], \
+        "Test failed: A missing document was not added with the REPAIR_ID_FIELDS id and without None values."
+
+def test_whole_documents_leave_none_out():
+    obj = repairer(FakeSolr(fields=FIELDS + [CONTENT]), atomic=False)
+
+    updates, _ = obj.build_documents(rows(1), {("doc-0", "f0.pdf"): "solr-id-0"}, obj.schema_fields())
+
+    assert updates == [{"id": "solr-id-0", "item_number": "DOC-0", "filename": "f0.pdf", "title": "T0"}], \
+        "Test failed: A replaced document kept a None value."
+
+def test_atomic_repair_refuses_fields_it_would_drop():
+    solr = FakeSolr(fields=FIELDS + [CONTENT])
+
+    with pytest.raises(ValueError, match="drop content,"):
+        repairer(solr).repair(["DOC-0"], oracle_rows=rows(1))
+    assert solr.batches == [], "Test failed: Documents were sent although atomic updates would drop content."
+
+def test_send_batches_and_commits_once():
+    docs = rows(5)
+    solr = FakeSolr(docs=[{"id": f"DOC-{n}_f{n}.pdf", **row} for n, row in enumerate(docs)])
+    obj = repairer(solr, batch_size=2, concurrency=1, commit_within=None)
+
+    still_divergent = obj.repair([row["item_number"] for row in docs], oracle_rows=docs)
+
+    assert [len(batch) for batch, _, _ in solr.batches] == [2, 2, 1], "Test failed: The documents were not sent in batches."
+    assert all(commit_within is None and field_updates["title"] == "set" for _, commit_within, field_updates in solr.batches), \
+        "Test failed: The existing documents were not updated atomically without commitWithin."
+    assert solr.commits == 1, "Test failed: Without commitWithin the repair did not commit exactly once."
+    assert still_divergent == 0, "Test failed: Matching documents were reported divergent."
+
+def test_dry_run_sends_nothing():
+    solr = FakeSolr()
+    obj = repairer(solr, commit_within=None, dry_run=True)
+
+    assert obj.repair(["DOC-0", "DOC-1"], oracle_rows=rows(2)) == 2, "Test failed: A dry run did not report all items."
+    assert solr.batches == [] and solr.commits == 0, "Test failed: A dry run sent documents or committed."
+
+def test_verify_records_what_still_differs():
+    obj = repairer(FakeSolr())
+    oracle_rows = rows(3)
+    oracle_rows[2]["item_number"] = "DOC-1"  # A second file of DOC-1 is missing
+    solr_docs = [dict(oracle_rows[0]), dict(oracle_rows[1], title="stale")]
+
+    assert obj.verify(oracle_rows, solr_docs) == 1, "Test failed: The divergent items were not counted."
+    assert sorted(obj.sink.records) == [("repair", "missing_in_solr", "DOC-1"), ("repair", "title", "DOC-1")], \
+        "Test failed: The remaining discrepancies were not recorded."
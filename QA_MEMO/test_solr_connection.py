@@ -0,0 +1,79 @@
+import pytest
+import checkpoint
+import db_connections
+import fetch_controller
+from checkpoint import RunCheckpoint
+from db_connections import SolrConnection, SolrFetchError, SOLR_RETRIES
+from fetch_controller import AdaptiveFetchController
+
+DOCS = [{"id": f"DOC-{n:02d}"} for n in range(11)]
+
+class FakeResults(list):
+    def __init__(self, docs, hits, next_cursor_mark):
+        super().__init__(docs)
+        self.hits = hits
+        self.nextCursorMark = next_cursor_mark
+        self.qtime = 1
+
+class FakePysolr:
+    """pysolr stand-in serving DOCS by cursorMark; requests at a failing cursorMark raise."""
+
+    def __init__(self, fail_at=None, failures=0, error=OSError):
+        self.fail_at = fail_at
+        self.failures = failures  # Requests at fail_at that fail before the server answers again
+        self.error = error
+        self.requests = []
+
+    def search(self, query, rows, cursorMark, **kwargs):
+        self.requests.append(cursorMark)
+        if cursorMark == self.fail_at and self.failures:
+            self.failures -= 1
+            raise self.error("503 Service Unavailable")
+        start = 0 if cursorMark == "*" else int(cursorMark)
+        end = start + rows
+        return FakeResults(DOCS[start:end], len(DOCS), str(min(end, len(DOCS))))
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(db_connections.time, "sleep", sleeps.append)
+    controller = AdaptiveFetchController(rows=2, min_rows=2, max_rows=2, target_latency=10, load_share=1000)
+    monkeypatch.setitem(fetch_controller._controllers, "solr:8983", controller)
+    monkeypatch.setattr(checkpoint, "_default_checkpoint", None)
+    return sleeps
+
+def connect(client):
+    conn = SolrConnection("http://solr:8983/solr/DOC")
+    conn._solr_client = client
+    return conn
+
+def test_fetch_raises_after_the_last_retry(sleeps):
+    client = FakePysolr(fail_at="*", failures=SOLR_RETRIES + 1)
+
+    with pytest.raises(SolrFetchError, match="stopped after 0 documents"):
+        connect(client).fetch_data(normalize=False)
+    assert len(client.requests) == SOLR_RETRIES + 1, "Test failed: The page was not retried SOLR_RETRIES times."
+    assert sleeps == [2 ** attempt for attempt in range(1, SOLR_RETRIES + 1)], "Test failed: The retries did not back off exponentially."
+
+def test_failed_fetch_checkpoints_its_pages(sleeps, tmp_path):
+    run_checkpoint = RunCheckpoint(str(tmp_path))
+    checkpoint._default_checkpoint = run_checkpoint
+    client = FakePysolr(fail_at="6", failures=SOLR_RETRIES + 1)
+
+    with pytest.raises(SolrFetchError, match="stopped after 6 documents"):
+        connect(client).fetch_data(normalize=False)
+    key = db_connections.checkpoint_key("solr", "http://solr:8983/solr/DOC", "*:*", None, False, [("sort", "id asc")])
+
+    assert run_checkpoint.load_pages(key) == ("6", 3, DOCS[:6]), "Test failed: The fetched pages and cursorMark were not saved."
+
+def test_resumed_fetch_continues_without_duplicates(sleeps, tmp_path):
+    checkpoint._default_checkpoint = RunCheckpoint(str(tmp_path), every=2)
+    # An interrupt is not retried, so only the cursorMark of page 2 is saved while page 3 is already appended
+    with pytest.raises(KeyboardInterrupt):
+        connect(FakePysolr(fail_at="6", failures=1, error=KeyboardInterrupt)).fetch_data(normalize=False)
+    client = FakePysolr()
+
+    docs = connect(client).fetch_data(normalize=False)
+
+    assert docs == DOCS, "Test failed: The resumed fetch lost or repeated documents."
+    assert client.requests[0] == "4", "Test failed: The fetch did not resume from the saved cursorMark."
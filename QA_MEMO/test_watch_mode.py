@@ -0,0 +1,130 @@
+import threading
+import pytest
+import watch_mode
+from db_connections import OracleConnection
+from discrepancy_sink import DiscrepancySink
+from watch_mode import LocalChangeFeed, PollingChangeFeed, WatchValidator, micro_batches
+
+def test_micro_batches_coalesce_bursts():
+    feed = LocalChangeFeed()
+    feed.push("DOC-1", "DOC-2", "DOC-1", "DOC-3")
+
+    batches = list(micro_batches(feed, window=0.2, max_batch=500, max_batches=1))
+
+    assert batches == [{"DOC-1", "DOC-2", "DOC-3"}], "Test failed: A burst of changes was not coalesced into one batch."
+
+def test_micro_batches_split_at_max_batch():
+    feed = LocalChangeFeed()
+    feed.push(*[f"DOC-{n}" for n in range(5)])
+
+    batches = list(micro_batches(feed, window=0.2, max_batch=2, max_batches=3))
+
+    assert [len(batch) for batch in batches] == [2, 2, 1], "Test failed: Batches were not limited to max_batch items."
+    assert set().union(*batches) == {f"DOC-{n}" for n in range(5)}, "Test failed: Changed items were lost."
+
+def test_micro_batches_include_late_changes_within_window():
+    feed = LocalChangeFeed()
+    feed.push("DOC-1")
+    threading.Timer(0.05, feed.push, args=("DOC-2",)).start()
+
+    batches = list(micro_batches(feed, window=0.3, max_batch=500, max_batches=1))
+
+    assert batches == [{"DOC-1", "DOC-2"}], "Test failed: A change inside the batch window started a new batch."
+
+
+class FakeSolr:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def fetch_data(self, query, **kwargs):
+        return self.docs
+
+def test_validate_items_compares_field_values(fake_oracle, monkeypatch, tmp_path):
+    fake_oracle.db.executescript("""
+        CREATE TABLE parent (ITEM_NUMBER TEXT, DESCRIPTION TEXT);
+        CREATE TABLE child (ITEM_NUMBER TEXT, FILENAME TEXT, FILE_TYPE TEXT);
+        INSERT INTO parent VALUES ('DOC-1', 'New title'), ('DOC-2', 'Same');
+        INSERT INTO child VALUES ('DOC-1', 'a.pdf', 'pdf'), ('DOC-2', 'b.pdf', 'pdf');
+    """)
+    monkeypatch.setattr(watch_mode, "PARENT_QUERY", "SELECT * FROM parent")
+    monkeypatch.setattr(watch_mode, "CHILD_QUERIES", ["SELECT * FROM child"])
+    sink = DiscrepancySink(path=str(tmp_path / "discrepancies.jsonl.gz"))
+    validator = WatchValidator(feed=LocalChangeFeed(), sink=sink)
+    validator.solr_conn = FakeSolr([
+        {"id": "1", "item_number": "DOC-1", "filename": "a.pdf", "description": "Old title", "file_type": "pdf"},
+        {"id": "2", "item_number": "DOC-2", "filename": "b.pdf", "description": "Same", "file_type": "pdf"},
+        {"id": "3", "item_number": "DOC-2", "filename": "old.pdf", "description": "Same", "file_type": "pdf"},
+    ])
+
+    discrepancies = validator.validate_items(["DOC-1", "DOC-2"])
+    validator.oracle_conn.close()
+    sink.close()
+
+    assert sink.count(checker="watch_mode", field="description") == 1, "Test failed: A stale Solr value was not reported."
+    assert sink.count(checker="watch_mode", field="missing_in_oracle") == 1, "Test failed: A Solr-only document was not reported."
+    assert discrepancies == 2, "Test failed: Matching values were reported."
+
+def test_polling_returns_rows_committed_later_at_the_same_release_date(fake_oracle):
+    fake_oracle.db.executescript("""
+        ATTACH DATABASE ':memory:' AS AGILE;
+        CREATE TABLE AGILE.NODETABLE (ID INTEGER, DESCRIPTION TEXT);
+        CREATE TABLE AGILE.ITEM (ID INTEGER, ITEM_NUMBER TEXT, SUBCLASS INTEGER);
+        CREATE TABLE AGILE.REV (ITEM INTEGER, RELEASE_DATE TEXT);
+        INSERT INTO AGILE.NODETABLE VALUES (10, 'Document'), (20, 'Memo Document');
+        INSERT INTO AGILE.ITEM VALUES (1, 'DOC-1', 10), (2, 'DOC-2', 10), (3, 'MEMO-1', 20);
+        INSERT INTO AGILE.REV VALUES (1, '2024-01-01 10:00:00'), (3, '2024-01-01 10:00:00');
+    """)
+    conn = OracleConnection("user/password@db", query_params={"subclass": "Document"})
+    conn.open_session()
+    feed = PollingChangeFeed(conn, interval=0)
+    feed.since = "2024-01-01 09:00:00"
+
+    first = feed.poll(timeout=0)
+    fake_oracle.db.execute("INSERT INTO AGILE.REV VALUES (2, '2024-01-01 10:00:00')")
+    second = feed.poll(timeout=0)
+    third = feed.poll(timeout=0)
+    feed.close()
+
+    assert (first, second, third) == (["DOC-1"], ["DOC-2"], []), \
+        "Test failed: A change at the last seen release date was missed or returned twice (or another doctype's item was returned)."
+
+
+class FakeTable:
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = rows
+
+class FakeRow:
+    def __init__(self, rowid):
+        self.rowid = rowid
+
+class FakeMessage:
+    def __init__(self, *tables):
+        self.tables = tables
+
+def test_notification_without_rows_falls_back_to_polling(fake_oracle):
+    fake_oracle.db.executescript("""
+        ATTACH DATABASE ':memory:' AS AGILE;
+        CREATE TABLE AGILE.NODETABLE (ID INTEGER, DESCRIPTION TEXT);
+        CREATE TABLE AGILE.ITEM (ID INTEGER, ITEM_NUMBER TEXT, SUBCLASS INTEGER);
+        CREATE TABLE AGILE.REV (ITEM INTEGER, RELEASE_DATE TEXT);
+        INSERT INTO AGILE.NODETABLE VALUES (10, 'Document');
+        INSERT INTO AGILE.ITEM VALUES (1, 'DOC-1', 10), (2, 'DOC-2', 10);
+        INSERT INTO AGILE.REV VALUES (2, '2024-01-01 10:00:00');
+    """)
+    conn = OracleConnection("user/password@db", query_params={"subclass": "Document"})
+    conn.open_session()
+    feed = watch_mode.ContinuousQueryChangeFeed.__new__(watch_mode.ContinuousQueryChangeFeed)
+    feed.rowids = watch_mode.queue.Queue()
+    feed.connection = fake_oracle.connect("user/password@db")
+    feed.fallback = PollingChangeFeed(conn, interval=0)
+    feed.fallback.since = "2024-01-01 09:00:00"
+
+    feed.on_notification(FakeMessage(FakeTable("agile.item", [FakeRow(1)])))
+    with_rowids = feed.poll(timeout=0)
+    feed.on_notification(FakeMessage(FakeTable("agile.rev", None)))
+    without_rows = feed.poll(timeout=0)
+    conn.close()
+
+    assert with_rowids == ["DOC-1"], "Test failed: A notified ROWID was not resolved to its item."
+    assert without_rows == ["DOC-2"], "Test failed: A notification without ROWIDs was dropped instead of polled."
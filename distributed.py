@@ -0,0 +1,270 @@
+# distributed.py
+import argparse
+import json
+import logging
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DOCTYPES = ["DOC", "BV", "BMS", "MEMO"]
+HASH_BUCKETS = 10000  # Same bucket space as sample_check.py
+QUEUE_DB = os.path.join(HERE, "validation_queue.db")
+RESULTS_DIR = os.path.join(HERE, "distributed_results")
+# Whole-doctype tasks of QA_<doctype>/task_runner.py, queued next to the hash-range slices
+DOCTYPE_TASKS = ["documents", "lifecycle", "file_vault", "aggregates"]
+TASK_LEASE = 15 * 60  # Seconds without a heartbeat before a running task of a lost worker is handed out again
+HEARTBEAT_INTERVAL = 60
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    doctype TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    low INTEGER,
+    high INTEGER,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    claimed_at REAL,
+    finished_at REAL,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_by_status ON tasks(status, task_id);
+"""
+
+
+class TaskQueue:
+    """Validation tasks in a SQLite database shared by the coordinator and every worker.
+
+    Workers on other hosts need the database (and RESULTS_DIR) on a shared filesystem
+    with working file locks.
+    """
+
+    def __init__(self, path: str = QUEUE_DB):
+        self.path = path
+        with closing(self.connect()) as db:
+            db.executescript(SCHEMA)
+
+    def connect(self):
+        """Autocommit connection; callers close it (sqlite3's own context manager does not)."""
+        return sqlite3.connect(self.path, timeout=60, isolation_level=None)
+
+    def submit(self, doctypes: List[str], slices: int) -> str:
+        """Queue the whole-doctype tasks and `slices` hash-range tasks per doctype; return the run id."""
+        run_id = time.strftime("%Y%m%d-%H%M%S")
+        tasks = []
+        for doctype in doctypes:
+            tasks.extend((run_id, doctype, kind, None, None) for kind in DOCTYPE_TASKS)
+            for part in range(slices):
+                tasks.append((run_id, doctype, "slice", part * HASH_BUCKETS // slices, (part + 1) * HASH_BUCKETS // slices))
+        with closing(self.connect()) as db:
+            db.executemany("INSERT INTO tasks (run_id, doctype, kind, low, high) VALUES (?, ?, ?, ?, ?)", tasks)
+        logging.info(f"Queued {len(tasks)} tasks for run {run_id}")
+        return run_id
+
+    def claim(self, worker: str, run_id: str):
+        """Atomically take the run's next pending task (or one whose lease expired), or None.
+
+        A task whose lease expired after MAX_ATTEMPTS claims is marked failed instead.
+        """
+        db = self.connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            expired = time.time() - TASK_LEASE
+            db.execute("""UPDATE tasks SET status = 'failed', finished_at = ?, result = ?
+                          WHERE run_id = ? AND status = 'running' AND claimed_at < ? AND attempts >= ?""",
+                       (time.time(), json.dumps({"error": "lease expired"}), run_id, expired, MAX_ATTEMPTS))
+            row = db.execute(
+                """SELECT task_id, run_id, doctype, kind, low, high, attempts + 1 FROM tasks
+                   WHERE run_id = ? AND (status = 'pending' OR (status = 'running' AND claimed_at < ?))
+                   ORDER BY task_id LIMIT 1""", (run_id, expired)).fetchone()
+            if row:
+                db.execute("UPDATE tasks SET status = 'running', worker = ?, claimed_at = ?, attempts = attempts + 1 WHERE task_id = ?",
+                           (worker, time.time(), row[0]))
+            db.execute("COMMIT")
+        except sqlite3.Error:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+        if row is None:
+            return None
+        return dict(zip(("task_id", "run_id", "doctype", "kind", "low", "high", "attempt"), row))
+
+    def heartbeat(self, task_id: int, worker: str) -> bool:
+        """Renew the worker's lease on a running task; False once the task was handed to another worker."""
+        with closing(self.connect()) as db:
+            return db.execute("UPDATE tasks SET claimed_at = ? WHERE task_id = ? AND worker = ? AND status = 'running'",
+                              (time.time(), task_id, worker)).rowcount == 1
+
+    def finish(self, task_id: int, worker: str, result: Dict[str, Any]) -> bool:
+        """Record the result, unless the task was handed to another worker meanwhile."""
+        with closing(self.connect()) as db:
+            return db.execute("""UPDATE tasks SET status = 'done', finished_at = ?, result = ?
+                                 WHERE task_id = ? AND worker = ? AND status = 'running'""",
+                              (time.time(), json.dumps(result), task_id, worker)).rowcount == 1
+
+    def fail(self, task_id: int, worker: str, error: str):
+        """Return the task to the queue, or mark it failed after MAX_ATTEMPTS."""
+        with closing(self.connect()) as db:
+            db.execute("""UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                          finished_at = ?, result = ? WHERE task_id = ? AND worker = ? AND status = 'running'""",
+                       (MAX_ATTEMPTS, time.time(), json.dumps({"error": error}), task_id, worker))
+
+    def outstanding(self, run_id: str) -> int:
+        """Pending and running tasks of the run; abandoned tasks of earlier runs are not counted."""
+        with closing(self.connect()) as db:
+            return db.execute("SELECT COUNT(*) FROM tasks WHERE run_id = ? AND status IN ('pending', 'running')",
+                              (run_id,)).fetchone()[0]
+
+    def latest_run_id(self):
+        with closing(self.connect()) as db:
+            return db.execute("SELECT MAX(run_id) FROM tasks").fetchone()[0]
+
+    def results(self, run_id: str) -> List[Dict[str, Any]]:
+        with closing(self.connect()) as db:
+            rows = db.execute("SELECT doctype, kind, status, result FROM tasks WHERE run_id = ? ORDER BY task_id", (run_id,)).fetchall()
+        return [{"doctype": d, "kind": k, "status": s, "result": json.loads(r) if r else None} for d, k, s, r in rows]
+
+
+class Worker:
+    """Pulls tasks and runs each in its doctype directory with QA_<doctype>/task_runner.py.
+
+    Tasks run as subprocesses because the doctype directories share module names
+    (config, db_connections, ...). Each process has its own Solr load budget, so lower
+    SOLR_LOAD_SHARE when adding workers against a production node.
+    """
+
+    def __init__(self, queue: TaskQueue, results_dir: str = RESULTS_DIR, processes: int = 1, run_id: str = None):
+        self.queue = queue
+        self.results_dir = results_dir
+        self.processes = processes
+        self.run_id = run_id
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+
+    def run(self):
+        """Run `processes` task loops until the run (default: the latest) has no outstanding tasks."""
+        os.makedirs(self.results_dir, exist_ok=True)
+        self.run_id = self.run_id or self.queue.latest_run_id()
+        with ThreadPoolExecutor(max_workers=self.processes) as executor:
+            done = sum(executor.map(self.loop, [f"{self.name}/{n}" for n in range(self.processes)]))
+        logging.info(f"Worker {self.name} finished {done} tasks")
+
+    def loop(self, name: str) -> int:
+        done = 0
+        while True:
+            task = self.queue.claim(name, self.run_id)
+            if task is None:
+                if self.queue.outstanding(self.run_id) == 0:
+                    return done
+                time.sleep(5)  # Others still running; their tasks come back if a lease expires
+                continue
+            self.run_task(task, name)
+            done += 1
+
+    def run_task(self, task: Dict[str, Any], name: str):
+        """Run the task's subprocess, renewing the lease every HEARTBEAT_INTERVAL seconds.
+
+        Every attempt writes its own result and sink files; if the lease is lost the
+        subprocess is stopped and its files are left to the new owner's attempt.
+        """
+        base = os.path.join(self.results_dir, f"{task['run_id']}-{task['task_id']}-{task['attempt']}")
+        command = [sys.executable, "task_runner.py", task["kind"], "--sink", f"{base}.jsonl.gz", "--output", f"{base}.json"]
+        if task["kind"] == "slice":
+            command += ["--low", str(task["low"]), "--high", str(task["high"])]
+        start = time.perf_counter()
+        logging.info(f"Running task {task['task_id']}: {task['doctype']} {task['kind']} {task['low']}-{task['high']}")
+        process = subprocess.Popen(command, cwd=os.path.join(HERE, f"QA_{task['doctype']}"),
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        while True:
+            try:
+                _, stderr = process.communicate(timeout=HEARTBEAT_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                if not self.queue.heartbeat(task["task_id"], name):
+                    logging.error(f"Task {task['task_id']} was handed to another worker; stopping it")
+                    process.kill()
+                    process.communicate()
+                    return
+        if process.returncode != 0 or not os.path.exists(f"{base}.json"):
+            logging.error(f"Task {task['task_id']} failed: {stderr[-2000:]}")
+            self.queue.fail(task["task_id"], name, stderr[-2000:])
+            return
+        with open(f"{base}.json") as fh:
+            result = json.load(fh)
+        result.update({"seconds": time.perf_counter() - start, "sink": f"{base}.jsonl.gz"})
+        if not self.queue.finish(task["task_id"], name, result):
+            logging.error(f"Task {task['task_id']} finished after it was handed to another worker; result discarded")
+
+
+def merge_results(tasks: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Combine the partial results of a run per doctype."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for task in tasks:
+        summary = merged.setdefault(task["doctype"], {"tasks": 0, "failed": 0, "pending": 0, "documents": 0,
+                                                       "discrepancies": Counter(), "sinks": []})
+        summary["tasks"] += 1
+        if task["status"] != "done":
+            summary["failed" if task["status"] == "failed" else "pending"] += 1
+            continue
+        result = task["result"]
+        summary["documents"] += result.get("documents", 0)
+        summary["discrepancies"].update(result["discrepancies"])
+        summary["sinks"].append(result["sink"])
+    return merged
+
+
+def report(queue: TaskQueue, run_id: str = None) -> Dict[str, Dict[str, Any]]:
+    run_id = run_id or queue.latest_run_id()
+    merged = merge_results(queue.results(run_id))
+    for doctype, summary in merged.items():
+        logging.info(f"Run {run_id} {doctype}: {summary['documents']} documents compared in {summary['tasks']} tasks "
+                     f"({summary['failed']} failed, {summary['pending']} outstanding)")
+        for name, n in sorted(summary["discrepancies"].items()):
+            logging.warning(f"  {name}: {n}")
+    return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Coordinator/worker mode: validate doctypes as hash-range tasks on many processes.")
+    parser.add_argument("--queue", default=QUEUE_DB, help="SQLite task queue shared by coordinator and workers")
+    sub = parser.add_subparsers(dest="command", required=True)
+    submit_parser = sub.add_parser("submit", help="Queue the tasks of a new run")
+    submit_parser.add_argument("--doctypes", nargs="+", default=DOCTYPES, choices=DOCTYPES)
+    submit_parser.add_argument("--slices", type=int, default=16, help="Hash-range tasks per doctype")
+    worker_parser = sub.add_parser("worker", help="Run tasks until the queue is empty")
+    worker_parser.add_argument("--processes", type=int, default=os.cpu_count())
+    worker_parser.add_argument("--results-dir", default=RESULTS_DIR)
+    worker_parser.add_argument("--run-id", help="Default: latest run")
+    report_parser = sub.add_parser("report", help="Merge the partial results of a run")
+    report_parser.add_argument("--run-id", help="Default: latest run")
+    run_parser = sub.add_parser("run", help="Submit, work and report on this host")
+    run_parser.add_argument("--doctypes", nargs="+", default=DOCTYPES, choices=DOCTYPES)
+    run_parser.add_argument("--slices", type=int, default=16)
+    run_parser.add_argument("--processes", type=int, default=os.cpu_count())
+    run_parser.add_argument("--results-dir", default=RESULTS_DIR)
+    args = parser.parse_args()
+
+    task_queue = TaskQueue(args.queue)
+    if args.command == "submit":
+        task_queue.submit(args.doctypes, args.slices)
+    elif args.command == "worker":
+        Worker(task_queue, args.results_dir, args.processes, args.run_id).run()
+    elif args.command == "report":
+        report(task_queue, args.run_id)
+    else:
+        run_id = task_queue.submit(args.doctypes, args.slices)
+        Worker(task_queue, args.results_dir, args.processes, run_id).run()
+        report(task_queue, run_id)
@@ -0,0 +1,106 @@
+from collections import Counter
+from contextlib import closing
+import pytest
+from distributed import TaskQueue, merge_results, DOCTYPE_TASKS, HASH_BUCKETS, MAX_ATTEMPTS, TASK_LEASE
+
+@pytest.fixture
+def queue(tmp_path):
+    return TaskQueue(str(tmp_path / "queue.db"))
+
+def expire_leases(queue):
+    with closing(queue.connect()) as db:
+        db.execute("UPDATE tasks SET claimed_at = claimed_at - ?", (TASK_LEASE + 1,))
+
+def test_submit_queues_doctype_tasks_and_slices(queue):
+    run_id = queue.submit(["DOC", "BV"], slices=4)
+
+    tasks = queue.results(run_id)
+    assert [task["kind"] for task in tasks if task["doctype"] == "DOC"] == DOCTYPE_TASKS + ["slice"] * 4, \
+        "Test failed: The doctype tasks and slices were not queued."
+    assert queue.outstanding(run_id) == 2 * (len(DOCTYPE_TASKS) + 4), "Test failed: Queued tasks are not outstanding."
+
+def test_claim_hands_each_task_out_once(queue):
+    run_id = queue.submit(["DOC"], slices=2)
+
+    claimed = [queue.claim("w1", run_id) for _ in range(len(DOCTYPE_TASKS) + 3)]
+
+    slices = [(task["low"], task["high"]) for task in claimed[:-1] if task["kind"] == "slice"]
+    assert slices == [(0, HASH_BUCKETS // 2), (HASH_BUCKETS // 2, HASH_BUCKETS)], "Test failed: The slices do not cover the buckets."
+    assert claimed[-1] is None, "Test failed: A running task was handed out again."
+    assert queue.claim("w1", "other-run") is None, "Test failed: A task of another run was claimed."
+
+def test_failed_task_is_retried_up_to_max_attempts(queue):
+    run_id = queue.submit(["DOC"], slices=0)
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        task = queue.claim("w1", run_id)
+        assert (task["kind"], task["attempt"]) == ("documents", attempt), "Test failed: A failed task was not queued again."
+        queue.fail(task["task_id"], "w1", "ORA-03113")
+
+    assert queue.results(run_id)[0]["status"] == "failed", "Test failed: The task was not failed after MAX_ATTEMPTS."
+    assert queue.outstanding(run_id) == len(DOCTYPE_TASKS) - 1, "Test failed: A failed task is still outstanding."
+
+def test_heartbeat_keeps_the_lease(queue):
+    run_id = queue.submit(["DOC"], slices=0)
+    task = queue.claim("w1", run_id)
+    for _ in DOCTYPE_TASKS[1:]:
+        queue.claim("w1", run_id)
+    expire_leases(queue)
+
+    assert queue.heartbeat(task["task_id"], "w1"), "Test failed: The owner could not renew its lease."
+    reclaimed = queue.claim("w2", run_id)
+    assert reclaimed["task_id"] != task["task_id"], "Test failed: A task with a renewed lease was handed out again."
+
+def test_expired_lease_is_handed_out_and_the_old_owner_is_ignored(queue):
+    run_id = queue.submit(["DOC"], slices=0)
+    task = queue.claim("w1", run_id)
+    expire_leases(queue)
+
+    reclaimed = queue.claim("w2", run_id)
+
+    assert (reclaimed["task_id"], reclaimed["attempt"]) == (task["task_id"], 2), "Test failed: An expired task was not handed out again."
+    assert not queue.heartbeat(task["task_id"], "w1"), "Test failed: The old owner kept its lease."
+    assert not queue.finish(task["task_id"], "w1", {"discrepancies": {}}), "Test failed: The old owner's result was recorded."
+    assert queue.finish(task["task_id"], "w2", {"discrepancies": {}}), "Test failed: The new owner's result was not recorded."
+
+def test_expired_lease_fails_after_max_attempts(queue):
+    run_id = queue.submit(["DOC"], slices=0)
+    for worker in range(MAX_ATTEMPTS):
+        task = queue.claim(f"w{worker}", run_id)
+        expire_leases(queue)
+    # The remaining doctype tasks are claimed, the expired one is not handed out a fourth time
+    claimed = [queue.claim("w9", run_id)["task_id"] for _ in DOCTYPE_TASKS[1:]]
+
+    assert task["task_id"] not in claimed and queue.claim("w9", run_id) is None, \
+        "Test failed: An expired task was claimed more than MAX_ATTEMPTS times."
+    assert queue.results(run_id)[0]["status"] == "failed", "Test failed: The expired task was not failed."
+
+def test_outstanding_counts_only_the_run(queue):
+    queue.submit(["DOC"], slices=1)
+    with closing(queue.connect()) as db:
+        db.execute("UPDATE tasks SET run_id = 'earlier'")
+    run_id = queue.submit(["DOC"], slices=1)
+    for _ in range(len(DOCTYPE_TASKS) + 1):
+        task = queue.claim("w1", run_id)
+        queue.finish(task["task_id"], "w1", {"discrepancies": {}})
+
+    assert queue.outstanding(run_id) == 0, "Test failed: Finished tasks are outstanding."
+    assert queue.outstanding("earlier") == len(DOCTYPE_TASKS) + 1, "Test failed: Another run's tasks were counted."
+
+def test_merge_results_per_doctype():
+    tasks = [
+        {"doctype": "DOC", "kind": "slice", "status": "done",
+         "result": {"documents": 10, "discrepancies": {"sample_check.title": 2}, "sink": "a.jsonl.gz"}},
+        {"doctype": "DOC", "kind": "slice", "status": "done",
+         "result": {"documents": 5, "discrepancies": {"sample_check.title": 1, "sample_check.missing_in_solr": 1}, "sink": "b.jsonl.gz"}},
+        {"doctype": "DOC", "kind": "documents", "status": "failed", "result": {"error": "ORA-03113"}},
+        {"doctype": "BV", "kind": "slice", "status": "running", "result": None},
+    ]
+
+    merged = merge_results(tasks)
+
+    assert merged["DOC"]["documents"] == 15 and merged["DOC"]["tasks"] == 3, "Test failed: The slices were not summed."
+    assert merged["DOC"]["discrepancies"] == Counter({"sample_check.title": 3, "sample_check.missing_in_solr": 1}), \
+        "Test failed: The discrepancy counts were not merged."
+    assert merged["DOC"]["sinks"] == ["a.jsonl.gz", "b.jsonl.gz"] and merged["DOC"]["failed"] == 1, \
+        "Test failed: Failed tasks or sinks were not accounted for."
+    assert merged["BV"]["pending"] == 1, "Test failed: An unfinished task was not reported as outstanding."